@@ -0,0 +1,3 @@
+"""
+Бенчмарки компонентов бота (python -m benchmarks run / compare)
+"""
@@ -0,0 +1,150 @@
+"""
+Генерация данных для бенчмарков
+
+Каталог АЗС в формате станций бота и база SQLite заданного размера
+(АЗС, пользователи с дисконтами, история цен). Данные детерминированы
+seed, поэтому результаты разных запусков сравнимы.
+"""
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+import aiosqlite
+
+from config import СПРАВОЧНЫЕ_ЦЕНЫ
+from database.models import init_db, rebuild_latest_prices, rebuild_price_rollups
+
+NETWORKS = ["Белоруснефть", "Лукойл", "А-100", "Газпромнефть", "United Company", "Танко"]
+# Минск встречается чаще, как и в реальном каталоге
+CITIES = ["Минск"] * 4 + ["Брест", "Гродно", "Гомель", "Могилев", "Витебск", "Барановичи"]
+FUEL_TYPES = list(СПРАВОЧНЫЕ_ЦЕНЫ)
+
+# Строк истории цен в одном INSERT
+INSERT_CHUNK = 100000
+
+# Глубина истории цен
+HISTORY_DAYS = 90
+
+# Версия формата базы: при изменении генератора старые базы в кеше не используются
+DATA_VERSION = 2
+
+# osm_id АЗС базы: как у станций каталога, для запросов по osm_id
+FIRST_OSM_ID = 1_000_000_000
+
+
+def station_osm_id(station_id: int) -> int:
+    return FIRST_OSM_ID + station_id
+
+
+def generate_stations(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Каталог из n АЗС с ценами, скидками и расстоянием до пользователя"""
+    rng = random.Random(seed)
+    stations = []
+    for i in range(1, n + 1):
+        network = rng.choice(NETWORKS)
+        # У части АЗС нет отдельных видов топлива (например, газа)
+        prices = {
+            fuel_type: round(base * rng.uniform(0.95, 1.05), 2)
+            for fuel_type, base in СПРАВОЧНЫЕ_ЦЕНЫ.items()
+            if rng.random() < 0.85
+        }
+        stations.append({
+            "id": i,
+            "name": f"{network} N{i}",
+            "network": network,
+            "address": f"ул. Тестовая, {i}",
+            "city": rng.choice(CITIES),
+            "zone": None,
+            "distance": round(rng.uniform(0.3, 30.0), 1),
+            "prices": prices,
+            "discount_card": rng.choice((0, 0, 1, 2, 3, 5)),
+            "traffic": "medium",
+            "lat": rng.uniform(51.3, 56.1),
+            "lon": rng.uniform(23.2, 32.7),
+        })
+    return stations
+
+
+def generate_user(driver_type: str = "regular", user_id: int = None) -> Dict[str, Any]:
+    """Профиль пользователя без геопозиции"""
+    return {
+        "user_id": user_id,
+        "username": "bench",
+        "driver_type": driver_type,
+        "car_consumption": 8.0,
+        "preferred_balance": "balanced",
+        "max_willing_distance": 10.0,
+        "time_value": 10.0,
+        "lat": None,
+        "lon": None,
+    }
+
+
+async def build_database(path: str, stations: int, prices: int,
+                         users: int = 1000, seed: int = 0):
+    """
+    Создать базу с stations АЗС, users пользователями и prices ценами.
+
+    Цены пишутся напрямую пакетами (без add_prices), latest_prices
+    и агрегаты цен пересобираются в конце.
+    """
+    rng = random.Random(seed)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    await init_db(path)
+
+    async with aiosqlite.connect(path) as db:
+        await db.execute("PRAGMA journal_mode = WAL")
+        await db.execute("PRAGMA synchronous = OFF")
+
+        catalog = generate_stations(stations, seed)
+        await db.executemany(
+            """INSERT INTO azs (network, address, city, lat, lon, discount_card, osm_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [(s["network"], s["address"], s["city"], s["lat"], s["lon"], s["discount_card"],
+              station_osm_id(s["id"]))
+             for s in catalog]
+        )
+        await db.executemany(
+            "INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)",
+            [(user_id, f"user{user_id}") for user_id in range(1, users + 1)]
+        )
+        async with db.execute("SELECT id FROM discounts") as cursor:
+            discount_ids = [row[0] for row in await cursor.fetchall()]
+        await db.executemany(
+            "INSERT OR IGNORE INTO user_discounts (user_id, discount_id) VALUES (?, ?)",
+            [(user_id, rng.choice(discount_ids))
+             for user_id in range(1, users + 1) for _ in range(2)]
+        )
+        async with db.execute("SELECT id FROM azs") as cursor:
+            azs_ids = [row[0] for row in await cursor.fetchall()]
+        await db.commit()
+
+        # История цен: время растет вместе с id, как при реальной записи
+        start = time.time() - HISTORY_DAYS * 86400
+        step = HISTORY_DAYS * 86400 / max(prices, 1)
+        for offset in range(0, prices, INSERT_CHUNK):
+            count = min(INSERT_CHUNK, prices - offset)
+            rows = []
+            for i in range(offset, offset + count):
+                fuel_type = rng.choice(FUEL_TYPES)
+                rows.append((
+                    rng.choice(azs_ids),
+                    fuel_type,
+                    round(СПРАВОЧНЫЕ_ЦЕНЫ[fuel_type] * rng.uniform(0.95, 1.05), 2),
+                    rng.randint(1, users),
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(start + i * step)),
+                ))
+            await db.executemany(
+                """INSERT INTO prices (azs_id, fuel_type, price, user_id, timestamp)
+                   VALUES (?, ?, ?, ?, ?)""",
+                rows
+            )
+            await db.commit()
+
+        await rebuild_latest_prices(db)
+        await rebuild_price_rollups(db)
+        await db.execute("ANALYZE")
+        await db.commit()
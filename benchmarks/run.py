@@ -0,0 +1,334 @@
+"""
+Микро-бенчмарки калькулятора, рекомендаций, форматирования и CRUD
+
+Использование:
+    python -m benchmarks run --out benchmarks/results/base.json
+    python -m benchmarks run --stations 10,1000 --prices 10000 --only crud
+    python -m benchmarks compare base.json new.json --threshold 0.1
+
+Каждый замер повторяется, пока не наберется min_time секунд (и не меньше
+min_runs раз); в результат пишутся медиана, среднее, минимум и p95 в
+миллисекундах. compare сравнивает медианы двух запусков и возвращает
+код 1, если есть замедления больше порога.
+"""
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import DRIVER_TYPES
+from benchmarks.generate import (
+    DATA_VERSION,
+    build_database,
+    generate_stations,
+    generate_user,
+    station_osm_id
+)
+
+DEFAULT_STATIONS = "10,1000,100000"
+DEFAULT_PRICES = "10000,100000,1000000"
+DEFAULT_DB_STATIONS = 1000
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+LITERS = 40.0
+FUEL_TYPE = "95"
+
+
+Benchmark = Callable[[], Any]
+
+
+async def call(func: Benchmark):
+    result = func()
+    if inspect.isawaitable(result):
+        await result
+
+
+async def measure(func: Benchmark, min_time: float,
+                  min_runs: int = 5, warmup: int = 1) -> Dict[str, Any]:
+    """Повторять вызов func (обычной или корутины) и вернуть статистику одного вызова"""
+    for _ in range(warmup):
+        await call(func)
+
+    timings: List[float] = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await call(func)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return {
+        "runs": len(timings),
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "min_ms": timings[0] * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+    }
+
+
+class Suite:
+    """Набор замеров с фильтром по имени"""
+
+    def __init__(self, only: Optional[str], min_time: float):
+        self.pattern = re.compile(only) if only else None
+        self.min_time = min_time
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def wanted(self, name: str) -> bool:
+        return self.pattern is None or bool(self.pattern.search(name))
+
+    async def bench(self, name: str, func: Benchmark):
+        if not self.wanted(name):
+            return
+        result = await measure(func, self.min_time)
+        self.results[name] = result
+        print(f"{name:70s} {result['median_ms']:10.3f} мс  (p95 {result['p95_ms']:.3f}, "
+              f"{result['runs']} раз)")
+
+
+# ---------- Расчеты ----------
+
+async def bench_services(suite: Suite, sizes: List[int]):
+    from services.calculator import FuelCalculator
+    from services.recommender import RecommendationEngine
+    from services.formatter import MessageFormatter
+
+    calculator = FuelCalculator()
+    recommender = RecommendationEngine()
+    formatter = MessageFormatter()
+    plan = calculator.discount_service.compile_plan([])
+
+    for n in sizes:
+        stations = generate_stations(n)
+        user = generate_user("regular")
+
+        # По одной АЗС за вызов, по кругу
+        station_cycle = itertools.cycle(stations)
+        await suite.bench(
+            f"calculator.calculate[{n}]",
+            lambda: calculator.calculate(user, next(station_cycle), LITERS, FUEL_TYPE, discount_plan=plan)
+        )
+        await suite.bench(
+            f"calculator.calculate_batch[{n}]",
+            lambda: calculator.calculate_batch(user, stations, LITERS, FUEL_TYPE, discount_plan=plan)
+        )
+
+        for driver_type in DRIVER_TYPES:
+            driver = generate_user(driver_type)
+            await suite.bench(
+                f"recommender.get_recommendations[{driver_type}][{n}]",
+                lambda: recommender.get_recommendations(driver, LITERS, FUEL_TYPE, stations)
+            )
+
+    # Форматирование не зависит от размера каталога
+    stations = generate_stations(1000)
+    for driver_type in DRIVER_TYPES:
+        driver = generate_user(driver_type)
+        recommendations = await recommender.get_recommendations(driver, LITERS, FUEL_TYPE, stations)
+        if driver_type == "regular":
+            render = lambda: formatter.format_regular_recommendations(recommendations)
+        else:
+            render = lambda: formatter.format_single_recommendation(recommendations, driver_type, driver)
+        await suite.bench(f"formatter[{driver_type}]", render)
+
+
+# ---------- CRUD ----------
+
+async def prepare_database(data_dir: str, stations: int, prices: int) -> str:
+    """Готовая база из кеша data_dir (создается при первом запуске)"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench_v{DATA_VERSION}_{stations}_{prices}.db")
+    if not os.path.exists(path):
+        print(f"Генерация базы: {stations} АЗС, {prices} цен...")
+        start = time.perf_counter()
+        await build_database(path, stations, prices)
+        print(f"  готово за {time.perf_counter() - start:.1f} с")
+    # Бенчмарки записывают цены - работаем с копией, исходный набор не меняется
+    scratch = path + ".run"
+    shutil.copyfile(path, scratch)
+    return scratch
+
+
+def crud_cases(crud, db_stations: int, prices: int) -> Dict[str, Benchmark]:
+    """Замеры запросов database.crud (имя -> вызов)"""
+    user_ids = itertools.count()
+
+    async def uncached_user():
+        crud._user_cache.clear()
+        await crud.get_or_create_user(next(user_ids) % 1000 + 1)
+
+    async def toggle_discount():
+        await crud.add_user_discount(1, 1)
+        await crud.remove_user_discount(1, 1)
+
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    batch = [(1 + i % db_stations, FUEL_TYPE, 2.4, 1, timestamp) for i in range(200)]
+    # АЗС каталога рядом с пользователем и весь каталог (несколько запросов IN)
+    nearby_osm_ids = [station_osm_id(i) for i in range(1, min(db_stations, 50) + 1)]
+    all_osm_ids = [station_osm_id(i) for i in range(1, db_stations + 1)]
+
+    return {
+        "get_or_create_user": lambda: crud.get_or_create_user(1),
+        "get_or_create_user_uncached": uncached_user,
+        "update_user_profile": lambda: crud.update_user_profile(1, car_consumption=8.0),
+        "get_azs_by_network_and_city": lambda: crud.get_azs_by_network_and_city("Лукойл", "Минск"),
+        "get_azs_page": lambda: crud.get_azs_page("Лукойл", "Минск", 11, 0),
+        "get_all_azs_by_city": lambda: crud.get_all_azs_by_city("Минск"),
+        "get_azs_by_id": lambda: crud.get_azs_by_id(db_stations // 2),
+        "add_price": lambda: crud.add_price(1, FUEL_TYPE, 2.4, 1),
+        "add_prices[200]": lambda: crud.add_prices(batch),
+        "get_latest_prices_by_city_and_fuel":
+            lambda: crud.get_latest_prices_by_city_and_fuel("Минск", FUEL_TYPE),
+        "get_price_age_minutes": lambda: crud.get_price_age_minutes(prices // 2),
+        f"get_latest_prices_by_osm_ids[{len(nearby_osm_ids)}]":
+            lambda: crud.get_latest_prices_by_osm_ids(nearby_osm_ids, FUEL_TYPE),
+        f"get_latest_prices_by_osm_ids[{len(all_osm_ids)}]":
+            lambda: crud.get_latest_prices_by_osm_ids(all_osm_ids, FUEL_TYPE),
+        "get_price_stats[day]": lambda: crud.get_price_stats("Минск", FUEL_TYPE, "day", 14),
+        "get_price_stats[hour]": lambda: crud.get_price_stats("Минск", FUEL_TYPE, "hour", 24),
+        "get_active_discounts": crud.get_active_discounts,
+        "get_user_discounts": lambda: crud.get_user_discounts(1),
+        "add_remove_user_discount": toggle_discount,
+    }
+
+
+async def bench_crud(suite: Suite, data_dir: str, db_stations: int, price_sizes: List[int]):
+    from database import crud
+    from database.pool import init_pool, close_pool
+
+    for prices in price_sizes:
+        tag = f"{db_stations}x{prices}"
+        cases = {
+            f"crud.{name}[{tag}]": func
+            for name, func in crud_cases(crud, db_stations, prices).items()
+        }
+        if not any(suite.wanted(name) for name in cases):
+            continue
+
+        path = await prepare_database(data_dir, db_stations, prices)
+        await init_pool(path)
+        try:
+            for name, func in cases.items():
+                await suite.bench(name, func)
+        finally:
+            await close_pool()
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+# ---------- Результаты ----------
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Сравнить медианы двух запусков.
+
+    Returns:
+        Имена замеров, замедлившихся больше чем на threshold
+    """
+    regressions = []
+    old_results, new_results = old["results"], new["results"]
+    print(f"{'замер':70s} {'было, мс':>10s} {'стало, мс':>10s} {'изм.':>8s}")
+    for name in sorted(set(old_results) | set(new_results)):
+        if name not in old_results or name not in new_results:
+            print(f"{name:70s} {'только в ' + ('новом' if name in new_results else 'старом'):>30s}")
+            continue
+        before = old_results[name]["median_ms"]
+        after = new_results[name]["median_ms"]
+        change = (after - before) / before if before else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  ЗАМЕДЛЕНИЕ"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  ускорение"
+        print(f"{name:70s} {before:10.3f} {after:10.3f} {change:+7.1%}{mark}")
+    return regressions
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(x) for x in value.split(",") if x]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Бенчмарки FuelRadarBot")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Выполнить замеры")
+    run.add_argument("--stations", default=DEFAULT_STATIONS,
+                     help="Размеры каталога для расчетов (через запятую)")
+    run.add_argument("--prices", default=DEFAULT_PRICES,
+                     help="Размеры истории цен для CRUD (через запятую), например 10000,10000000")
+    run.add_argument("--db-stations", type=int, default=DEFAULT_DB_STATIONS,
+                     help="Число АЗС в базе для CRUD")
+    run.add_argument("--only", help="Регулярное выражение: только подходящие замеры")
+    run.add_argument("--min-time", type=float, default=0.5,
+                     help="Минимальное время одного замера, секунд")
+    run.add_argument("--data-dir", default=DATA_DIR, help="Кеш сгенерированных баз")
+    run.add_argument("--out", help="JSON-файл результатов")
+
+    cmp = commands.add_parser("compare", help="Сравнить два запуска")
+    cmp.add_argument("old")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=0.10,
+                     help="Допустимое замедление медианы (доля)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        if regressions:
+            print(f"\nЗамедлений больше {args.threshold:.0%}: {len(regressions)}")
+            sys.exit(1)
+        print("\nЗамедлений нет")
+        return
+
+    suite = Suite(args.only, args.min_time)
+
+    async def run_all():
+        await bench_services(suite, parse_sizes(args.stations))
+        await bench_crud(suite, args.data_dir, args.db_stations, parse_sizes(args.prices))
+
+    asyncio.run(run_all())
+
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"meta": environment(), "results": suite.results}, f,
+                  ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,29 @@
 """
 import asyncio
 import logging
+import signal
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN,
+    RUN_MODE,
+    TELEGRAM_API_URL,
+    METRICS_FILE,
+    METRICS_FILE_INTERVAL,
+    RECORD_UPDATES
+)
 from database.models import init_db
-from handlers import start, prices, admin, profile, fuel, compare, discounts
+from database.pool import init_pool, close_pool
+from database.ingest import price_queue
+from database.fsm_storage import SQLiteStorage
+from data.catalog import get_station_index
+from server.webhook import run_webhook
+from services.metrics import metrics, write_prometheus_file_periodically
+from middlewares.metrics import MetricsMiddleware
+from middlewares.recorder import RecordMiddleware, update_recorder
+from handlers import start, prices, admin, profile, fuel, compare, discounts, stats
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,21 +35,26 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Главная функция запуска бота"""
-    # Проверка токена
-    if not BOT_TOKEN:
-        logger.error("BOT_TOKEN не установлен! Проверьте файл .env")
-        return
+def build_bot() -> Bot:
+    """Бот; TELEGRAM_API_URL позволяет направить запросы на тестовый сервер"""
+    session = None
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    return Bot(token=BOT_TOKEN, session=session)
 
-    # Инициализация базы данных
-    logger.info("Инициализация базы данных...")
-    await init_db()
-    logger.info("База данных инициализирована")
 
-    # Создание бота и диспетчера
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher(storage=MemoryStorage())
+def build_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами бота"""
+    dp = Dispatcher(storage=SQLiteStorage())
+
+    # Задержки обработчиков (внутренние middleware наследуются роутерами)
+    dp.message.middleware(MetricsMiddleware("message"))
+    dp.callback_query.middleware(MetricsMiddleware("callback_query"))
+
+    # Запись обновлений для воспроизведения (tools/replay.py), по умолчанию выключена
+    if RECORD_UPDATES:
+        dp.update.outer_middleware(RecordMiddleware(update_recorder))
+        metrics.add_source("recorder", update_recorder.stats)
 
     # Регистрация роутеров
     dp.include_router(start.router)
@@ -40,18 +62,94 @@ async def main():
     dp.include_router(fuel.router)
     dp.include_router(compare.router)
     dp.include_router(discounts.router)
+    dp.include_router(stats.router)
     dp.include_router(prices.router)  # Старые команды для совместимости
     dp.include_router(admin.router)
 
-    logger.info("Бот запущен и готов к работе!")
+    metrics.add_source("price_queue", price_queue.stats)
+    metrics.add_source("fsm", dp.storage.stats)
+    return dp
+
+
+async def start_services():
+    """База данных, очередь записи цен и индекс каталога"""
+    logger.info("Инициализация базы данных...")
+    await init_db()
+    await init_pool()
+    price_queue.start()
+    logger.info("База данных инициализирована")
+
+    # Построение пространственного индекса каталога АЗС
+    get_station_index()
+
+
+async def stop_services(bot: Bot, dp: Dispatcher):
+    """Сохранить все накопленные данные и закрыть сессию бота"""
+    # Сначала сбрасываем состояния диалогов и накопленные цены, затем закрываем пул.
+    # Сессия закрывается последней: до этого момента обработчики могут отвечать
+    await dp.storage.close()
+    await update_recorder.close()
+    await price_queue.stop()
+    await close_pool()
+    await bot.session.close()
+
+
+def shutdown_event() -> asyncio.Event:
+    """
+    Событие остановки по SIGTERM/SIGINT для режима webhook.
+
+    В режиме polling сигналы обрабатывает aiogram; в webhook без этого
+    SIGTERM (systemd, Docker) завершает процесс без дообработки очереди
+    и сохранения цен и состояний диалогов.
+    """
+    event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def stop(sig: signal.Signals):
+        logger.info(f"Получен сигнал {sig.name}, остановка...")
+        event.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop, sig)
+        except NotImplementedError:
+            # Windows: остается стандартная обработка Ctrl+C
+            pass
+    return event
+
+
+async def main():
+    """Главная функция запуска бота"""
+    # Проверка токена
+    if not BOT_TOKEN:
+        logger.error("BOT_TOKEN не установлен! Проверьте файл .env")
+        return
+
+    await start_services()
+
+    # Создание бота и диспетчера
+    bot = build_bot()
+    dp = build_dispatcher()
+
+    metrics_task = None
+    if METRICS_FILE:
+        metrics_task = asyncio.create_task(
+            write_prometheus_file_periodically(METRICS_FILE, METRICS_FILE_INTERVAL)
+        )
+
+    logger.info(f"Бот запущен и готов к работе! Режим: {RUN_MODE}")
 
-    # Запуск polling
     try:
-        await dp.start_polling(bot, skip_updates=True)
+        if RUN_MODE == "webhook":
+            await run_webhook(bot, dp, stop_event=shutdown_event())
+        else:
+            await dp.start_polling(bot, skip_updates=True)
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
     finally:
-        await bot.session.close()
+        if metrics_task:
+            metrics_task.cancel()
+        await stop_services(bot, dp)
 
 
 if __name__ == "__main__":
@@ -59,4 +157,3 @@ if __name__ == "__main__":
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
-
@@ -4,6 +4,49 @@ import os
 # YAAK: добавить env файл
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8437379313:AAGKVgrGMrUEhj-mhsgqsJ0Ha3isyYcEefU")
 
+# Режим получения обновлений: polling или webhook
+RUN_MODE = os.getenv("RUN_MODE", "polling")
+
+# Адрес Bot API (для локальных тестов - адрес тестового сервера), пусто - api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# Webhook: публичный адрес бота (пусто - webhook у Telegram не регистрируется,
+# сервер только принимает POST-запросы, например записанные обновления)
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Обработчиков обновлений, работающих одновременно
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "16"))
+
+# Очередь обновлений: при переполнении сервер отвечает 503 и Telegram
+# повторит доставку позже
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+
+# Сколько секунд при остановке дообрабатывать принятые обновления. Они уже
+# подтверждены Telegram (ответ 200), оставшиеся после таймаута теряются
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+# Администраторы бота (user_id через запятую): доступ к /admin
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+
+# Метрики в формате Prometheus: путь на webhook-сервере и файл
+# (пусто - не записывается), обновляемый раз в METRICS_FILE_INTERVAL секунд
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = int(os.getenv("METRICS_FILE_INTERVAL", "15"))
+
+# Запись входящих обновлений (обезличенных) в JSONL для воспроизведения
+# (python -m tools.replay). По умолчанию выключена
+RECORD_UPDATES = os.getenv("RECORD_UPDATES", "0") == "1"
+RECORD_PATH = os.getenv("RECORD_PATH", "recorded_updates.jsonl")
+RECORD_SALT = os.getenv("RECORD_SALT", "")   # соль для псевдонимов user_id/chat_id
+RECORD_SALT_PATH = os.getenv("RECORD_SALT_PATH", "recorded_updates.salt")  # случайная соль, если RECORD_SALT не задан
+RECORD_FLUSH_INTERVAL = 1.0  # секунд между записями буфера на диск
+RECORD_BUFFER_SIZE = 10000   # строк в буфере; сверх этого обновления не записываются
+
 # API ключ Яндекс.Карт (опционально)
 YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY", "")
 
@@ -45,6 +88,55 @@ YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY", "")
     'Лида'
 ]
 
+# Каталог реальных АЗС (выгрузка OpenStreetMap)
+CATALOG_PATH = os.getenv("CATALOG_PATH", "data.json")
+
+# Changeset каталога (gpt_script.py --incremental), применяется командой /admin catalog
+CATALOG_CHANGESET_PATH = os.getenv("CATALOG_CHANGESET_PATH", "belarus_azs_changeset.json")
+
+# Соответствие видов топлива каталога кодам бота
+CATALOG_FUEL_TYPES = {
+    'AI_92': '92',
+    'AI_95': '95',
+    'AI_98': '98',
+    'DIESEL': 'дт',
+    'PROPANE': 'газ'
+}
+
+# Белорусские названия городов в каталоге -> названия из ГОРОДА
+CATALOG_CITY_ALIASES = {
+    'Мінск': 'Минск',
+    'Гомель': 'Гомель',
+    'Брэст': 'Брест',
+    'Віцебск': 'Витебск',
+    'Гродна': 'Гродно',
+    'Магілёў': 'Могилев',
+    'Бабруйск': 'Бобруйск',
+    'Баранавічы': 'Барановичи',
+    'Барысаў': 'Борисов',
+    'Пінск': 'Пинск',
+    'Орша': 'Орша',
+    'Мазыр': 'Мозырь',
+    'Салігорск': 'Солигорск',
+    'Наваполацк': 'Новополоцк',
+    'Ліда': 'Лида'
+}
+
+# Размер пакета executemany при импорте каталога в таблицу azs
+CATALOG_IMPORT_BATCH_SIZE = 5000
+
+# Типичные цены (BYN/л): основа синтетических цен бенчмарков (не показываются пользователям)
+СПРАВОЧНЫЕ_ЦЕНЫ = {
+    '92': 2.33,
+    '95': 2.43,
+    '98': 2.53,
+    'дт': 2.38,
+    'газ': 1.80
+}
+
+# Сколько ближайших АЗС брать, если в радиусе пользователя ничего нет
+ЛИМИТ_БЛИЖАЙШИХ_АЗС = 20
+
 # Лимиты валидации
 МИН_ЦЕНА = 1.0
 МАКС_ЦЕНА = 5.0
@@ -53,7 +145,23 @@ YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY", "")
 ЛИМИТ_ВЫВОДА_ЦЕН = 5
 
 # Путь к базе данных
-DB_PATH = "fuelradar.db"
+DB_PATH = os.getenv("DB_PATH", "fuelradar.db")
+
+# Размер пула соединений с БД
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# Размер кеша подготовленных выражений на одно соединение
+DB_STATEMENT_CACHE_SIZE = 256
+
+# PRAGMA, применяемые к каждому соединению пула
+DB_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,  # 256 МБ
+    'cache_size': -16000,            # ~16 МБ (отрицательное значение - в КБ)
+    'busy_timeout': 5000,            # мс
+    'temp_store': 'MEMORY'
+}
 
 # Категории водителей
 DRIVER_TYPES = {
@@ -70,6 +178,18 @@ BALANCE_TYPES = {
     'convenience': 'Максимальное удобство'
 }
 
+# Веса оценки варианта заправки (чем меньше оценка, тем лучше):
+# колонка расчета -> вес. Ключи - приоритеты обычного водителя
+# и остальные категории водителей
+SCORE_WEIGHTS = {
+    'economy': {'total_cost': 1.0},                     # только цена
+    'balanced': {'total_cost': 0.7, 'distance': 30.0},  # 70% цене, 30% расстоянию
+    'convenience': {'distance': 100.0},                 # только расстояние
+    'taxi': {'time_cost': 1.0, 'distance': 5.0},        # минимум времени
+    'budget': {'total_cost': 1.0},                      # только цена
+    'traveler': {'total_cost': 0.6, 'distance': 20.0}   # баланс
+}
+
 # Значения времени по умолчанию для категорий (BYN/час)
 DEFAULT_TIME_VALUES = {
     'taxi': 25.0,
@@ -98,3 +218,39 @@ DISCOUNT_CATEGORY_RULES = {
     'promo': 'max'       # Промокоды - только максимальный
 }
 
+# Пакетная запись цен: максимальный размер пакета, задержка (сек) и длина очереди
+PRICE_BATCH_SIZE = 200
+PRICE_BATCH_DELAY = 0.5
+PRICE_QUEUE_SIZE = 10000
+# Пакеты цен, не записанные после всех попыток: дописываются в файл и
+# повторно записываются при следующем запуске очереди
+PRICE_DEAD_LETTER_PATH = os.getenv("PRICE_DEAD_LETTER_PATH", "failed_prices.jsonl")
+
+# Кеш профилей пользователей
+USER_CACHE_SIZE = 50000
+USER_CACHE_TTL = 900  # секунд
+
+# Кеш скомпилированных дисконтов пользователей
+DISCOUNT_CACHE_SIZE = 10000
+DISCOUNT_CACHE_TTL = 600  # секунд
+
+# Хранилище состояний диалогов (FSM) в SQLite
+FSM_TTL = int(os.getenv("FSM_TTL", str(24 * 3600)))  # секунд без активности до сброса диалога
+FSM_HOT_SIZE = 10000        # активных диалогов в памяти
+FSM_FLUSH_INTERVAL = 1.0    # секунд между пакетными записями
+FSM_PURGE_INTERVAL = 600    # секунд между удалениями устаревших состояний из БД
+
+# Постраничный вывод /compare: результат расчета хранится для листания
+COMPARE_CACHE_SIZE = 5000
+COMPARE_CACHE_TTL = 600     # секунд
+COMPARE_PAGE_SIZE = 10      # АЗС на странице
+COMPARE_MAX_NETWORKS = 6    # кнопок фильтра по сети
+COMPARE_DISTANCES = (5, 10, 20, 50)  # варианты фильтра по расстоянию, км
+
+# Выбор АЗС при добавлении цены: кнопок на странице
+AZS_PAGE_SIZE = 10
+
+# /stats: глубина графиков и ширина столбца (символов)
+STATS_DAYS = 14
+STATS_HOURS = 24
+STATS_BAR_WIDTH = 10
@@ -0,0 +1,202 @@
+"""
+Каталог реальных АЗС Беларуси (выгрузка OpenStreetMap в data.json)
+"""
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import (
+    CATALOG_PATH,
+    CATALOG_FUEL_TYPES,
+    CATALOG_CITY_ALIASES,
+    ГОРОДА,
+    ЛИМИТ_БЛИЖАЙШИХ_АЗС
+)
+from data.stations import get_all_stations
+from database.crud import get_latest_prices_by_osm_ids
+from osm.jsonstream import iter_json_array
+from services.spatial_index import StationIndex
+
+logger = logging.getLogger(__name__)
+
+_index: Optional[StationIndex] = None
+
+# Название города целым словом в адресе ("Брестская область" - не Брест)
+_CITY_NAMES = {city: city for city in ГОРОДА}
+_CITY_NAMES.update(CATALOG_CITY_ALIASES)
+_CITY_PATTERN = re.compile(
+    r"(?<!\w)(" + "|".join(map(re.escape, _CITY_NAMES)) + r")(?!\w)"
+)
+
+
+def iter_catalog_records(path: str = CATALOG_PATH) -> Iterator[Dict[str, Any]]:
+    """Записи каталога из файла по одной"""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_json_array(f)
+
+
+def city_from_record(record: Dict[str, Any]) -> str:
+    """
+    Город станции по записи каталога.
+
+    Белорусские названия приводятся к ГОРОДА; если город не указан,
+    он ищется в адресе.
+    """
+    city = record.get("city") or "unknown"
+    city = CATALOG_CITY_ALIASES.get(city, city)
+    if city != "unknown":
+        return city
+
+    match = _CITY_PATTERN.search(record.get("address") or "")
+    return _CITY_NAMES[match.group(1)] if match else city
+
+
+def fuels_from_record(record: Dict[str, Any]) -> List[str]:
+    """Коды видов топлива бота, доступных на станции"""
+    fuels = []
+    for catalog_fuel in record.get("fuelPrices") or {}:
+        fuel_type = CATALOG_FUEL_TYPES.get(catalog_fuel)
+        if fuel_type and fuel_type not in fuels:
+            fuels.append(fuel_type)
+    return fuels
+
+
+def station_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Преобразовать запись каталога к формату станций бота.
+
+    Цен в каталоге нет: prices пустой, его заполняет with_crowd_prices
+    ценами пользователей. fuels - виды топлива, которые есть на станции.
+    """
+    brand = record.get("brand") or "unknown"
+    name = record.get("name") or "unknown"
+    return {
+        "id": record["id"],
+        "name": name if name != "unknown" else "АЗС",
+        "network": brand if brand != "unknown" else "",
+        "address": record.get("address", "unknown"),
+        "city": city_from_record(record),
+        "zone": None,
+        "distance": 0.0,
+        "prices": {},
+        "fuels": fuels_from_record(record),
+        "discount_card": 0,
+        "traffic": "medium",
+        "lat": record.get("latitude"),
+        "lon": record.get("longitude")
+    }
+
+
+def load_catalog(path: str = CATALOG_PATH) -> List[Dict[str, Any]]:
+    """Загрузить каталог АЗС из файла"""
+    try:
+        return [station_from_record(r) for r in iter_catalog_records(path)]
+    except FileNotFoundError:
+        logger.warning(f"Каталог АЗС {path} не найден")
+        return []
+
+
+def get_station_index() -> StationIndex:
+    """Пространственный индекс каталога (строится один раз)"""
+    global _index
+    if _index is None:
+        _index = StationIndex(load_catalog())
+        logger.info(f"Индекс АЗС построен: {len(_index)} станций")
+    return _index
+
+
+def apply_changeset_to_file(changeset: Dict[str, List[Any]], path: str = CATALOG_PATH) -> int:
+    """
+    Записать changeset в файл каталога, чтобы при следующем запуске индекс
+    строился из актуальных данных.
+
+    Файл читается потоково и заменяется атомарно (через временный файл).
+
+    Returns:
+        Количество станций в новом файле
+    """
+    replaced = {record["id"]: record
+                for record in changeset.get("added", []) + changeset.get("changed", [])}
+    dropped = set(changeset.get("removed", [])) | set(replaced)
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        records = iter_catalog_records(path) if os.path.exists(path) else iter(())
+        for record in records:
+            if record.get("id") in dropped:
+                continue
+            f.write((",\n" if count else "") + json.dumps(record, ensure_ascii=False))
+            count += 1
+        for record in replaced.values():
+            f.write((",\n" if count else "") + json.dumps(record, ensure_ascii=False))
+            count += 1
+        f.write("\n]\n")
+    os.replace(tmp_path, path)
+    return count
+
+
+def apply_changeset(changeset: Dict[str, List[Any]]) -> int:
+    """
+    Обновить индекс каталога по changeset без полной перезагрузки.
+
+    Returns:
+        Количество измененных станций индекса
+    """
+    index = get_station_index()
+    count = 0
+    for station_id in changeset.get("removed", []):
+        count += index.remove(station_id)
+    for record in changeset.get("added", []) + changeset.get("changed", []):
+        # add заменяет станцию с тем же id; без координат - просто удаляет
+        if not index.add(station_from_record(record)):
+            index.remove(record["id"])
+        else:
+            count += 1
+    return count
+
+
+def get_stations_near(lat: float, lon: float, radius_km: float,
+                      limit: int = ЛИМИТ_БЛИЖАЙШИХ_АЗС) -> List[Dict[str, Any]]:
+    """
+    АЗС каталога в радиусе от точки с расстоянием до нее.
+
+    Если в радиусе станций нет, возвращаются `limit` ближайших.
+    """
+    index = get_station_index()
+    found = index.within(lat, lon, radius_km)
+    if not found:
+        found = index.nearest(lat, lon, limit)
+    # Копии станций: расстояние зависит от точки запроса
+    return [dict(station, distance=round(distance, 1)) for distance, station in found]
+
+
+async def with_crowd_prices(stations: List[Dict[str, Any]],
+                            fuel_type: str) -> List[Dict[str, Any]]:
+    """
+    АЗС каталога с последней ценой пользователей на fuel_type.
+
+    Цена берется из latest_prices по azs.osm_id; станции без известной
+    цены в результат не попадают, чтобы расчет и экономия опирались
+    только на реальные цены.
+    """
+    prices = await get_latest_prices_by_osm_ids([s["id"] for s in stations], fuel_type)
+    return [
+        dict(station, prices={fuel_type: prices[station["id"]]})
+        for station in stations
+        if station["id"] in prices
+    ]
+
+
+async def get_user_stations(user: Dict[str, Any], fuel_type: str) -> List[Dict[str, Any]]:
+    """
+    АЗС для расчета: рядом с пользователем (только с ценами пользователей)
+    или тестовые, если геопозиции нет
+    """
+    lat, lon = user.get("lat"), user.get("lon")
+    if lat is None or lon is None:
+        return get_all_stations()
+    stations = get_stations_near(lat, lon, user.get("max_willing_distance", 10.0))
+    return await with_crowd_prices(stations, fuel_type)
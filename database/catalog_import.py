@@ -0,0 +1,182 @@
+"""
+Импорт каталога АЗС (выгрузка OpenStreetMap) в таблицу azs
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+from config import CATALOG_IMPORT_BATCH_SIZE
+from data.catalog import city_from_record, fuels_from_record
+
+logger = logging.getLogger(__name__)
+
+# Колонки azs, заполняемые из каталога (osm_id - ключ)
+CATALOG_COLUMNS = (
+    "network", "name", "address", "city", "lat", "lon",
+    "fuels", "working_hours", "phone", "website"
+)
+
+INSERT_SQL = f"""
+    INSERT INTO azs (osm_id, {", ".join(CATALOG_COLUMNS)}, content_hash)
+    VALUES (?, {", ".join("?" for _ in CATALOG_COLUMNS)}, ?)
+"""
+
+UPDATE_SQL = f"""
+    UPDATE azs SET {", ".join(f"{column} = ?" for column in CATALOG_COLUMNS)},
+        content_hash = ?
+    WHERE osm_id = ?
+"""
+
+DELETE_LATEST_SQL = """
+    DELETE FROM latest_prices
+    WHERE azs_id IN (SELECT id FROM azs WHERE osm_id = ?)
+"""
+
+DELETE_SQL = "DELETE FROM azs WHERE osm_id = ?"
+
+# Город хранится и в latest_prices - обновляем вместе с АЗС
+UPDATE_LATEST_CITY_SQL = """
+    UPDATE latest_prices SET city = ?
+    WHERE azs_id = (SELECT id FROM azs WHERE osm_id = ?)
+"""
+
+
+def _text(value: Any) -> Any:
+    """'unknown' в каталоге означает отсутствие значения"""
+    return None if value in (None, "", "unknown") else value
+
+
+def row_from_record(record: Dict[str, Any]) -> Tuple:
+    """Значения CATALOG_COLUMNS для записи каталога"""
+    return (
+        _text(record.get("brand")) or "",
+        _text(record.get("name")),
+        _text(record.get("address")) or "unknown",
+        city_from_record(record),
+        record.get("latitude"),
+        record.get("longitude"),
+        json.dumps(fuels_from_record(record), ensure_ascii=False),
+        _text(record.get("workingHours")),
+        _text(record.get("phone")),
+        _text(record.get("website")),
+    )
+
+
+def content_hash(row: Tuple) -> str:
+    """Хеш содержимого строки: неизмененные АЗС не перезаписываются"""
+    payload = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+async def import_stations(db, records: Iterable[Dict[str, Any]],
+                          batch_size: int = CATALOG_IMPORT_BATCH_SIZE,
+                          commit: bool = True) -> Dict[str, int]:
+    """
+    Загрузить или обновить АЗС каталога по osm_id.
+
+    Записи читаются по одной и пишутся пакетами executemany в одной
+    транзакции. Текущие хеши загружаются заранее одним запросом, поэтому
+    неизмененные станции не требуют обращений к базе. С commit=False
+    транзакция остается открытой для дальнейших изменений вызывающего.
+
+    Returns:
+        Количество добавленных, обновленных, неизмененных и пропущенных АЗС
+    """
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+
+    async with db.execute("""
+        SELECT osm_id, content_hash, city FROM azs WHERE osm_id IS NOT NULL
+    """) as cursor:
+        known = {row[0]: (row[1], row[2]) for row in await cursor.fetchall()}
+
+    inserts: List[Tuple] = []
+    updates: List[Tuple] = []
+    city_updates: List[Tuple] = []
+
+    async def flush():
+        if inserts:
+            await db.executemany(INSERT_SQL, inserts)
+            inserts.clear()
+        if updates:
+            await db.executemany(UPDATE_SQL, updates)
+            updates.clear()
+        if city_updates:
+            await db.executemany(UPDATE_LATEST_CITY_SQL, city_updates)
+            city_updates.clear()
+
+    await db.execute("BEGIN")
+    try:
+        for record in records:
+            osm_id = record.get("id")
+            if osm_id is None or record.get("latitude") is None or record.get("longitude") is None:
+                stats["skipped"] += 1
+                continue
+
+            row = row_from_record(record)
+            row_hash = content_hash(row)
+            city = row[CATALOG_COLUMNS.index("city")]
+
+            if osm_id not in known:
+                inserts.append((osm_id, *row, row_hash))
+                stats["inserted"] += 1
+            elif known[osm_id][0] != row_hash:
+                updates.append((*row, row_hash, osm_id))
+                if known[osm_id][1] != city:
+                    city_updates.append((city, osm_id))
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+                continue
+            known[osm_id] = (row_hash, city)
+
+            if len(inserts) + len(updates) >= batch_size:
+                await flush()
+
+        await flush()
+        if commit:
+            await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    logger.info(
+        f"Импорт каталога: добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+        f"без изменений {stats['unchanged']}, пропущено {stats['skipped']}"
+    )
+    return stats
+
+
+async def remove_stations(db, osm_ids: Iterable[int]) -> int:
+    """
+    Удалить АЗС каталога по osm_id (без фиксации транзакции).
+
+    История цен остается в prices, из latest_prices станции убираются,
+    чтобы не попадать в выдачу.
+    """
+    rows = [(osm_id,) for osm_id in osm_ids]
+    if not rows:
+        return 0
+    await db.executemany(DELETE_LATEST_SQL, rows)
+    cursor = await db.executemany(DELETE_SQL, rows)
+    return cursor.rowcount
+
+
+async def apply_changeset(db, changeset: Dict[str, List[Any]],
+                          batch_size: int = CATALOG_IMPORT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Применить changeset каталога (added/changed/removed) к таблице azs.
+
+    Добавленные и измененные станции проходят через import_stations,
+    удаленные удаляются в той же транзакции.
+    """
+    records = changeset.get("added", []) + changeset.get("changed", [])
+    stats = await import_stations(db, records, batch_size=batch_size, commit=False)
+    try:
+        stats["removed"] = await remove_stations(db, changeset.get("removed", []))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    logger.info(f"Changeset каталога: удалено {stats['removed']}")
+    return stats
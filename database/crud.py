@@ -1,169 +1,479 @@
 """
 CRUD операции для работы с базой данных
 """
-from typing import Optional, List
-import aiosqlite
-from datetime import datetime
-from config import DB_PATH
+from typing import Optional, List, Dict, Set
+from datetime import datetime, timedelta
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from database.pool import acquire, write_transaction
+from services.cache import TTLCache
+from services.metrics import metrics
 
+# Время каждого запроса: гистограмма db_query_seconds{function=...}
+timed_query = metrics.timed("db_query_seconds")
 
+# Кеш профилей: читается всеми обработчиками, обновляется write-through
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Параметров в одном запросе IN (...) - с запасом до лимита SQLite
+IN_CHUNK_SIZE = 500
+
+
+# Перенос новых цен из диапазона id в latest_prices
+# (только самая новая цена по паре и только если она новее сохраненной:
+# цены, записанные повторно из failed_prices.jsonl, старше уже записанных)
+UPSERT_LATEST_PRICES_SQL = """
+    INSERT INTO latest_prices
+        (azs_id, fuel_type, price_id, price, user_id, timestamp, city)
+    SELECT p.azs_id, p.fuel_type, p.id, p.price, p.user_id, p.timestamp, a.city
+    FROM prices p
+    INNER JOIN azs a ON p.azs_id = a.id
+    WHERE p.id IN (
+        SELECT MAX(id) FROM prices
+        WHERE id BETWEEN ? AND ?
+        GROUP BY azs_id, fuel_type
+    )
+    ON CONFLICT(azs_id, fuel_type) DO UPDATE SET
+        price_id = excluded.price_id,
+        price = excluded.price,
+        user_id = excluded.user_id,
+        timestamp = excluded.timestamp,
+        city = excluded.city
+    WHERE (excluded.timestamp, excluded.price_id) > (latest_prices.timestamp, latest_prices.price_id)
+"""
+
+
+# Начало периода агрегации по времени цены (UTC)
+ROLLUP_PERIODS = {
+    'hour': "strftime('%Y-%m-%d %H:00:00', p.timestamp)",
+    'day': "date(p.timestamp)",
+}
+
+
+def _rollup_sql(period: str) -> List[str]:
+    """Добавление цен из диапазона id в агрегаты периода period"""
+    start = ROLLUP_PERIODS[period]
+    return [
+        f"""
+        INSERT INTO price_rollups
+            (period, period_start, azs_id, fuel_type, city,
+             min_price, max_price, sum_price, count)
+        SELECT '{period}', {start}, p.azs_id, p.fuel_type, a.city,
+               MIN(p.price), MAX(p.price), SUM(p.price), COUNT(*)
+        FROM prices p
+        INNER JOIN azs a ON p.azs_id = a.id
+        WHERE p.id BETWEEN ? AND ?
+        GROUP BY 2, p.azs_id, p.fuel_type
+        ON CONFLICT(period, azs_id, fuel_type, period_start) DO UPDATE SET
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price),
+            sum_price = sum_price + excluded.sum_price,
+            count = count + excluded.count
+        """,
+        # Число цен по копейкам - для медианы без обращения к prices
+        f"""
+        INSERT INTO price_rollup_bins
+            (period, period_start, azs_id, fuel_type, city, price_cents, count)
+        SELECT '{period}', {start}, p.azs_id, p.fuel_type, a.city,
+               CAST(ROUND(p.price * 100) AS INTEGER), COUNT(*)
+        FROM prices p
+        INNER JOIN azs a ON p.azs_id = a.id
+        WHERE p.id BETWEEN ? AND ?
+        GROUP BY 2, p.azs_id, p.fuel_type, 6
+        ON CONFLICT(period, azs_id, fuel_type, period_start, price_cents) DO UPDATE SET
+            count = count + excluded.count
+        """,
+    ]
+
+
+# Добавление цен из диапазона id во все агрегаты (часовые и дневные).
+# В отличие от latest_prices не идемпотентно: каждый диапазон учитывается один раз
+UPSERT_PRICE_ROLLUPS_SQL = [sql for period in ROLLUP_PERIODS for sql in _rollup_sql(period)]
+
+
+@timed_query
 async def get_or_create_user(user_id: int, username: Optional[str] = None) -> dict:
     """Получить или создать пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return dict(user)
+
+    async with acquire() as db:
+        async with db.execute(
             "SELECT * FROM users WHERE user_id = ?", (user_id,)
-        )
-        user = await cursor.fetchone()
-        
-        if user:
+        ) as cursor:
+            user = await cursor.fetchone()
+
+        if not user:
+            # Вставка и чтение новой строки одним запросом
+            async with write_transaction(db, "get_or_create_user"):
+                async with db.execute(
+                    """INSERT INTO users (user_id, username, driver_type, car_consumption,
+                       preferred_balance, max_willing_distance, time_value, cards)
+                       VALUES (?, ?, 'regular', 8.0, 'balanced', 10.0, 10.0, '[]')
+                       ON CONFLICT(user_id) DO NOTHING
+                       RETURNING *""",
+                    (user_id, username)
+                ) as cursor:
+                    user = await cursor.fetchone()
+
+            if not user:
+                # Пользователя успели создать параллельным запросом
+                async with db.execute(
+                    "SELECT * FROM users WHERE user_id = ?", (user_id,)
+                ) as cursor:
+                    user = await cursor.fetchone()
+
+    user = dict(user)
+    _user_cache.set(user_id, user)
+    return dict(user)
+
+
+@timed_query
+async def update_user_profile(user_id: int, **kwargs) -> Optional[dict]:
+    """Обновить профиль пользователя (с обновлением кеша)"""
+    # Формируем запрос обновления
+    updates = []
+    values = []
+
+    allowed_fields = ['driver_type', 'car_consumption', 'preferred_balance',
+                     'max_willing_distance', 'time_value', 'cards', 'lat', 'lon']
+
+    for field, value in kwargs.items():
+        if field in allowed_fields:
+            updates.append(f"{field} = ?")
+            values.append(value)
+
+    if not updates:
+        # Если нет полей для обновления, просто возвращаем пользователя
+        user = _user_cache.get(user_id)
+        if user is not None:
             return dict(user)
-        else:
-            await db.execute(
-                """INSERT INTO users (user_id, username, driver_type, car_consumption, 
-                   preferred_balance, max_willing_distance, time_value, cards)
-                   VALUES (?, ?, 'regular', 8.0, 'balanced', 10.0, 10.0, '[]')""",
-                (user_id, username)
-            )
-            await db.commit()
-            cursor = await db.execute(
+        async with acquire() as db:
+            async with db.execute(
                 "SELECT * FROM users WHERE user_id = ?", (user_id,)
-            )
-            return dict(await cursor.fetchone())
-
-
-async def update_user_profile(user_id: int, **kwargs) -> dict:
-    """Обновить профиль пользователя"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        
-        # Формируем запрос обновления
-        updates = []
-        values = []
-        
-        allowed_fields = ['driver_type', 'car_consumption', 'preferred_balance', 
-                         'max_willing_distance', 'time_value', 'cards']
-        
-        for field, value in kwargs.items():
-            if field in allowed_fields:
-                updates.append(f"{field} = ?")
-                values.append(value)
-        
-        if not updates:
-            # Если нет полей для обновления, просто возвращаем пользователя
-            cursor = await db.execute(
-                "SELECT * FROM users WHERE user_id = ?", (user_id,)
-            )
-            return dict(await cursor.fetchone())
-        
+            ) as cursor:
+                row = await cursor.fetchone()
+    else:
         values.append(user_id)
-        query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ?"
-        
-        await db.execute(query, values)
-        await db.commit()
-        
-        cursor = await db.execute(
-            "SELECT * FROM users WHERE user_id = ?", (user_id,)
-        )
-        return dict(await cursor.fetchone())
+        query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ? RETURNING *"
 
+        async with acquire() as db, write_transaction(db, "update_user_profile"):
+            async with db.execute(query, values) as cursor:
+                row = await cursor.fetchone()
 
+    if not row:
+        _user_cache.pop(user_id)
+        return None
+
+    user = dict(row)
+    _user_cache.set(user_id, user)
+    return dict(user)
+
+
+@timed_query
 async def get_azs_by_network_and_city(network: str, city: str) -> List[dict]:
     """Получить список АЗС по сети и городу"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
+    async with acquire() as db:
+        async with db.execute(
             "SELECT * FROM azs WHERE network = ? AND city = ?",
             (network, city)
-        )
-        rows = await cursor.fetchall()
+        ) as cursor:
+            rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
 
+@timed_query
+async def get_azs_page(network: str, city: str, limit: int,
+                       offset: int = 0) -> List[dict]:
+    """Страница АЗС сети в городе (по адресу), без загрузки всего списка"""
+    async with acquire() as db:
+        async with db.execute(
+            """
+            SELECT * FROM azs WHERE network = ? AND city = ?
+            ORDER BY address, id
+            LIMIT ? OFFSET ?
+            """,
+            (network, city, limit, offset)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+@timed_query
 async def get_all_azs_by_city(city: str) -> List[dict]:
     """Получить все АЗС в городе"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
+    async with acquire() as db:
+        async with db.execute(
             "SELECT * FROM azs WHERE city = ?",
             (city,)
-        )
-        rows = await cursor.fetchall()
+        ) as cursor:
+            rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
 
+@timed_query
 async def get_azs_by_id(azs_id: int) -> Optional[dict]:
     """Получить АЗС по ID"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute(
+    async with acquire() as db:
+        async with db.execute(
             "SELECT * FROM azs WHERE id = ?",
             (azs_id,)
-        )
-        row = await cursor.fetchone()
+        ) as cursor:
+            row = await cursor.fetchone()
         return dict(row) if row else None
 
 
+@timed_query
 async def add_price(azs_id: int, fuel_type: str, price: float, user_id: int) -> int:
     """Добавить цену"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            """INSERT INTO prices (azs_id, fuel_type, price, user_id)
-               VALUES (?, ?, ?, ?)""",
-            (azs_id, fuel_type, price, user_id)
+    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    price_ids = await add_prices([(azs_id, fuel_type, price, user_id, timestamp)])
+    return price_ids[0]
+
+
+@timed_query
+async def add_prices(rows: List[tuple]) -> List[int]:
+    """
+    Добавить пакет цен одной транзакцией
+
+    Args:
+        rows: Кортежи (azs_id, fuel_type, price, user_id, timestamp)
+
+    Returns:
+        ID добавленных цен в порядке rows
+    """
+    if not rows:
+        return []
+    async with acquire() as db, write_transaction(db, "add_prices"):
+        await db.executemany(
+            """INSERT INTO prices (azs_id, fuel_type, price, user_id, timestamp)
+               VALUES (?, ?, ?, ?, ?)""",
+            rows
         )
-        await db.commit()
-        return cursor.lastrowid
+        # Пока транзакция держит блокировку записи, id пакета идут подряд
+        async with db.execute("SELECT last_insert_rowid()") as cursor:
+            last_id = (await cursor.fetchone())[0]
+        first_id = last_id - len(rows) + 1
+        # Обновляем последние цены и агрегаты в той же транзакции
+        await db.execute(UPSERT_LATEST_PRICES_SQL, (first_id, last_id))
+        for sql in UPSERT_PRICE_ROLLUPS_SQL:
+            await db.execute(sql, (first_id, last_id))
+    return list(range(first_id, last_id + 1))
 
 
+@timed_query
+async def get_stored_price_keys(rows: List[tuple]) -> Set[tuple]:
+    """
+    Какие из цен уже записаны: ключи (azs_id, fuel_type, user_id, timestamp)
+
+    Args:
+        rows: Кортежи (azs_id, fuel_type, price, user_id, timestamp), как в add_prices
+    """
+    timestamps = sorted({row[4] for row in rows})
+    keys: Set[tuple] = set()
+    async with acquire() as db:
+        for start in range(0, len(timestamps), IN_CHUNK_SIZE):
+            chunk = timestamps[start:start + IN_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            async with db.execute(f"""
+                SELECT azs_id, fuel_type, user_id, timestamp
+                FROM prices
+                WHERE timestamp IN ({placeholders})
+            """, chunk) as cursor:
+                keys.update(tuple(row) for row in await cursor.fetchall())
+    return keys
+
+
+@timed_query
 async def get_latest_prices_by_city_and_fuel(
-    city: str, 
-    fuel_type: str, 
+    city: str,
+    fuel_type: str,
     limit: int = 5
 ) -> List[dict]:
     """Получить последние цены по городу и типу топлива, отсортированные по цене"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        # Получаем последние цены для каждой АЗС
-        cursor = await db.execute("""
-            SELECT 
-                p.id,
-                p.azs_id,
-                p.fuel_type,
-                p.price,
-                p.user_id,
-                p.timestamp,
+    async with acquire() as db:
+        # Последние цены хранятся в latest_prices: индекс (city, fuel_type, price)
+        # отдает первые `limit` строк без обхода истории цен
+        async with db.execute("""
+            SELECT
+                lp.price_id AS id,
+                lp.azs_id,
+                lp.fuel_type,
+                lp.price,
+                lp.user_id,
+                lp.timestamp,
                 a.network,
                 a.address,
                 a.city,
                 a.lat,
                 a.lon
-            FROM prices p
-            INNER JOIN azs a ON p.azs_id = a.id
-            WHERE a.city = ? AND p.fuel_type = ?
-            AND p.id IN (
-                SELECT MAX(id) 
-                FROM prices 
-                WHERE azs_id = p.azs_id AND fuel_type = p.fuel_type
-            )
-            ORDER BY p.price ASC
+            FROM latest_prices lp
+            INNER JOIN azs a ON lp.azs_id = a.id
+            WHERE lp.city = ? AND lp.fuel_type = ?
+            ORDER BY lp.price ASC
             LIMIT ?
-        """, (city, fuel_type, limit))
-        rows = await cursor.fetchall()
+        """, (city, fuel_type, limit)) as cursor:
+            rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
 
+@timed_query
 async def get_price_age_minutes(price_id: int) -> Optional[int]:
     """Получить возраст цены в минутах"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
+    async with acquire() as db:
+        async with db.execute(
             "SELECT timestamp FROM prices WHERE id = ?",
             (price_id,)
-        )
-        row = await cursor.fetchone()
+        ) as cursor:
+            row = await cursor.fetchone()
         if row:
             timestamp = datetime.fromisoformat(row[0])
             age = datetime.now() - timestamp
             return int(age.total_seconds() / 60)
         return None
 
+
+@timed_query
+async def get_latest_prices_by_osm_ids(osm_ids: List[int], fuel_type: str) -> Dict[int, float]:
+    """Последние цены от пользователей для АЗС каталога (osm_id -> цена)"""
+    result: Dict[int, float] = {}
+    async with acquire() as db:
+        for start in range(0, len(osm_ids), IN_CHUNK_SIZE):
+            chunk = osm_ids[start:start + IN_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            async with db.execute(f"""
+                SELECT a.osm_id, lp.price
+                FROM azs a
+                INNER JOIN latest_prices lp ON lp.azs_id = a.id AND lp.fuel_type = ?
+                WHERE a.osm_id IN ({placeholders})
+            """, (fuel_type, *chunk)) as cursor:
+                for osm_id, price in await cursor.fetchall():
+                    result[osm_id] = price
+    return result
+
+
+def _median_from_bins(bins: List[tuple]) -> Optional[float]:
+    """Медиана по парам (цена в копейках, число цен), отсортированным по цене"""
+    total = sum(count for _, count in bins)
+    if not total:
+        return None
+
+    def value_at(index: int) -> int:
+        seen = 0
+        for cents, count in bins:
+            seen += count
+            if index < seen:
+                return cents
+        return bins[-1][0]
+
+    return (value_at((total - 1) // 2) + value_at(total // 2)) / 200
+
+
+@timed_query
+async def get_price_stats(city: str, fuel_type: str, period: str,
+                          periods: int) -> List[Dict]:
+    """
+    Статистика цен по городу и топливу за последние periods периодов
+
+    Читает только агрегаты price_rollups и price_rollup_bins (индекс
+    period, city, fuel_type, period_start), объем работы не зависит от
+    размера истории prices.
+
+    Args:
+        period: 'hour' или 'day'
+
+    Returns:
+        По периоду с ценами: period_start, min_price, max_price,
+        avg_price, median_price, count (по возрастанию period_start)
+    """
+    now = datetime.utcnow()
+    if period == 'hour':
+        since = (now - timedelta(hours=periods - 1)).strftime("%Y-%m-%d %H:00:00")
+    else:
+        since = (now - timedelta(days=periods - 1)).strftime("%Y-%m-%d")
+    params = (period, city, fuel_type, since)
+
+    async with acquire() as db:
+        async with db.execute("""
+            SELECT period_start,
+                   MIN(min_price) AS min_price,
+                   MAX(max_price) AS max_price,
+                   SUM(sum_price) / SUM(count) AS avg_price,
+                   SUM(count) AS count
+            FROM price_rollups
+            WHERE period = ? AND city = ? AND fuel_type = ? AND period_start >= ?
+            GROUP BY period_start
+            ORDER BY period_start
+        """, params) as cursor:
+            stats = [dict(row) for row in await cursor.fetchall()]
+
+        async with db.execute("""
+            SELECT period_start, price_cents, SUM(count)
+            FROM price_rollup_bins
+            WHERE period = ? AND city = ? AND fuel_type = ? AND period_start >= ?
+            GROUP BY period_start, price_cents
+            ORDER BY period_start, price_cents
+        """, params) as cursor:
+            bins: Dict[str, List[tuple]] = {}
+            for period_start, cents, count in await cursor.fetchall():
+                bins.setdefault(period_start, []).append((cents, count))
+
+    for row in stats:
+        row['median_price'] = _median_from_bins(bins.get(row['period_start'], []))
+    return stats
+
+
+@timed_query
+async def get_active_discounts() -> List[dict]:
+    """Получить справочник активных дисконтов"""
+    async with acquire() as db:
+        async with db.execute(
+            "SELECT * FROM discounts WHERE is_active = 1 ORDER BY type, id"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+@timed_query
+async def get_user_discounts(user_id: int) -> List[dict]:
+    """Получить активные дисконты пользователя"""
+    async with acquire() as db:
+        async with db.execute("""
+            SELECT d.id, d.name, d.type, d.discount_percent, d.apply_rule, d.description
+            FROM user_discounts ud
+            INNER JOIN discounts d ON ud.discount_id = d.id
+            WHERE ud.user_id = ? AND ud.is_active = 1 AND d.is_active = 1
+            ORDER BY d.type, d.id
+        """, (user_id,)) as cursor:
+            rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+
+@timed_query
+async def add_user_discount(user_id: int, discount_id: int) -> bool:
+    """Привязать дисконт к пользователю. False, если дисконта нет в справочнике"""
+    async with acquire() as db:
+        async with db.execute(
+            "SELECT 1 FROM discounts WHERE id = ? AND is_active = 1", (discount_id,)
+        ) as cursor:
+            if not await cursor.fetchone():
+                return False
+        async with write_transaction(db, "add_user_discount"):
+            await db.execute("""
+                INSERT INTO user_discounts (user_id, discount_id, is_active)
+                VALUES (?, ?, 1)
+                ON CONFLICT(user_id, discount_id) DO UPDATE SET is_active = 1
+            """, (user_id, discount_id))
+        return True
+
+
+@timed_query
+async def remove_user_discount(user_id: int, discount_id: int) -> bool:
+    """Отвязать дисконт от пользователя. False, если он не был привязан"""
+    async with acquire() as db, write_transaction(db, "remove_user_discount"):
+        async with db.execute(
+            "DELETE FROM user_discounts WHERE user_id = ? AND discount_id = ?",
+            (user_id, discount_id)
+        ) as cursor:
+            removed = cursor.rowcount
+    return removed > 0
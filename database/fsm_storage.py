@@ -0,0 +1,208 @@
+"""
+Хранилище состояний диалогов (FSM) в SQLite
+
+Активные диалоги держатся в памяти (LRU не больше hot_size записей),
+изменения копятся и пишутся в таблицу fsm_states одной транзакцией раз в
+flush_interval секунд. Диалог без активности дольше ttl считается
+брошенным: он не возвращается из хранилища и удаляется из БД, так что
+ни память, ни таблица не растут без ограничений. После перезапуска
+незавершенные диалоги подхватываются из БД.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from config import FSM_TTL, FSM_HOT_SIZE, FSM_FLUSH_INTERVAL, FSM_PURGE_INTERVAL
+from database.pool import acquire, write_transaction
+
+logger = logging.getLogger(__name__)
+
+# Запись диалога: (состояние, данные, время последнего изменения)
+Record = Tuple[Optional[str], Dict[str, Any], float]
+
+UPSERT_SQL = """
+    INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT(key) DO UPDATE SET
+        state = excluded.state,
+        data = excluded.data,
+        updated_at = excluded.updated_at
+"""
+
+
+def storage_key(key: StorageKey) -> str:
+    return ":".join(str(part) for part in (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id,
+        key.business_connection_id, key.destiny
+    ))
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище с горячим кешем в памяти и пакетной записью в SQLite"""
+
+    def __init__(self, ttl: float = FSM_TTL,
+                 hot_size: int = FSM_HOT_SIZE,
+                 flush_interval: float = FSM_FLUSH_INTERVAL,
+                 purge_interval: float = FSM_PURGE_INTERVAL):
+        self.ttl = ttl
+        self.hot_size = hot_size
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+
+        self._hot: "OrderedDict[str, Record]" = OrderedDict()
+        # Несохраненные изменения; хранятся отдельно, чтобы вытеснение из
+        # горячего кеша не теряло запись
+        self._dirty: Dict[str, Record] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = time.time()
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.written = 0
+
+    # ---------- Чтение и запись записей ----------
+
+    def _expired(self, record: Record) -> bool:
+        return time.time() - record[2] > self.ttl
+
+    def _remember(self, key: str, record: Record):
+        self._hot[key] = record
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    async def _get(self, key: StorageKey) -> Record:
+        skey = storage_key(key)
+        record = self._dirty.get(skey) or self._hot.get(skey)
+        if record is not None:
+            self.hits += 1
+            if skey in self._hot:
+                self._hot.move_to_end(skey)
+        else:
+            self.misses += 1
+            async with acquire() as db:
+                async with db.execute(
+                    "SELECT state, data, updated_at FROM fsm_states WHERE key = ?", (skey,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            record = (row[0], json.loads(row[1]), row[2]) if row else (None, {}, time.time())
+            self._remember(skey, record)
+
+        if self._expired(record):
+            return None, {}, time.time()
+        return record
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        skey = storage_key(key)
+        record = (state, data, time.time())
+        self._remember(skey, record)
+        self._dirty[skey] = record
+        self._ensure_flusher()
+
+    # ---------- BaseStorage ----------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data, _ = await self._get(key)
+        self._put(key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _, _ = await self._get(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        state, _, _ = await self._get(key)
+        self._put(key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data, _ = await self._get(key)
+        return data.copy()
+
+    async def close(self) -> None:
+        """Остановить фоновую запись и сохранить все изменения"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # ---------- Фоновая запись ----------
+
+    def _ensure_flusher(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.time() - self._last_purge > self.purge_interval:
+                    await self.purge()
+            except Exception as e:
+                logger.error(f"Ошибка записи состояний FSM: {e}")
+
+    async def flush(self) -> int:
+        """Записать накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return 0
+        batch, self._dirty = self._dirty, {}
+
+        upserts = []
+        deletes = []
+        for skey, (state, data, updated_at) in batch.items():
+            if state is None and not data:
+                # Диалог завершен (state.clear()) - строка не нужна
+                deletes.append((skey,))
+            else:
+                upserts.append((skey, state, json.dumps(data, ensure_ascii=False), updated_at))
+
+        try:
+            async with acquire() as db, write_transaction(db, "fsm_flush"):
+                if upserts:
+                    await db.executemany(UPSERT_SQL, upserts)
+                if deletes:
+                    await db.executemany("DELETE FROM fsm_states WHERE key = ?", deletes)
+        except Exception:
+            # Вернуть пакет, не затирая более новые изменения
+            for skey, record in batch.items():
+                self._dirty.setdefault(skey, record)
+            raise
+
+        self.flushes += 1
+        self.written += len(batch)
+        return len(batch)
+
+    async def purge(self) -> int:
+        """Удалить брошенные диалоги из БД и из памяти"""
+        deadline = time.time() - self.ttl
+        self._last_purge = time.time()
+        for skey in [k for k, record in self._hot.items() if record[2] < deadline]:
+            del self._hot[skey]
+
+        async with acquire() as db, write_transaction(db, "fsm_purge"):
+            cursor = await db.execute(
+                "DELETE FROM fsm_states WHERE updated_at < ?", (deadline,)
+            )
+        if cursor.rowcount:
+            logger.info(f"Удалено устаревших состояний FSM: {cursor.rowcount}")
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hot": len(self._hot),
+            "dirty": len(self._dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushes": self.flushes,
+            "written": self.written,
+        }
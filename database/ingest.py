@@ -0,0 +1,273 @@
+"""
+Очередь пакетной записи цен (write-behind)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config import PRICE_BATCH_SIZE, PRICE_BATCH_DELAY, PRICE_QUEUE_SIZE, PRICE_DEAD_LETTER_PATH
+from database.crud import add_prices, get_stored_price_keys
+
+logger = logging.getLogger(__name__)
+
+FLUSH_ATTEMPTS = 3
+
+# Маркер остановки в очереди: все цены перед ним будут записаны
+_STOP = object()
+
+
+class PriceIngestQueue:
+    """
+    Очередь цен от пользователей.
+
+    Обработчик кладет цену в очередь и сразу отвечает пользователю.
+    Фоновая задача собирает цены в пакеты (не больше max_batch строк
+    и не дольше max_delay секунд) и записывает каждый пакет одной
+    транзакцией через executemany.
+
+    Пакет, не записанный за FLUSH_ATTEMPTS попыток, записывается по одной
+    строке, чтобы одна ошибочная цена не задерживала весь пакет. Строки,
+    не записанные и так, не теряются: они дописываются в dead_letter_path
+    и записываются повторно при следующем запуске очереди.
+    """
+
+    def __init__(self, max_batch: int = PRICE_BATCH_SIZE,
+                 max_delay: float = PRICE_BATCH_DELAY,
+                 max_queue: int = PRICE_QUEUE_SIZE,
+                 dead_letter_path: str = PRICE_DEAD_LETTER_PATH):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.dead_letter_path = dead_letter_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Метрики
+        self.submitted = 0
+        self.flushed = 0
+        self.dead_lettered = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Запустить фоновую запись"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Очередь записи цен запущена")
+
+    async def stop(self):
+        """Остановить фоновую запись, сбросив все накопленные цены"""
+        if not self.running:
+            return
+        pending = self._queue.qsize()
+        await self._queue.put(_STOP)
+        task, self._task = self._task, None
+        await task
+        logger.info(f"Очередь записи цен остановлена, дописано при остановке: {pending}")
+
+    async def submit(self, azs_id: int, fuel_type: str, price: float, user_id: int):
+        """
+        Принять цену к записи.
+
+        Время фиксируется в момент приема, а не записи пакета. Если очередь
+        заполнена, вызов ждет освобождения места; без запущенной очереди
+        цена записывается сразу.
+        """
+        row = (azs_id, fuel_type, price, user_id,
+               datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+        self.submitted += 1
+        if not self.running:
+            await self._flush([row])
+            return
+        await self._queue.put(row)
+
+    async def _run(self):
+        try:
+            await self._replay_dead_letters()
+        except Exception as e:
+            logger.error(f"Ошибка повторной записи цен из {self.dead_letter_path}: {e}")
+
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[tuple]):
+        """Записать пакет, повторяя попытку при ошибке, затем по одной строке"""
+        if not batch:
+            return
+        if await self._write_batch(batch):
+            return
+
+        failed = batch
+        if len(batch) > 1:
+            failed = []
+            for row in batch:
+                try:
+                    await add_prices([row])
+                except Exception as e:
+                    logger.error(f"Цена не записана: {row}: {e}")
+                    failed.append(row)
+                else:
+                    self.flushed += 1
+            if not failed:
+                return
+
+        try:
+            await asyncio.to_thread(self._write_dead_letters, failed)
+        except Exception as e:
+            self.dropped += len(failed)
+            logger.error(f"Цены потеряны: не удалось сохранить в "
+                         f"{self.dead_letter_path} ({e}): {failed}")
+            return
+        self.dead_lettered += len(failed)
+        logger.error(f"Цены ({len(failed)} из {len(batch)} шт.) не записаны после "
+                     f"{FLUSH_ATTEMPTS} попыток, сохранены в {self.dead_letter_path}")
+
+    async def _write_batch(self, batch: List[tuple]) -> bool:
+        """Записать пакет одной транзакцией за FLUSH_ATTEMPTS попыток"""
+        for attempt in range(1, FLUSH_ATTEMPTS + 1):
+            started = time.perf_counter()
+            try:
+                await add_prices(batch)
+            except Exception as e:
+                logger.error(f"Ошибка записи пакета цен ({len(batch)} шт.), "
+                             f"попытка {attempt}: {e}")
+                if attempt < FLUSH_ATTEMPTS:
+                    await asyncio.sleep(0.1 * attempt)
+                continue
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushed += len(batch)
+            self.batches += 1
+            self.last_batch_size = len(batch)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            return True
+        return False
+
+    def _write_dead_letters(self, batch: List[tuple]):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for row in batch:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _take_dead_letters(self) -> List[tuple]:
+        """
+        Забрать сохраненные строки: файл переименовывается до записи в базу,
+        так что новые неудачи пишутся в новый файл. Файл .retry от прерванного
+        запуска обрабатывается повторно.
+        """
+        retry_path = self.dead_letter_path + ".retry"
+        if os.path.exists(self.dead_letter_path):
+            if os.path.exists(retry_path):
+                with open(self.dead_letter_path, encoding="utf-8") as src, \
+                        open(retry_path, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(self.dead_letter_path)
+            else:
+                os.replace(self.dead_letter_path, retry_path)
+        if not os.path.exists(retry_path):
+            return []
+        with open(retry_path, encoding="utf-8") as f:
+            return [tuple(json.loads(line)) for line in f if line.strip()]
+
+    def _write_retry(self, rows: List[tuple]):
+        """Атомарно заменить файл .retry оставшимися строками"""
+        retry_path = self.dead_letter_path + ".retry"
+        tmp_path = retry_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, retry_path)
+
+    async def _replay_dead_letters(self):
+        """
+        Повторно записать цены, не записанные при прошлых запусках.
+
+        Агрегаты цен не идемпотентны, поэтому повтор не должен записать строку
+        дважды. После каждого пакета в .retry остается только необработанный
+        хвост, а строки, которые уже есть в prices (сбой между записью пакета
+        и обновлением .retry), пропускаются.
+        """
+        rows = await asyncio.to_thread(self._take_dead_letters)
+        if not rows:
+            return
+        logger.info(f"Повторная запись {len(rows)} цен из {self.dead_letter_path}")
+        # Ключи уже обработанных строк: дубли в файле (сбой при слиянии) пропускаются
+        seen = set()
+        for start in range(0, len(rows), self.max_batch):
+            batch = rows[start:start + self.max_batch]
+            seen |= await get_stored_price_keys(batch)
+            pending = []
+            for row in batch:
+                key = (row[0], row[1], row[3], row[4])
+                if key not in seen:
+                    seen.add(key)
+                    pending.append(row)
+            if len(pending) < len(batch):
+                logger.info(f"Пропущено уже записанных и повторных цен: {len(batch) - len(pending)}")
+            flushed = self.flushed
+            # Неудачные строки снова попадают в dead_letter_path
+            await self._flush(pending)
+            self.replayed += self.flushed - flushed
+            await asyncio.to_thread(self._write_retry, rows[start + len(batch):])
+        os.remove(self.dead_letter_path + ".retry")
+
+    def stats(self) -> Dict[str, Any]:
+        """Глубина очереди и задержка записи"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "dead_lettered": self.dead_lettered,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": self._total_flush_ms / self.batches if self.batches else 0.0,
+            "max_flush_ms": self.max_flush_ms,
+        }
+
+
+# Общая очередь бота
+price_queue = PriceIngestQueue()
@@ -0,0 +1,126 @@
+"""
+Служебные команды обслуживания базы данных
+
+Использование:
+    python -m database.maintenance rebuild-latest-prices
+    python -m database.maintenance rebuild-rollups
+    python -m database.maintenance import-stations [data.json]
+    python -m database.maintenance apply-changeset belarus_azs_changeset.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+
+import aiosqlite
+
+from config import DB_PATH, CATALOG_PATH, CATALOG_IMPORT_BATCH_SIZE
+from data.catalog import apply_changeset_to_file, iter_catalog_records
+from database.catalog_import import apply_changeset, import_stations
+from database.models import init_db, rebuild_latest_prices, rebuild_price_rollups
+
+logger = logging.getLogger(__name__)
+
+
+async def cmd_rebuild_latest_prices(args):
+    """Пересборка таблицы latest_prices из истории цен"""
+    async with aiosqlite.connect(args.db) as db:
+        count = await rebuild_latest_prices(db)
+    print(f"latest_prices пересобрана: {count} строк")
+
+
+async def cmd_rebuild_rollups(args):
+    """Пересборка часовых и дневных агрегатов цен из истории"""
+    async with aiosqlite.connect(args.db) as db:
+        count = await rebuild_price_rollups(db)
+    print(f"Агрегаты цен пересобраны: {count} строк")
+
+
+async def cmd_import_stations(args):
+    """Импорт каталога АЗС из JSON-файла"""
+    async with aiosqlite.connect(args.db) as db:
+        stats = await import_stations(
+            db, iter_catalog_records(args.path), batch_size=args.batch_size
+        )
+    print(
+        f"Импорт {args.path}: добавлено {stats['inserted']}, "
+        f"обновлено {stats['updated']}, без изменений {stats['unchanged']}, "
+        f"пропущено {stats['skipped']}"
+    )
+
+
+async def cmd_apply_changeset(args):
+    """Применение changeset каталога (результат gpt_script.py) к таблице azs"""
+    with open(args.path, "r", encoding="utf-8") as f:
+        changeset = json.load(f)
+    async with aiosqlite.connect(args.db) as db:
+        stats = await apply_changeset(db, changeset)
+    # Индекс бота строится из файла каталога - он должен совпадать с таблицей
+    total = apply_changeset_to_file(changeset, args.catalog)
+    print(f"Каталог {args.catalog}: {total} станций")
+    print(
+        f"Changeset {args.path}: добавлено {stats['inserted']}, "
+        f"обновлено {stats['updated']}, без изменений {stats['unchanged']}, "
+        f"удалено {stats['removed']}"
+    )
+
+
+COMMANDS = {
+    'rebuild-latest-prices': cmd_rebuild_latest_prices,
+    'rebuild-rollups': cmd_rebuild_rollups,
+    'import-stations': cmd_import_stations,
+    'apply-changeset': cmd_apply_changeset,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Обслуживание базы FuelRadarBot")
+    parser.add_argument("--db", default=DB_PATH, help="Путь к файлу базы данных")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser(
+        'rebuild-latest-prices',
+        help="Пересобрать таблицу последних цен из prices"
+    )
+
+    subparsers.add_parser(
+        'rebuild-rollups',
+        help="Пересобрать часовые и дневные агрегаты цен (с продолжением после прерывания)"
+    )
+
+    import_parser = subparsers.add_parser(
+        'import-stations',
+        help="Загрузить или обновить АЗС из каталога OpenStreetMap"
+    )
+    import_parser.add_argument("path", nargs="?", default=CATALOG_PATH,
+                               help="JSON-файл каталога")
+    import_parser.add_argument("--batch-size", type=int, default=CATALOG_IMPORT_BATCH_SIZE,
+                               help="Строк в одном executemany")
+
+    changeset_parser = subparsers.add_parser(
+        'apply-changeset',
+        help="Применить изменения каталога (added/changed/removed) без полного импорта"
+    )
+    changeset_parser.add_argument("path", help="JSON-файл changeset")
+    changeset_parser.add_argument("--catalog", default=CATALOG_PATH,
+                                  help="Файл каталога, в который записываются изменения")
+    return parser
+
+
+async def run(args):
+    # Схема должна быть актуальной до любых служебных операций
+    await init_db(args.db)
+    await COMMANDS[args.command](args)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    args = build_parser().parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Версионированные миграции схемы базы данных
+
+Текущая версия схемы хранится в PRAGMA user_version. При старте
+выполняются только шаги с номером больше сохраненного, поэтому
+актуальная база открывается без единого DDL-запроса.
+
+Каждый шаг идемпотентен: его можно безопасно повторить, если процесс
+прервался до записи новой версии. Долгие шаги (пересчет по всей истории
+цен) выполняются порциями и сохраняют прогресс в migration_progress,
+так что после перезапуска продолжаются с места остановки.
+"""
+import logging
+import time
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Sequence, Union
+
+from database.crud import UPSERT_LATEST_PRICES_SQL, UPSERT_PRICE_ROLLUPS_SQL
+
+logger = logging.getLogger(__name__)
+
+# Размер порции для долгих шагов (строк prices за транзакцию)
+CHUNK_SIZE = 50000
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[..., Awaitable[None]]
+    # False - шаг сам управляет транзакциями (порционные шаги)
+    transactional: bool = True
+
+
+async def add_column(db, table: str, column: str, definition: str):
+    """Добавить колонку, если ее еще нет"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = {row[1] for row in await cursor.fetchall()}
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+async def run_chunked(db, name: str, sql: Union[str, Sequence[str]],
+                      chunk_size: int = CHUNK_SIZE, max_id: Optional[int] = None):
+    """
+    Выполнить sql (запрос или список запросов) по диапазонам id таблицы
+    prices с сохранением прогресса.
+
+    Каждый запрос получает параметры (первый id, последний id) диапазона.
+    Каждая порция фиксируется отдельной транзакцией вместе с прогрессом.
+    max_id - последний обрабатываемый id (по умолчанию MAX(id) на момент запуска).
+    """
+    statements = [sql] if isinstance(sql, str) else list(sql)
+    cursor = await db.execute(
+        "SELECT last_id FROM migration_progress WHERE name = ?", (name,)
+    )
+    row = await cursor.fetchone()
+    last_done = row[0] if row else 0
+
+    if max_id is None:
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM prices")
+        max_id = (await cursor.fetchone())[0]
+
+    if last_done:
+        logger.info(f"Миграция '{name}': продолжение с id {last_done + 1} из {max_id}")
+
+    while last_done < max_id:
+        upper = min(last_done + chunk_size, max_id)
+        for statement in statements:
+            await db.execute(statement, (last_done + 1, upper))
+        await db.execute("""
+            INSERT INTO migration_progress (name, last_id) VALUES (?, ?)
+            ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id
+        """, (name, upper))
+        await db.commit()
+        last_done = upper
+
+    await db.execute("DELETE FROM migration_progress WHERE name = ?", (name,))
+    await db.commit()
+
+
+# ---------- Начальные данные ----------
+
+async def add_initial_azs(db):
+    """Добавление начальных АЗС Минска"""
+    # Проверяем, есть ли уже данные
+    cursor = await db.execute("SELECT COUNT(*) FROM azs")
+    count = await cursor.fetchone()
+    if count[0] > 0:
+        return
+    
+    # Список реальных АЗС Минска (примерные координаты)
+    initial_azs = [
+        ('Лукойл', 'пр. Победителей, 10', 'Минск', 53.9045, 27.5615),
+        ('Лукойл', 'ул. Тимирязева, 45', 'Минск', 53.9200, 27.5800),
+        ('А100', 'пр. Независимости, 95', 'Минск', 53.9000, 27.5500),
+        ('А100', 'ул. Тимирязева, 50', 'Минск', 53.9150, 27.5750),
+        ('Газпром', 'ул. Червякова, 8', 'Минск', 53.8900, 27.5400),
+        ('Газпром', 'пр. Дзержинского, 125', 'Минск', 53.8700, 27.5200),
+        ('Белнефтехим', 'ул. Кальварийская, 25', 'Минск', 53.9100, 27.5600),
+        ('Белнефтехим', 'пр. Партизанский, 150', 'Минск', 53.8800, 27.5300),
+        ('Танко', 'ул. Притыцкого, 83', 'Минск', 53.9050, 27.5450),
+        ('Танко', 'пр. Рокоссовского, 150', 'Минск', 53.9250, 27.5900),
+        ('Shell', 'ул. Орловская, 76', 'Минск', 53.8950, 27.5500),
+        ('Shell', 'пр. Победителей, 65', 'Минск', 53.9150, 27.5700),
+        ('Лукойл', 'ул. Сурганова, 50', 'Минск', 53.9000, 27.5800),
+        ('А100', 'ул. Бобруйская, 25', 'Минск', 53.8850, 27.5100),
+        ('Газпром', 'ул. Козлова, 20', 'Минск', 53.9200, 27.6000),
+    ]
+    
+    await db.executemany("""
+        INSERT INTO azs (network, address, city, lat, lon)
+        VALUES (?, ?, ?, ?, ?)
+    """, initial_azs)
+
+
+async def add_initial_discounts(db):
+    """Добавление начальных дисконтов в справочник"""
+    # Проверяем, есть ли уже данные
+    cursor = await db.execute("SELECT COUNT(*) FROM discounts")
+    count = await cursor.fetchone()
+    if count[0] > 0:
+        return
+    
+    # Список доступных дисконтов
+    initial_discounts = [
+        # Банковские карты (складываются между собой)
+        ('Альфа-Банк карта', 'bank', 5.0, 'additive', 'Кешбек 5% на топливо'),
+        ('Беларусбанк карта', 'bank', 3.0, 'additive', 'Кешбек 3% на топливо'),
+        ('Приорбанк карта', 'bank', 4.0, 'additive', 'Кешбек 4% на топливо'),
+        ('БПС-Сбербанк карта', 'bank', 2.5, 'additive', 'Кешбек 2.5% на топливо'),
+        
+        # Карты АЗС (складываются между собой)
+        ('А100 карта', 'azs', 3.0, 'additive', 'Скидка 3% по карте А100'),
+        ('Лукойл карта', 'azs', 2.0, 'additive', 'Скидка 2% по карте Лукойл'),
+        ('Газпром карта', 'azs', 2.5, 'additive', 'Скидка 2.5% по карте Газпром'),
+        ('Shell карта', 'azs', 2.0, 'additive', 'Скидка 2% по карте Shell'),
+        
+        # Промокоды/акции (берется только максимальный, не складываются)
+        ('Акция выходного дня', 'promo', 5.0, 'max', 'Акция: скидка 5% в выходные'),
+        ('Промокод новичка', 'promo', 7.0, 'max', 'Промокод для новых клиентов'),
+        ('Акция первой заправки', 'promo', 10.0, 'max', 'Скидка 10% на первую заправку'),
+    ]
+    
+    await db.executemany("""
+        INSERT INTO discounts (name, type, discount_percent, apply_rule, description)
+        VALUES (?, ?, ?, ?, ?)
+    """, initial_discounts)
+
+
+# ---------- Шаги миграций ----------
+
+async def migration_base_schema(db):
+    """Базовые таблицы, колонки и индексы"""
+    # Таблица пользователей
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            rating REAL DEFAULT 5.0,
+            driver_type TEXT DEFAULT 'regular',
+            car_consumption REAL DEFAULT 8.0,
+            preferred_balance TEXT DEFAULT 'balanced',
+            max_willing_distance REAL DEFAULT 10.0,
+            time_value REAL DEFAULT 10.0,
+            cards TEXT DEFAULT '[]',
+            lat REAL,
+            lon REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица АЗС
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS azs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            network TEXT NOT NULL,
+            address TEXT NOT NULL,
+            city TEXT NOT NULL,
+            zone TEXT DEFAULT 'center',
+            distance REAL DEFAULT 0.0,
+            lat REAL,
+            lon REAL,
+            discount_card INTEGER DEFAULT 0,
+            traffic TEXT DEFAULT 'medium',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица цен
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS prices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            azs_id INTEGER NOT NULL,
+            fuel_type TEXT NOT NULL,
+            price REAL NOT NULL,
+            user_id INTEGER NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (azs_id) REFERENCES azs(id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+    # Таблица дисконтов (справочник всех доступных дисконтов)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS discounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            discount_percent REAL NOT NULL,
+            apply_rule TEXT DEFAULT 'additive',
+            description TEXT,
+            is_active INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Таблица связи пользователей с дисконтами
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS user_discounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            discount_id INTEGER NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (discount_id) REFERENCES discounts(id),
+            UNIQUE(user_id, discount_id)
+        )
+    """)
+
+    # Колонки, добавленные после первых версий (базы, созданные до них)
+    await add_column(db, "users", "driver_type", "TEXT DEFAULT 'regular'")
+    await add_column(db, "users", "car_consumption", "REAL DEFAULT 8.0")
+    await add_column(db, "users", "preferred_balance", "TEXT DEFAULT 'balanced'")
+    await add_column(db, "users", "max_willing_distance", "REAL DEFAULT 10.0")
+    await add_column(db, "users", "time_value", "REAL DEFAULT 10.0")
+    await add_column(db, "users", "cards", "TEXT DEFAULT '[]'")
+    await add_column(db, "users", "lat", "REAL")
+    await add_column(db, "users", "lon", "REAL")
+    await add_column(db, "azs", "zone", "TEXT DEFAULT 'center'")
+    await add_column(db, "azs", "distance", "REAL DEFAULT 0.0")
+    await add_column(db, "azs", "discount_card", "INTEGER DEFAULT 0")
+    await add_column(db, "azs", "traffic", "TEXT DEFAULT 'medium'")
+
+    # Индексы для ускорения запросов
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_prices_azs_fuel
+        ON prices(azs_id, fuel_type)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_prices_timestamp
+        ON prices(timestamp DESC)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_azs_city
+        ON azs(city)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_user_discounts_user
+        ON user_discounts(user_id)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_discounts_type
+        ON discounts(type)
+    """)
+
+
+async def migration_seed_data(db):
+    """Начальные АЗС и справочник дисконтов (только для пустой базы)"""
+    await add_initial_azs(db)
+    await add_initial_discounts(db)
+
+
+async def migration_latest_prices(db):
+    """Таблица последних цен"""
+    # Последняя цена по каждой паре (АЗС, топливо).
+    # Поддерживается add_prices в той же транзакции, что и запись в prices
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS latest_prices (
+            azs_id INTEGER NOT NULL,
+            fuel_type TEXT NOT NULL,
+            price_id INTEGER NOT NULL,
+            price REAL NOT NULL,
+            user_id INTEGER NOT NULL,
+            timestamp TIMESTAMP,
+            city TEXT NOT NULL,
+            PRIMARY KEY (azs_id, fuel_type),
+            FOREIGN KEY (azs_id) REFERENCES azs(id),
+            FOREIGN KEY (price_id) REFERENCES prices(id)
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_latest_prices_city_fuel_price
+        ON latest_prices(city, fuel_type, price)
+    """)
+
+
+async def migration_backfill_latest_prices(db):
+    """Заполнение latest_prices по всей истории цен (порциями)"""
+    await run_chunked(db, "backfill_latest_prices", UPSERT_LATEST_PRICES_SQL)
+
+
+async def migration_catalog_columns(db):
+    """Поля каталога OpenStreetMap в таблице АЗС"""
+    await add_column(db, "azs", "osm_id", "INTEGER")
+    await add_column(db, "azs", "name", "TEXT")
+    await add_column(db, "azs", "fuels", "TEXT DEFAULT '[]'")
+    await add_column(db, "azs", "working_hours", "TEXT")
+    await add_column(db, "azs", "phone", "TEXT")
+    await add_column(db, "azs", "website", "TEXT")
+    await add_column(db, "azs", "content_hash", "TEXT")
+    # Ключ импорта каталога; у АЗС, добавленных вручную, osm_id пустой
+    await db.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_azs_osm_id
+        ON azs(osm_id)
+    """)
+
+
+async def migration_fsm_states(db):
+    """Состояния диалогов (FSM) пользователей"""
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_fsm_states_updated
+        ON fsm_states(updated_at)
+    """)
+
+
+async def migration_azs_network_city_index(db):
+    """Индекс для постраничного выбора АЗС по сети и городу"""
+    # rowid неявно входит в индекс, поэтому ORDER BY address, id не требует сортировки
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_azs_network_city_address
+        ON azs(network, city, address)
+    """)
+
+
+async def migration_price_rollups(db):
+    """Часовые и дневные агрегаты цен"""
+    # Поддерживаются add_prices в той же транзакции, что и запись в prices.
+    # period - 'hour' или 'day', period_start - начало периода (UTC)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS price_rollups (
+            period TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            azs_id INTEGER NOT NULL,
+            fuel_type TEXT NOT NULL,
+            city TEXT NOT NULL,
+            min_price REAL NOT NULL,
+            max_price REAL NOT NULL,
+            sum_price REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (period, azs_id, fuel_type, period_start),
+            FOREIGN KEY (azs_id) REFERENCES azs(id)
+        )
+    """)
+    # Число цен с одинаковым значением (в копейках) - для медианы
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS price_rollup_bins (
+            period TEXT NOT NULL,
+            period_start TEXT NOT NULL,
+            azs_id INTEGER NOT NULL,
+            fuel_type TEXT NOT NULL,
+            city TEXT NOT NULL,
+            price_cents INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (period, azs_id, fuel_type, period_start, price_cents),
+            FOREIGN KEY (azs_id) REFERENCES azs(id)
+        )
+    """)
+    # Графики по городу и топливу читают диапазон period_start по этим индексам
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_price_rollups_city_fuel
+        ON price_rollups(period, city, fuel_type, period_start)
+    """)
+    await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_price_rollup_bins_city_fuel
+        ON price_rollup_bins(period, city, fuel_type, period_start, price_cents)
+    """)
+
+
+async def migration_backfill_price_rollups(db):
+    """Заполнение агрегатов цен по всей истории (порциями)"""
+    await run_chunked(db, "backfill_price_rollups", UPSERT_PRICE_ROLLUPS_SQL)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Базовая схема", migration_base_schema),
+    Migration(2, "Начальные данные", migration_seed_data),
+    Migration(3, "Таблица latest_prices", migration_latest_prices),
+    Migration(4, "Заполнение latest_prices", migration_backfill_latest_prices,
+              transactional=False),
+    Migration(5, "Поля каталога АЗС", migration_catalog_columns),
+    Migration(6, "Таблица fsm_states", migration_fsm_states),
+    Migration(7, "Индекс АЗС по сети и городу", migration_azs_network_city_index),
+    Migration(8, "Агрегаты цен", migration_price_rollups),
+    Migration(9, "Заполнение агрегатов цен", migration_backfill_price_rollups,
+              transactional=False),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(db) -> int:
+    cursor = await db.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+
+async def migrate(db) -> int:
+    """
+    Применить недостающие миграции
+
+    Returns:
+        Количество примененных шагов
+    """
+    version = await get_schema_version(db)
+    if version >= LATEST_VERSION:
+        return 0
+
+    # Служебные таблицы: журнал миграций и прогресс порционных шагов
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            duration_ms REAL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS migration_progress (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    """)
+    await db.commit()
+
+    applied = 0
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+
+        logger.info(f"Миграция {migration.version}: {migration.name}...")
+        started = time.perf_counter()
+
+        if migration.transactional:
+            await db.execute("BEGIN")
+            await migration.apply(db)
+        else:
+            await migration.apply(db)
+            await db.execute("BEGIN")
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        await db.execute(
+            "INSERT OR REPLACE INTO schema_migrations (version, name, duration_ms) "
+            "VALUES (?, ?, ?)",
+            (migration.version, migration.name, duration_ms)
+        )
+        await db.execute(f"PRAGMA user_version = {migration.version}")
+        await db.commit()
+
+        logger.info(f"Миграция {migration.version} применена за {duration_ms:.0f} мс")
+        applied += 1
+
+    return applied
@@ -3,258 +3,69 @@
 """
 import aiosqlite
 from config import DB_PATH
+from database.crud import UPSERT_PRICE_ROLLUPS_SQL
+from database.migrations import migrate, run_chunked
 
 
-async def init_db():
-    """Инициализация базы данных и создание таблиц"""
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Таблица пользователей
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                rating REAL DEFAULT 5.0,
-                driver_type TEXT DEFAULT 'regular',
-                car_consumption REAL DEFAULT 8.0,
-                preferred_balance TEXT DEFAULT 'balanced',
-                max_willing_distance REAL DEFAULT 10.0,
-                time_value REAL DEFAULT 10.0,
-                cards TEXT DEFAULT '[]',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Таблица АЗС
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS azs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                network TEXT NOT NULL,
-                address TEXT NOT NULL,
-                city TEXT NOT NULL,
-                zone TEXT DEFAULT 'center',
-                distance REAL DEFAULT 0.0,
-                lat REAL,
-                lon REAL,
-                discount_card INTEGER DEFAULT 0,
-                traffic TEXT DEFAULT 'medium',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Таблица цен
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS prices (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                azs_id INTEGER NOT NULL,
-                fuel_type TEXT NOT NULL,
-                price REAL NOT NULL,
-                user_id INTEGER NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (azs_id) REFERENCES azs(id),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        # Таблица дисконтов (справочник всех доступных дисконтов)
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS discounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                type TEXT NOT NULL,
-                discount_percent REAL NOT NULL,
-                apply_rule TEXT DEFAULT 'additive',
-                description TEXT,
-                is_active INTEGER DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Таблица связи пользователей с дисконтами
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_discounts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                discount_id INTEGER NOT NULL,
-                is_active INTEGER DEFAULT 1,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id),
-                FOREIGN KEY (discount_id) REFERENCES discounts(id),
-                UNIQUE(user_id, discount_id)
-            )
-        """)
-        
-        # Индексы для ускорения запросов
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_prices_azs_fuel 
-            ON prices(azs_id, fuel_type)
-        """)
-        
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_prices_timestamp 
-            ON prices(timestamp DESC)
-        """)
-        
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_azs_city 
-            ON azs(city)
-        """)
-        
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_user_discounts_user 
-            ON user_discounts(user_id)
-        """)
-        
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_discounts_type 
-            ON discounts(type)
-        """)
-        
-        await db.commit()
-        
-        # Миграция: добавляем новые поля для существующих пользователей
-        try:
-            await db.execute("""
-                ALTER TABLE users ADD COLUMN driver_type TEXT DEFAULT 'regular'
-            """)
-        except Exception:
-            pass  # Поле уже существует
-        
-        try:
-            await db.execute("""
-                ALTER TABLE users ADD COLUMN car_consumption REAL DEFAULT 8.0
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE users ADD COLUMN preferred_balance TEXT DEFAULT 'balanced'
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE users ADD COLUMN max_willing_distance REAL DEFAULT 10.0
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE users ADD COLUMN time_value REAL DEFAULT 10.0
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE users ADD COLUMN cards TEXT DEFAULT '[]'
-            """)
-        except Exception:
-            pass
-        
-        # Миграция для АЗС
-        try:
-            await db.execute("""
-                ALTER TABLE azs ADD COLUMN zone TEXT DEFAULT 'center'
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE azs ADD COLUMN distance REAL DEFAULT 0.0
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE azs ADD COLUMN discount_card INTEGER DEFAULT 0
-            """)
-        except Exception:
-            pass
-        
-        try:
-            await db.execute("""
-                ALTER TABLE azs ADD COLUMN traffic TEXT DEFAULT 'medium'
-            """)
-        except Exception:
-            pass
-        
-        await db.commit()
-        
-        # Добавляем начальные данные, если база пуста
-        await add_initial_azs(db)
-        await add_initial_discounts(db)
+async def init_db(db_path: str = DB_PATH):
+    """Инициализация базы данных: применение недостающих миграций схемы"""
+    async with aiosqlite.connect(db_path) as db:
+        await migrate(db)
 
 
-async def add_initial_azs(db):
-    """Добавление начальных АЗС Минска"""
-    # Проверяем, есть ли уже данные
-    cursor = await db.execute("SELECT COUNT(*) FROM azs")
-    count = await cursor.fetchone()
-    if count[0] > 0:
-        return
-    
-    # Список реальных АЗС Минска (примерные координаты)
-    initial_azs = [
-        ('Лукойл', 'пр. Победителей, 10', 'Минск', 53.9045, 27.5615),
-        ('Лукойл', 'ул. Тимирязева, 45', 'Минск', 53.9200, 27.5800),
-        ('А100', 'пр. Независимости, 95', 'Минск', 53.9000, 27.5500),
-        ('А100', 'ул. Тимирязева, 50', 'Минск', 53.9150, 27.5750),
-        ('Газпром', 'ул. Червякова, 8', 'Минск', 53.8900, 27.5400),
-        ('Газпром', 'пр. Дзержинского, 125', 'Минск', 53.8700, 27.5200),
-        ('Белнефтехим', 'ул. Кальварийская, 25', 'Минск', 53.9100, 27.5600),
-        ('Белнефтехим', 'пр. Партизанский, 150', 'Минск', 53.8800, 27.5300),
-        ('Танко', 'ул. Притыцкого, 83', 'Минск', 53.9050, 27.5450),
-        ('Танко', 'пр. Рокоссовского, 150', 'Минск', 53.9250, 27.5900),
-        ('Shell', 'ул. Орловская, 76', 'Минск', 53.8950, 27.5500),
-        ('Shell', 'пр. Победителей, 65', 'Минск', 53.9150, 27.5700),
-        ('Лукойл', 'ул. Сурганова, 50', 'Минск', 53.9000, 27.5800),
-        ('А100', 'ул. Бобруйская, 25', 'Минск', 53.8850, 27.5100),
-        ('Газпром', 'ул. Козлова, 20', 'Минск', 53.9200, 27.6000),
-    ]
-    
-    await db.executemany("""
-        INSERT INTO azs (network, address, city, lat, lon)
-        VALUES (?, ?, ?, ?, ?)
-    """, initial_azs)
+async def rebuild_latest_prices(db) -> int:
+    """Полностью пересобрать таблицу latest_prices из истории prices"""
+    await db.execute("DELETE FROM latest_prices")
+    cursor = await db.execute("""
+        INSERT INTO latest_prices 
+            (azs_id, fuel_type, price_id, price, user_id, timestamp, city)
+        SELECT p.azs_id, p.fuel_type, p.id, p.price, p.user_id, p.timestamp, a.city
+        FROM prices p
+        INNER JOIN azs a ON p.azs_id = a.id
+        WHERE p.id IN (
+            SELECT MAX(id) FROM prices GROUP BY azs_id, fuel_type
+        )
+    """)
     await db.commit()
+    return cursor.rowcount
+
+
+# Прогресс пересборки агрегатов в migration_progress: обработанный id и граница
+ROLLUP_REBUILD = "rebuild_price_rollups"
+ROLLUP_REBUILD_BOUND = "rebuild_price_rollups_max_id"
 
 
-async def add_initial_discounts(db):
-    """Добавление начальных дисконтов в справочник"""
-    # Проверяем, есть ли уже данные
-    cursor = await db.execute("SELECT COUNT(*) FROM discounts")
-    count = await cursor.fetchone()
-    if count[0] > 0:
-        return
-    
-    # Список доступных дисконтов
-    initial_discounts = [
-        # Банковские карты (складываются между собой)
-        ('Альфа-Банк карта', 'bank', 5.0, 'additive', 'Кешбек 5% на топливо'),
-        ('Беларусбанк карта', 'bank', 3.0, 'additive', 'Кешбек 3% на топливо'),
-        ('Приорбанк карта', 'bank', 4.0, 'additive', 'Кешбек 4% на топливо'),
-        ('БПС-Сбербанк карта', 'bank', 2.5, 'additive', 'Кешбек 2.5% на топливо'),
-        
-        # Карты АЗС (складываются между собой)
-        ('А100 карта', 'azs', 3.0, 'additive', 'Скидка 3% по карте А100'),
-        ('Лукойл карта', 'azs', 2.0, 'additive', 'Скидка 2% по карте Лукойл'),
-        ('Газпром карта', 'azs', 2.5, 'additive', 'Скидка 2.5% по карте Газпром'),
-        ('Shell карта', 'azs', 2.0, 'additive', 'Скидка 2% по карте Shell'),
-        
-        # Промокоды/акции (берется только максимальный, не складываются)
-        ('Акция выходного дня', 'promo', 5.0, 'max', 'Акция: скидка 5% в выходные'),
-        ('Промокод новичка', 'promo', 7.0, 'max', 'Промокод для новых клиентов'),
-        ('Акция первой заправки', 'promo', 10.0, 'max', 'Скидка 10% на первую заправку'),
-    ]
-    
-    await db.executemany("""
-        INSERT INTO discounts (name, type, discount_percent, apply_rule, description)
-        VALUES (?, ?, ?, ?, ?)
-    """, initial_discounts)
+async def rebuild_price_rollups(db) -> int:
+    """
+    Пересобрать агрегаты price_rollups и price_rollup_bins из истории prices
+
+    Работает порциями; прерванная пересборка при повторном запуске
+    продолжается с места остановки. Можно выполнять при работающем боте:
+    цены новее зафиксированной границы учитывает add_prices.
+    """
+    cursor = await db.execute(
+        "SELECT last_id FROM migration_progress WHERE name = ?", (ROLLUP_REBUILD_BOUND,)
+    )
+    row = await cursor.fetchone()
+    if row:
+        max_id = row[0]
+    else:
+        # Очистка и граница фиксируются атомарно: цены с id выше границы
+        # уже попадут в агрегаты через add_prices
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute("DELETE FROM price_rollups")
+        await db.execute("DELETE FROM price_rollup_bins")
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM prices")
+        max_id = (await cursor.fetchone())[0]
+        await db.execute(
+            "INSERT OR REPLACE INTO migration_progress (name, last_id) VALUES (?, ?)",
+            (ROLLUP_REBUILD_BOUND, max_id)
+        )
+        await db.commit()
+
+    await run_chunked(db, ROLLUP_REBUILD, UPSERT_PRICE_ROLLUPS_SQL, max_id=max_id)
+    await db.execute("DELETE FROM migration_progress WHERE name = ?", (ROLLUP_REBUILD_BOUND,))
     await db.commit()
 
+    cursor = await db.execute("SELECT COUNT(*) FROM price_rollups")
+    return (await cursor.fetchone())[0]
@@ -0,0 +1,160 @@
+"""
+Пул долгоживущих соединений с базой данных
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+from config import DB_PATH, DB_POOL_SIZE, DB_PRAGMAS, DB_STATEMENT_CACHE_SIZE
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Пул соединений aiosqlite.
+
+    Соединения открываются один раз при старте и переиспользуются всеми
+    запросами. Каждое соединение получает одинаковые PRAGMA и собственный
+    кеш подготовленных выражений sqlite3, поэтому повторные запросы с тем же
+    текстом SQL не компилируются заново.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, size: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._connections: List[aiosqlite.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._closed = False
+
+    async def open(self):
+        """Открыть все соединения пула"""
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await self._connect()
+            self._connections.append(conn)
+            self._idle.put_nowait(conn)
+        logger.info(f"Пул соединений открыт: {self.size} шт. ({self.db_path})")
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Создать соединение и применить PRAGMA"""
+        conn = await aiosqlite.connect(
+            self.db_path, cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = aiosqlite.Row
+        for name, value in DB_PRAGMAS.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Взять соединение из пула на время блока"""
+        if self._closed or self._idle is None:
+            raise RuntimeError("Пул соединений не открыт")
+
+        start = time.perf_counter()
+        conn = await self._idle.get()
+        # Ожидание свободного соединения - основная точка конкуренции за БД
+        metrics.observe("db_pool_wait_seconds", time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            await self._release(conn)
+
+    async def _release(self, conn: aiosqlite.Connection):
+        """Вернуть соединение в пул, откатив незавершенную транзакцию"""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception as e:
+            # Соединение повреждено - заменяем новым
+            logger.error(f"Соединение с БД повреждено, пересоздаем: {e}")
+            self._connections.remove(conn)
+            try:
+                await conn.close()
+            except Exception:
+                pass
+            conn = await self._connect()
+            self._connections.append(conn)
+        self._idle.put_nowait(conn)
+
+    async def close(self, timeout: float = 10.0):
+        """Дождаться возврата соединений и закрыть их"""
+        if self._closed or self._idle is None:
+            return
+        self._closed = True
+
+        for _ in range(len(self._connections)):
+            try:
+                conn = await asyncio.wait_for(self._idle.get(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Не все соединения возвращены в пул до закрытия")
+                break
+            await conn.close()
+            self._connections.remove(conn)
+
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+        logger.info("Пул соединений закрыт")
+
+
+_pool: Optional[ConnectionPool] = None
+
+
+async def init_pool(db_path: str = DB_PATH, size: int = DB_POOL_SIZE) -> ConnectionPool:
+    """Создать глобальный пул соединений"""
+    global _pool
+    if _pool is not None:
+        return _pool
+    pool = ConnectionPool(db_path, size)
+    await pool.open()
+    _pool = pool
+    return pool
+
+
+async def close_pool():
+    """Закрыть глобальный пул соединений"""
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+
+
+def get_pool() -> ConnectionPool:
+    """Получить глобальный пул соединений"""
+    if _pool is None:
+        raise RuntimeError("Пул соединений не инициализирован, вызовите init_pool()")
+    return _pool
+
+
+def acquire():
+    """Взять соединение из глобального пула: `async with acquire() as db`"""
+    return get_pool().acquire()
+
+
+@asynccontextmanager
+async def write_transaction(db: aiosqlite.Connection, name: str) -> AsyncIterator[aiosqlite.Connection]:
+    """
+    Транзакция записи: BEGIN IMMEDIATE, блок, COMMIT.
+
+    Блокировка записи SQLite берется сразу. Ожидание ее (другие писатели,
+    busy_timeout) попадает в db_write_lock_wait_seconds, время удержания
+    до фиксации - в db_write_seconds (метка function=name). При исключении
+    транзакцию откатывает возврат соединения в пул.
+    """
+    start = time.perf_counter()
+    await db.execute("BEGIN IMMEDIATE")
+    locked = time.perf_counter()
+    metrics.observe("db_write_lock_wait_seconds", locked - start, function=name)
+    try:
+        yield db
+        await db.commit()
+    finally:
+        metrics.observe("db_write_seconds", time.perf_counter() - locked, function=name)
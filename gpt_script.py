@@ -1,26 +1,40 @@
-import requests
+import argparse
+import asyncio
 import json
-import time
-import math
+import logging
+import os
 import random
-from collections import defaultdict
+
+from osm.diff import (
+    diff_elements, diff_stations, load_snapshot, save_snapshot, snapshot_entry, snapshot_key
+)
+from osm.geocoder import AsyncGeocoder, GeocodeCache, cache_key
+from osm.merge import merge_duplicates
+from osm.report import CatalogStats, write_json
+from osm.overpass import BELARUS_BBOX, TiledOverpassFetcher, split_bbox
 
 # ========== НАСТРОЙКИ ==========
 USE_GEOCODING = True               # можно выключить, если зависает
-MAX_RETRIES = 1                     # для геокодирования достаточно одной попытки
+MAX_RETRIES = 3                     # попыток на точку (повторяются только 429 и 5xx)
 NOMINATIM_TIMEOUT = 3               # таймаут запроса к Nominatim (сек)
-NOMINATIM_DELAY = 0.5                # задержка между запросами (сек) - рискованно, но для ускорения
-OVERPASS_DELAY = 5                   # задержка перед повтором Overpass
+GEOCODE_CONCURRENCY = int(os.getenv("GEOCODE_CONCURRENCY", "4"))   # одновременных запросов
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "1.0"))             # запросов в секунду
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", "geocode_cache.sqlite")
+OVERPASS_DELAY = 5                   # задержка перед повтором Overpass (растет с номером попытки)
+OVERPASS_RETRIES = 4                 # попыток на тайл
+OVERPASS_TILE_DEG = float(os.getenv("OVERPASS_TILE_DEG", "1.0"))     # размер тайла (градусы)
+OVERPASS_CONCURRENCY = int(os.getenv("OVERPASS_CONCURRENCY", "2"))   # тайлов одновременно
+OVERPASS_CHECKPOINT_DIR = os.getenv("OVERPASS_CHECKPOINT_DIR", "overpass_tiles")
 USER_AGENT = "azs-merger/1.0 (your@email.com)"
 # ===============================
 
-OVERPASS_URL = "https://overpass-api.de/api/interpreter"
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/reverse")
 
 OUTPUT_FILE = "belarus_azs_merged.json"
 REPORT_FILE = "belarus_azs_report.json"
-
-GEOCODE_CACHE = {}
+SNAPSHOT_FILE = "belarus_azs_snapshot.json"     # элементы прошлого запуска (для --incremental)
+CHANGESET_FILE = "belarus_azs_changeset.json"   # отличия от прошлого OUTPUT_FILE
 
 FUEL_MAPPING = {
     "fuel:octane_92": "AI_92",
@@ -55,77 +69,60 @@ def translate_days(text):
         text = text.replace(eng, ru)
     return text
 
-def build_query():
-    return """
-    [out:json][timeout:300];
-    area["ISO3166-1"="BY"][admin_level=2]->.searchArea;
-    (
-      node["amenity"="fuel"](area.searchArea);
-      way["amenity"="fuel"](area.searchArea);
-      relation["amenity"="fuel"](area.searchArea);
-    );
-    out center tags;
-    """
-
-def fetch_belarus_azs_with_retries():
-    query = build_query()
-    for attempt in range(1, 3):  # максимум 2 попытки для Overpass
-        try:
-            response = requests.post(
-                OVERPASS_URL,
-                data=query,
-                headers={"User-Agent": USER_AGENT},
-                timeout=120
-            )
-            response.raise_for_status()
-            data = response.json()
-            elements = data.get("elements", [])
-            print(f"Получено элементов: {len(elements)}")
-            return elements
-        except Exception as e:
-            print(f"Ошибка Overpass на попытке {attempt}: {e}")
-            time.sleep(OVERPASS_DELAY)
-    print("Не удалось получить данные от Overpass, завершение.")
-    return []
-
-def reverse_geocode_with_cache(lat, lon):
-    if not USE_GEOCODING:
-        return "unknown"
-
-    key = (round(lat, 5), round(lon, 5))
-    if key in GEOCODE_CACHE:
-        return GEOCODE_CACHE[key]
-
-    params = {
-        "format": "json",
-        "lat": lat,
-        "lon": lon,
-        "accept-language": "ru",
-    }
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            r = requests.get(
-                NOMINATIM_URL,
-                params=params,
-                headers={"User-Agent": USER_AGENT},
-                timeout=NOMINATIM_TIMEOUT
-            )
-            if r.status_code == 200:
-                address = r.json().get("display_name", "unknown")
-                GEOCODE_CACHE[key] = address
-                return address
-            elif r.status_code == 429:
-                print(f"  Nominatim 429, попытка {attempt}")
-            else:
-                print(f"  Nominatim HTTP {r.status_code}, попытка {attempt}")
-        except Exception as e:
-            print(f"  Ошибка Nominatim: {e}")
-
-        if attempt < MAX_RETRIES:
-            time.sleep(1)   # короткая пауза между повторами
-
-    GEOCODE_CACHE[key] = "unknown"
-    return "unknown"
+def fetch_belarus_azs_tiled():
+    """Загрузка АЗС по тайлам; прерванный запуск продолжается с контрольных точек"""
+    tiles = split_bbox(BELARUS_BBOX, OVERPASS_TILE_DEG)
+    fetcher = TiledOverpassFetcher(
+        checkpoint_dir=OVERPASS_CHECKPOINT_DIR,
+        url=OVERPASS_URL,
+        user_agent=USER_AGENT,
+        concurrency=OVERPASS_CONCURRENCY,
+        retries=OVERPASS_RETRIES,
+        retry_delay=OVERPASS_DELAY,
+        out="center tags meta",   # meta - версии элементов для инкрементального режима
+    )
+    elements = asyncio.run(fetcher.fetch(tiles))
+    print(f"Тайлов: {len(tiles)}, загружено {fetcher.fetched}, "
+          f"из контрольных точек {fetcher.from_checkpoint}, с ошибкой {len(fetcher.failed)}")
+
+    if fetcher.failed:
+        print("Не все тайлы загружены. Перезапустите скрипт - загрузятся только недостающие.")
+        return []
+
+    fetcher.clear_checkpoints(tiles)
+    print(f"Получено элементов: {len(elements)}")
+    return elements
+
+def geocode_missing_addresses(stations):
+    """Дозаполнить адреса станций без addr:* тегов обратным геокодированием"""
+    missing = [s for s in stations
+               if s["address"] == "unknown" and s["latitude"] and s["longitude"]]
+    if not USE_GEOCODING or not missing:
+        return 0
+
+    cache = GeocodeCache(GEOCODE_CACHE_PATH)
+    geocoder = AsyncGeocoder(
+        cache=cache,
+        url=NOMINATIM_URL,
+        user_agent=USER_AGENT,
+        concurrency=GEOCODE_CONCURRENCY,
+        rate=GEOCODE_RATE,
+        timeout=NOMINATIM_TIMEOUT,
+        retries=MAX_RETRIES,
+    )
+    try:
+        addresses = asyncio.run(geocoder.geocode_many(
+            (s["latitude"], s["longitude"]) for s in missing
+        ))
+    finally:
+        cache.close()
+
+    for s in missing:
+        s["address"] = addresses.get(cache_key(s["latitude"], s["longitude"]), "unknown")
+
+    print(f"Геокодирование: {len(missing)} станций, из кеша {geocoder.cache_hits}, "
+          f"запросов {geocoder.requests}, ошибок {geocoder.failures}")
+    return len(missing)
 
 def extract_fuels(tags):
     fuels = {}
@@ -152,15 +149,9 @@ def build_station(element):
         address_parts.append(tags["addr:street"])
     if tags.get("addr:housenumber"):
         address_parts.append(tags["addr:housenumber"])
+    # Станции без адреса в тегах геокодирует geocode_missing_addresses
     address = ", ".join(address_parts) if address_parts else ""
 
-    # Геокодируем только если нет адреса в тегах и это разрешено
-    need_geocode = (not address) and lat and lon and USE_GEOCODING
-    if need_geocode:
-        address = reverse_geocode_with_cache(lat, lon)
-        if address != "unknown":
-            time.sleep(NOMINATIM_DELAY)   # пауза только при успешном запросе
-
     return {
         "id": element["id"],
         "name": name,
@@ -178,106 +169,88 @@ def build_station(element):
         "city": tags.get("addr:city", "unknown"),
     }
 
-def distance(a, b):
-    if a["latitude"] is None or b["latitude"] is None:
-        return float("inf")
-    return math.sqrt((a["latitude"] - b["latitude"])**2 + (a["longitude"] - b["longitude"])**2)
-
-def merge_duplicates(stations):
-    merged = []
-    used = set()
-    for i, s1 in enumerate(stations):
-        if i in used:
-            continue
-        duplicates = [s1]
-        used.add(i)
-        for j, s2 in enumerate(stations):
-            if j in used:
-                continue
-            if distance(s1, s2) < 0.0005:
-                duplicates.append(s2)
-                used.add(j)
-        merged_station = s1.copy()
-        merged_station["fuelPrices"] = {}
-        for d in duplicates:
-            merged_station["fuelPrices"].update(d["fuelPrices"])
-            if merged_station["name"] == "unknown" and d["name"] != "unknown":
-                merged_station["name"] = d["name"]
-            if merged_station["brand"] == "unknown" and d["brand"] != "unknown":
-                merged_station["brand"] = d["brand"]
-            if merged_station["workingHours"] == "unknown" and d["workingHours"] != "unknown":
-                merged_station["workingHours"] = d["workingHours"]
-            for field in ["hasCafe", "hasShop", "hasWash"]:
-                if merged_station[field] == "unknown" and d[field] == "yes":
-                    merged_station[field] = "yes"
-        merged.append(merged_station)
-    return merged
-
-def build_report(stations):
-    brands = defaultdict(list)
-    for s in stations:
-        brands[s["brand"]].append(s)
-
-    report = {
-        "brand_count": {k: len(v) for k, v in brands.items()},
-        "brand_stations": {k: [x["name"] for x in v] for k, v in brands.items()},
-        "name_unknown": [s["id"] for s in stations if s["name"] == "unknown"],
-        "brand_unknown": [s["id"] for s in stations if s["brand"] == "unknown"],
-        "coords_missing": [s["id"] for s in stations if s["latitude"] is None],
-        "no_fuels": [s["id"] for s in stations if len(s["fuelPrices"]) == 0],
-        "few_fuels": [s["id"] for s in stations if 0 < len(s["fuelPrices"]) <= 3],
-        "workingHours_unknown": [s["id"] for s in stations if s["workingHours"] == "unknown"],
-        "hasCafe_unknown": [s["id"] for s in stations if s["hasCafe"] == "unknown"],
-        "hasShop_unknown": [s["id"] for s in stations if s["hasShop"] == "unknown"],
-        "hasWash_unknown": [s["id"] for s in stations if s["hasWash"] == "unknown"],
-    }
-    return report
+def build_stations(elements):
+    """Станции из элементов Overpass (с геокодированием недостающих адресов)"""
+    built = []
+    total = len(elements)
+    for idx, e in enumerate(elements, 1):
+        try:
+            built.append((e, build_station(e)))
+        except Exception as ex:
+            print(f"Ошибка при обработке элемента {e.get('id')}: {ex}")
+
+        if idx % 1000 == 0:
+            print(f"  обработано {idx}/{total} элементов...", flush=True)
+
+    if USE_GEOCODING:
+        geocode_count = geocode_missing_addresses([station for _, station in built])
+        print(f"Потребовали геокодирования (адрес отсутствовал в тегах): {geocode_count}")
+    return built
+
+def load_previous_output():
+    try:
+        with open(OUTPUT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сбор каталога АЗС Беларуси из OpenStreetMap")
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="обработать заново только новые и измененные элементы (по снимку прошлого запуска)"
+    )
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="  %(message)s")
     print("Запрос всех АЗС на территории Беларуси...")
-    elements = fetch_belarus_azs_with_retries()
+    elements = fetch_belarus_azs_tiled()
     if not elements:
         print("Нет данных для обработки. Завершение.")
         return
     print(f"Всего получено элементов: {len(elements)}")
 
-    print("Построение станций...")
-    stations = []
-    total = len(elements)
-    geocode_count = 0
+    snapshot = load_snapshot(SNAPSHOT_FILE) if args.incremental else {}
+    if args.incremental and not snapshot:
+        print("Снимок прошлого запуска не найден, выполняется полная сборка")
 
-    for idx, e in enumerate(elements, 1):
-        try:
-            # Подсчёт потенциальных геокодирований (для информации)
-            tags = e.get("tags", {})
-            if USE_GEOCODING and not (tags.get("addr:street") or tags.get("addr:housenumber")) and (e.get("lat") or e.get("center")):
-                geocode_count += 1
+    diff = diff_elements(elements, snapshot)
+    print(f"Элементов: новых {len(diff.added)}, измененных {len(diff.changed)}, "
+          f"без изменений {len(diff.unchanged)}, удаленных {len(diff.removed)}")
 
-            station = build_station(e)
-            stations.append(station)
-        except Exception as ex:
-            print(f"Ошибка при обработке элемента {e.get('id')}: {ex}")
-
-        if idx % 50 == 0:
-            print(f"  обработано {idx}/{total} элементов...", flush=True)
+    print("Построение станций...")
+    new_snapshot = {key: snapshot[key] for key in diff.unchanged}
+    for element, station in build_stations(diff.added + diff.changed):
+        new_snapshot[snapshot_key(element)] = snapshot_entry(element, station)
+    save_snapshot(SNAPSHOT_FILE, new_snapshot)
 
+    stations = [entry["station"] for entry in new_snapshot.values()]
     print(f"Собрано станций до слияния: {len(stations)}")
-    if USE_GEOCODING:
-        print(f"Из них потребовали геокодирования (адрес отсутствовал в тегах): {geocode_count}")
 
     print("Слияние дубликатов...")
     stations = merge_duplicates(stations)
 
+    previous = load_previous_output()
+    if previous is not None:
+        changeset = diff_stations(previous, stations)
+        with open(CHANGESET_FILE, "w", encoding="utf-8") as f:
+            json.dump(changeset, f, ensure_ascii=False, indent=2)
+        print(f"Изменения каталога: добавлено {len(changeset['added'])}, "
+              f"изменено {len(changeset['changed'])}, удалено {len(changeset['removed'])} "
+              f"-> {CHANGESET_FILE}")
+
     print(f"Сохранение результата в {OUTPUT_FILE}...")
     with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
         json.dump(stations, f, ensure_ascii=False, indent=2)
 
     print("Построение отчёта...")
-    report = build_report(stations)
+    stats = CatalogStats().add_all(stations)
     with open(REPORT_FILE, "w", encoding="utf-8") as f:
-        json.dump(report, f, ensure_ascii=False, indent=2)
+        write_json(stats, f)
 
     print("ГОТОВО")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
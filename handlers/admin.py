@@ -1,15 +1,85 @@
 """
-Административные команды (на будущее)
+Административные команды
 """
+import asyncio
+import json
+import logging
+from typing import Any, Dict
+
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.filters import Command
 
+from data import catalog
+from database.catalog_import import apply_changeset
+from database.pool import acquire
+from services.metrics import metrics
+from config import ADMIN_IDS, CATALOG_CHANGESET_PATH
+
+logger = logging.getLogger(__name__)
+
 router = Router()
 
+# Ограничение Telegram на длину сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+
+def _read_json(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+async def apply_catalog_changeset(path: str) -> str:
+    """
+    Применить changeset каталога без перезапуска: таблица azs, индекс
+    /fuel и /compare в памяти и файл каталога, из которого индекс строится
+    при следующем запуске
+    """
+    changeset = await asyncio.to_thread(_read_json, path)
+    async with acquire() as db:
+        stats = await apply_changeset(db, changeset)
+    indexed = catalog.apply_changeset(changeset)
+    total = await asyncio.to_thread(catalog.apply_changeset_to_file, changeset)
+    logger.info(f"Changeset {path} применен: {stats}, индекс: {indexed}, в каталоге {total}")
+    return (
+        f"✅ Changeset {path} применен\n\n"
+        f"АЗС в базе: добавлено {stats['inserted']}, обновлено {stats['updated']}, "
+        f"без изменений {stats['unchanged']}, удалено {stats['removed']}\n"
+        f"Индекс поиска: обновлено станций {indexed}, всего {len(catalog.get_station_index())}\n"
+        f"Файл каталога: {total} станций"
+    )
+
 
 @router.message(Command("admin"))
 async def cmd_admin(message: Message):
-    """Административные команды (заглушка)"""
-    await message.answer("🔧 Административные функции будут добавлены позже.")
+    """Административные команды (только для ADMIN_IDS)"""
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("⛔ Команда доступна только администраторам")
+        return
+
+    args = message.text.split()[1:]
+
+    if args and args[0] == "stats":
+        text = metrics.render_text()
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 20] + "\n... (обрезано)"
+        await message.answer(text)
+        return
+
+    if args and args[0] == "catalog":
+        path = args[1] if len(args) > 1 else CATALOG_CHANGESET_PATH
+        try:
+            text = await apply_catalog_changeset(path)
+        except FileNotFoundError:
+            text = f"❌ Файл {path} не найден"
+        except (ValueError, KeyError) as e:
+            text = f"❌ Некорректный changeset {path}: {e}"
+        await message.answer(text)
+        return
 
+    await message.answer(
+        "🔧 Административные команды\n\n"
+        "/admin stats - задержки обработчиков, запросов к БД и расчетов\n"
+        f"/admin catalog [файл] - применить changeset каталога без перезапуска "
+        f"(по умолчанию {CATALOG_CHANGESET_PATH})"
+    )
@@ -1,73 +1,235 @@
 """
 Обработчики команды /compare для сравнения всех вариантов
+
+Расчет выполняется один раз: отсортированная таблица сохраняется в
+кеше пользователя на COMPARE_CACHE_TTL секунд. Страницы и фильтры
+(сеть, расстояние) строятся по сохраненной таблице при нажатии кнопок,
+без повторного расчета.
 """
-from aiogram import Router
-from aiogram.types import Message
+import secrets
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from aiogram import Router, F
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
+import numpy as np
 
 from database.crud import get_or_create_user
-from services.calculator import FuelCalculator
-from data.stations import get_all_stations
-from config import ТИПЫ_ТОПЛИВА
+from services.cache import TTLCache
+from services.calculator import FuelCalculator, CalculationBatch
+from data.catalog import get_user_stations
+from config import (
+    ТИПЫ_ТОПЛИВА,
+    COMPARE_CACHE_SIZE,
+    COMPARE_CACHE_TTL,
+    COMPARE_PAGE_SIZE,
+    COMPARE_MAX_NETWORKS,
+    COMPARE_DISTANCES
+)
 
 router = Router()
 calculator = FuelCalculator()
 
 
+class CompareResult:
+    """Отсортированный результат /compare одного пользователя"""
+
+    def __init__(self, batch: CalculationBatch, order: np.ndarray, title: str,
+                 fuel_type: str, liters: float):
+        # Идентификатор результата в callback_data: кнопки старого
+        # сообщения не должны листать новый результат
+        self.id = secrets.token_hex(3)
+        self.batch = batch
+        self.order = np.asarray(order, dtype=np.intp)
+        self.title = title
+        self.fuel_type = fuel_type
+        self.liters = liters
+
+        self.network_column = np.array([s.get("network") or "" for s in batch.stations], dtype=object)
+        counts = Counter(self.network_column[self.order])
+        counts.pop("", None)
+        # Сети для фильтра: самые частые в результате
+        self.networks = [name for name, _ in counts.most_common(COMPARE_MAX_NETWORKS)]
+        self._views: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def view(self, network: int, max_distance: int) -> np.ndarray:
+        """Строки результата с учетом фильтров, в порядке сортировки"""
+        key = (network, max_distance)
+        rows = self._views.get(key)
+        if rows is None:
+            rows = self.order
+            if 0 <= network < len(self.networks):
+                rows = rows[self.network_column[rows] == self.networks[network]]
+            if max_distance:
+                rows = rows[self.batch["distance"][rows] <= max_distance]
+            self._views[key] = rows
+        return rows
+
+
+compare_cache = TTLCache(maxsize=COMPARE_CACHE_SIZE, ttl=COMPARE_CACHE_TTL)
+
+
+def render_page(result: CompareResult, network: int, max_distance: int, page: int) -> Tuple[str, int]:
+    """Текст страницы и итоговый номер страницы (с учетом границ)"""
+    rows = result.view(network, max_distance)
+    pages = max(1, -(-len(rows) // COMPARE_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+
+    text = result.title
+    text += f"Топливо: {ТИПЫ_ТОПЛИВА.get(result.fuel_type, result.fuel_type)}\n"
+    text += f"Количество: {result.liters:.1f} л\n"
+    if 0 <= network < len(result.networks):
+        text += f"Сеть: {result.networks[network]}\n"
+    if max_distance:
+        text += f"Расстояние: до {max_distance} км\n"
+    text += "\nСортировка: по полной стоимости (возрастание)\n\n"
+
+    if not len(rows):
+        text += "Нет АЗС, подходящих под фильтры"
+        return text, page
+
+    start = page * COMPARE_PAGE_SIZE
+    for idx, row in enumerate(rows[start:start + COMPARE_PAGE_SIZE], start + 1):
+        calc = result.batch.row(int(row))
+        station = calc["station"]
+        text += f"{idx}. {station['network']} {station['name']}\n"
+        text += f"   💰 {calc['base_price']:.2f} → {calc['final_price']:.2f} BYN/л"
+        if calc.get('total_discount_percent', 0) > 0:
+            text += f" (скидка {calc['total_discount_percent']:.1f}%)"
+        text += f"\n   📍 {calc['distance']:.1f} км | "
+        text += f"💸 {calc['total_cost']:.2f} BYN\n"
+        text += f"   ⏱️ {calc['time_minutes']:.0f} мин | "
+        text += f"🛣️ {calc['fuel_for_trip']:.1f}л на дорогу\n\n"
+
+    return text, page
+
+
+def get_compare_keyboard(result: CompareResult, network: int, max_distance: int,
+                         page: int) -> InlineKeyboardMarkup:
+    """Клавиатура листания и фильтров; состояние вида хранится в callback_data"""
+    def data(p: int, n: int, d: int) -> str:
+        return f"cmp:{result.id}:{p}:{n}:{d}"
+
+    rows = result.view(network, max_distance)
+    pages = max(1, -(-len(rows) // COMPARE_PAGE_SIZE))
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=data(page - 1, network, max_distance)))
+    nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="cmp_noop"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=data(page + 1, network, max_distance)))
+    buttons: List[List[InlineKeyboardButton]] = [nav]
+
+    # При смене фильтра листание начинается с первой страницы
+    if result.networks:
+        options = [(-1, "Все сети")] + list(enumerate(result.networks))
+        row = []
+        for code, name in options:
+            mark = "✅ " if code == network else ""
+            row.append(InlineKeyboardButton(text=mark + name, callback_data=data(0, code, max_distance)))
+            if len(row) == 3:
+                buttons.append(row)
+                row = []
+        if row:
+            buttons.append(row)
+
+    distance_row = []
+    for km in (0,) + tuple(COMPARE_DISTANCES):
+        mark = "✅ " if km == max_distance else ""
+        label = f"≤{km} км" if km else "Любое"
+        distance_row.append(InlineKeyboardButton(text=mark + label, callback_data=data(0, network, km)))
+    buttons.append(distance_row)
+
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 @router.message(Command("compare"))
 async def cmd_compare(message: Message):
     """Сравнение всех вариантов АЗС"""
     args = message.text.split()[1:] if len(message.text.split()) > 1 else []
-    
+
     if len(args) < 2:
         await message.answer(
             "❌ Неверный формат команды.\n\n"
-            "Использование: /compare <тип_топлива> <литры>\n"
-            "Пример: /compare 95 40"
+            "Использование: /compare <тип_топлива> <литры> [парето]\n"
+            "Пример: /compare 95 40\n\n"
+            "С флагом «парето» показываются только варианты, которые нельзя "
+            "улучшить по цене, не проиграв во времени"
         )
         return
-    
+
     fuel_type = args[0].lower()
+    only_front = len(args) > 2 and args[2].lower() in ("парето", "pareto")
     try:
         liters = float(args[1])
     except ValueError:
         await message.answer("❌ Неверный формат количества литров")
         return
-    
+
     if fuel_type not in ТИПЫ_ТОПЛИВА:
         await message.answer(f"❌ Тип топлива '{fuel_type}' не поддерживается")
         return
-    
+
     user = await get_or_create_user(message.from_user.id, message.from_user.username)
-    stations = get_all_stations()
-    
-    calculations = []
-    for station in stations:
-        calc = await calculator.calculate(user, station, liters, fuel_type)
-        if calc:
-            calculations.append((station, calc))
-    
-    if not calculations:
+    stations = await get_user_stations(user, fuel_type)
+    if not stations:
+        await message.answer(
+            f"😔 Рядом с вами нет АЗС с ценами на {ТИПЫ_ТОПЛИВА.get(fuel_type, fuel_type)} "
+            f"от пользователей.\n\nДобавьте цену командой /addprice"
+        )
+        return
+
+    batch = await calculator.calculate_batch(user, stations, liters, fuel_type)
+
+    if not len(batch):
         await message.answer("❌ Нет доступных АЗС для сравнения")
         return
-    
-    # Сортируем по полной стоимости
-    calculations.sort(key=lambda x: x[1]["total_cost"])
-    
-    text = f"📊 СРАВНЕНИЕ ВСЕХ ВАРИАНТОВ\n\n"
-    text += f"Топливо: {ТИПЫ_ТОПЛИВА.get(fuel_type, fuel_type)}\n"
-    text += f"Количество: {liters:.1f} л\n\n"
-    text += "Сортировка: по полной стоимости (возрастание)\n\n"
-    
-    for idx, (station, calc) in enumerate(calculations, 1):
-        text += f"{idx}. {station['network']} {station['name']}\n"
-        text += f"   💰 {calc['base_price']:.2f} → {calc['final_price']:.2f} BYN/л"
-        if calc.get('total_discount_percent', 0) > 0:
-            text += f" (скидка {calc['total_discount_percent']:.1f}%)"
-        text += f"\n   📍 {calc['distance']:.1f} км | "
-        text += f"💸 {calc['total_cost']:.2f} BYN\n"
-        text += f"   ⏱️ {calc['time_minutes']:.0f} мин | "
-        text += f"🛣️ {calc['fuel_for_trip']:.1f}л на дорогу\n\n"
-    
-    await message.answer(text)
 
+    if only_front:
+        # Парето-фронт уже упорядочен по полной стоимости
+        order = batch.pareto_front()
+        title = "📊 ОПТИМАЛЬНЫЕ ВАРИАНТЫ (ПАРЕТО)\n\n"
+    else:
+        # Сортируем по полной стоимости (стабильно, как list.sort)
+        order = np.argsort(batch["total_cost"], kind="stable")
+        title = "📊 СРАВНЕНИЕ ВСЕХ ВАРИАНТОВ\n\n"
+
+    result = CompareResult(batch, order, title, fuel_type, liters)
+    compare_cache.set(message.from_user.id, result)
+
+    text, page = render_page(result, -1, 0, 0)
+    await message.answer(text, reply_markup=get_compare_keyboard(result, -1, 0, page))
+
+
+@router.callback_query(F.data == "cmp_noop")
+async def process_compare_noop(callback: CallbackQuery):
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("cmp:"))
+async def process_compare_page(callback: CallbackQuery):
+    """Листание и фильтры по сохраненному результату"""
+    try:
+        _, result_id, page, network, max_distance = callback.data.split(":")
+        page, network, max_distance = int(page), int(network), int(max_distance)
+    except ValueError:
+        await callback.answer("❌ Неверные данные", show_alert=True)
+        return
+
+    result = compare_cache.get(callback.from_user.id)
+    if result is None or result.id != result_id:
+        await callback.answer("⌛ Результат устарел, повторите /compare", show_alert=True)
+        return
+
+    text, page = render_page(result, network, max_distance, page)
+    try:
+        await callback.message.edit_text(
+            text, reply_markup=get_compare_keyboard(result, network, max_distance, page)
+        )
+    except TelegramBadRequest:
+        # Повторное нажатие на уже выбранный фильтр - сообщение не изменилось
+        pass
+    await callback.answer()
@@ -0,0 +1,115 @@
+"""
+Обработчики команд для работы с дисконтами
+"""
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command
+
+from database.crud import get_or_create_user
+from services.discount_service import DiscountService
+from config import DISCOUNT_TYPES, DISCOUNT_CATEGORY_RULES, DISCOUNT_RULES
+
+router = Router()
+discount_service = DiscountService()
+
+
+def parse_discount_id(message: Message):
+    """Получить ID дисконта из аргумента команды"""
+    args = message.text.split()[1:] if len(message.text.split()) > 1 else []
+    if not args or not args[0].isdigit():
+        return None
+    return int(args[0])
+
+
+@router.message(Command("discounts"))
+async def cmd_discounts(message: Message):
+    """Дисконты пользователя"""
+    await get_or_create_user(message.from_user.id, message.from_user.username)
+    user_discounts = await discount_service.get_user_discounts(message.from_user.id)
+
+    if not user_discounts:
+        await message.answer(
+            "💳 У вас пока нет дисконтов.\n\n"
+            "Список доступных: /discounts_list\n"
+            "Добавить: /discounts_add <ID>"
+        )
+        return
+
+    plan = discount_service.compile_plan(user_discounts)
+
+    text = "💳 ВАШИ ДИСКОНТЫ\n\n"
+    for discount in user_discounts:
+        marker = "✅" if discount in plan.applied_discounts else "▫️"
+        text += f"{marker} [{discount['id']}] {discount['name']} - {discount['discount_percent']:.1f}%\n"
+
+    text += f"\n💰 Итоговая скидка: {plan.total_discount_percent:.1f}%\n"
+    for category, percent in plan.breakdown.items():
+        text += f"  • {DISCOUNT_TYPES.get(category, category)}: {percent:.1f}%\n"
+
+    text += "\nУдалить: /discounts_remove <ID>"
+    await message.answer(text)
+
+
+@router.message(Command("discounts_list"))
+async def cmd_discounts_list(message: Message):
+    """Справочник доступных дисконтов"""
+    discounts = await discount_service.get_all_discounts()
+
+    if not discounts:
+        await message.answer("😔 Справочник дисконтов пуст")
+        return
+
+    text = "📋 ДОСТУПНЫЕ ДИСКОНТЫ\n"
+    current_type = None
+    for discount in discounts:
+        if discount["type"] != current_type:
+            current_type = discount["type"]
+            rule = DISCOUNT_CATEGORY_RULES.get(current_type, discount["apply_rule"])
+            text += f"\n{DISCOUNT_TYPES.get(current_type, current_type)} ({DISCOUNT_RULES.get(rule, rule).lower()}):\n"
+        text += f"  [{discount['id']}] {discount['name']} - {discount['discount_percent']:.1f}%\n"
+
+    text += "\nДобавить: /discounts_add <ID>"
+    await message.answer(text)
+
+
+@router.message(Command("discounts_add"))
+async def cmd_discounts_add(message: Message):
+    """Добавление дисконта"""
+    discount_id = parse_discount_id(message)
+    if discount_id is None:
+        await message.answer(
+            "❌ Укажите ID дисконта.\n\n"
+            "Использование: /discounts_add <ID>\n"
+            "Список: /discounts_list"
+        )
+        return
+
+    await get_or_create_user(message.from_user.id, message.from_user.username)
+    if not await discount_service.add_user_discount(message.from_user.id, discount_id):
+        await message.answer(f"❌ Дисконт с ID {discount_id} не найден")
+        return
+
+    plan = await discount_service.get_discount_plan(message.from_user.id)
+    await message.answer(
+        f"✅ Дисконт добавлен\n\n"
+        f"💰 Итоговая скидка: {plan.total_discount_percent:.1f}%\n"
+        f"Ваши дисконты: /discounts"
+    )
+
+
+@router.message(Command("discounts_remove"))
+async def cmd_discounts_remove(message: Message):
+    """Удаление дисконта"""
+    discount_id = parse_discount_id(message)
+    if discount_id is None:
+        await message.answer(
+            "❌ Укажите ID дисконта.\n\n"
+            "Использование: /discounts_remove <ID>"
+        )
+        return
+
+    if not await discount_service.remove_user_discount(message.from_user.id, discount_id):
+        await message.answer(f"❌ У вас нет дисконта с ID {discount_id}")
+        return
+
+    await message.answer("✅ Дисконт удален\nВаши дисконты: /discounts")
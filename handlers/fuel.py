@@ -2,15 +2,16 @@
 Обработчики команды /fuel для расчета оптимальной заправки
 """
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database.crud import get_or_create_user
+from database.crud import get_or_create_user, update_user_profile
+from data.catalog import get_stations_near, get_user_stations
 from services.recommender import RecommendationEngine
 from services.formatter import MessageFormatter
-from keyboards.fuel_kb import get_fuel_type_selection_keyboard
+from keyboards.fuel_kb import get_fuel_type_selection_keyboard, get_location_keyboard
 from config import ТИПЫ_ТОПЛИВА
 
 router = Router()
@@ -51,6 +52,42 @@ async def cmd_fuel(message: Message, state: FSMContext):
         )
 
 
+@router.message(Command("location"))
+async def cmd_location(message: Message):
+    """Запрос геопозиции для поиска ближайших АЗС"""
+    await message.answer(
+        "📍 Отправьте ваше местоположение кнопкой ниже.\n\n"
+        "Бот будет искать АЗС по всей Беларуси рядом с вами "
+        "в пределах максимального расстояния из профиля.",
+        reply_markup=get_location_keyboard()
+    )
+
+
+@router.message(F.location)
+async def process_location(message: Message):
+    """Сохранение геопозиции пользователя"""
+    lat = message.location.latitude
+    lon = message.location.longitude
+    
+    await get_or_create_user(message.from_user.id, message.from_user.username)
+    user = await update_user_profile(message.from_user.id, lat=lat, lon=lon)
+    
+    radius = user.get("max_willing_distance", 10.0)
+    stations = get_stations_near(lat, lon, radius)
+    nearest = stations[0] if stations else None
+    
+    text = "✅ Местоположение сохранено\n\n"
+    if nearest and nearest["distance"] <= radius:
+        text += f"⛽ АЗС в радиусе {radius:.0f} км: {len(stations)}\n"
+    else:
+        text += f"⚠️ В радиусе {radius:.0f} км АЗС не найдено, используем ближайшие\n"
+    if nearest:
+        text += f"📍 Ближайшая: {nearest['network']} {nearest['name']} ({nearest['distance']:.1f} км)\n"
+    text += "\n📋 Начните расчет: /fuel 95 40"
+    
+    await message.answer(text, reply_markup=ReplyKeyboardRemove())
+
+
 @router.callback_query(F.data.startswith("fuelcalc_"), FuelStates.waiting_liters)
 async def process_fuel_type_selection(callback: CallbackQuery, state: FSMContext):
     """Обработка выбора типа топлива"""
@@ -115,7 +152,16 @@ async def process_fuel_calculation(message: Message, fuel_type: str, liters: flo
     user = await get_or_create_user(message.from_user.id, message.from_user.username)
     
     # Получаем рекомендации
-    recommendations = await recommender.get_recommendations(user, liters, fuel_type)
+    stations = await get_user_stations(user, fuel_type)
+    if not stations:
+        await message.answer(
+            f"😔 Рядом с вами нет АЗС с ценами на {ТИПЫ_ТОПЛИВА.get(fuel_type, fuel_type)} "
+            f"от пользователей.\n\nДобавьте цену командой /addprice"
+        )
+        return
+    recommendations = await recommender.get_recommendations(
+        user, liters, fuel_type, stations
+    )
     
     if "error" in recommendations:
         await message.answer(f"❌ {recommendations['error']}")
@@ -10,17 +10,17 @@ from aiogram.fsm.state import State, StatesGroup
 from database.crud import (
     get_latest_prices_by_city_and_fuel,
     get_price_age_minutes,
-    add_price,
-    get_all_azs_by_city,
+    get_azs_page,
     get_azs_by_id
 )
+from database.ingest import price_queue
 from keyboards.inline_kb import (
     get_network_keyboard,
     get_fuel_type_keyboard,
     get_azs_keyboard
 )
 from services.validation import validate_price, validate_city, validate_fuel_type
-from config import СЕТИ_АЗС, ТИПЫ_ТОПЛИВА, ЛИМИТ_ВЫВОДА_ЦЕН
+from config import СЕТИ_АЗС, ТИПЫ_ТОПЛИВА, ЛИМИТ_ВЫВОДА_ЦЕН, AZS_PAGE_SIZE
 
 router = Router()
 
@@ -151,14 +151,14 @@ async def process_fuel_type(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     network = data.get('network')
     
-    await state.update_data(fuel_type=fuel_code, fuel_name=fuel_name)
+    # АЗС выбранной сети (пока для Минска, можно расширить)
+    city = "Минск"
+    await state.update_data(fuel_type=fuel_code, fuel_name=fuel_name, city=city)
     await state.set_state(AddPriceStates.waiting_azs)
     
-    # Получаем список АЗС выбранной сети (пока для Минска, можно расширить)
-    azs_list = await get_all_azs_by_city("Минск")
-    filtered_azs = [azs for azs in azs_list if azs['network'] == network]
+    azs_list, has_next = await load_azs_page(network, city, 0)
     
-    if not filtered_azs:
+    if not azs_list:
         await callback.message.edit_text(
             f"❌ АЗС сети {network} не найдены в базе.\n"
             f"Пожалуйста, выберите другую сеть."
@@ -174,7 +174,30 @@ async def process_fuel_type(callback: CallbackQuery, state: FSMContext):
     await callback.message.edit_text(
         f"✅ Выбрано топливо: {fuel_name}\n\n"
         "Шаг 3: Выберите АЗС",
-        reply_markup=get_azs_keyboard(filtered_azs)
+        reply_markup=get_azs_keyboard(azs_list, 0, has_next)
+    )
+    await callback.answer()
+
+
+async def load_azs_page(network: str, city: str, page: int):
+    """Страница АЗС и признак следующей страницы (запрашивается на одну АЗС больше)"""
+    azs_list = await get_azs_page(network, city, AZS_PAGE_SIZE + 1, page * AZS_PAGE_SIZE)
+    return azs_list[:AZS_PAGE_SIZE], len(azs_list) > AZS_PAGE_SIZE
+
+
+@router.callback_query(F.data.startswith("azspage_"), AddPriceStates.waiting_azs)
+async def process_azs_page(callback: CallbackQuery, state: FSMContext):
+    """Листание списка АЗС"""
+    page = max(int(callback.data.split("_")[1]), 0)
+    data = await state.get_data()
+    
+    azs_list, has_next = await load_azs_page(data.get('network'), data.get('city', "Минск"), page)
+    if not azs_list:
+        await callback.answer("Больше АЗС нет")
+        return
+    
+    await callback.message.edit_reply_markup(
+        reply_markup=get_azs_keyboard(azs_list, page, has_next)
     )
     await callback.answer()
 
@@ -218,8 +241,8 @@ async def process_price(message: Message, state: FSMContext):
         fuel_type = data.get('fuel_type')
         user_id = message.from_user.id
         
-        # Добавляем цену в БД
-        price_id = await add_price(azs_id, fuel_type, price, user_id)
+        # Цена уходит в очередь пакетной записи, пользователю отвечаем сразу
+        await price_queue.submit(azs_id, fuel_type, price, user_id)
         
         fuel_name = data.get('fuel_name', fuel_type)
         azs_address = data.get('azs_address', '')
@@ -47,7 +47,7 @@ async def cmd_profile(message: Message):
     # Показываем дисконты
     user_discounts = await discount_service.get_user_discounts(message.from_user.id)
     if user_discounts:
-        total_discount = sum(d["discount_percent"] for d in user_discounts)
+        total_discount = discount_service.compile_plan(user_discounts).total_discount_percent
         text += f"\n💳 Активных дисконтов: {len(user_discounts)} (итого {total_discount:.1f}%)\n"
         text += f"Просмотр: /discounts"
     else:
@@ -44,6 +44,7 @@ async def cmd_start(message: Message):
 /profile - просмотр профиля
 /balance - выбор приоритета (для обычных водителей)
 /compare <тип> <литры> - сравнение всех вариантов
+/location - указать местоположение для поиска АЗС рядом
 /help - подробная инструкция
 
 Пример: /fuel 95 40
@@ -105,6 +106,12 @@ async def cmd_help(message: Message):
 /balance - выбор приоритета (только для обычных водителей)
 
 /compare <тип> <литры> - сравнение всех вариантов АЗС
+/compare <тип> <литры> парето - только оптимальные по цене и времени
+
+/location - отправить местоположение: расчет по всем АЗС Беларуси рядом с вами
+
+/stats <город> <тип> - динамика цен за 2 недели по дням
+/stats <город> <тип> часы - динамика за сутки по часам
 
 📋 КАТЕГОРИИ ВОДИТЕЛЕЙ:
 
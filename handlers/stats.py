@@ -0,0 +1,96 @@
+"""
+Обработчик команды /stats: динамика цен по городу и топливу
+
+Данные берутся только из агрегатов price_rollups (см. crud.get_price_stats),
+поэтому ответ не замедляется с ростом истории цен.
+"""
+from aiogram import Router
+from aiogram.types import Message
+from aiogram.filters import Command
+
+from database.crud import get_price_stats
+from services.validation import validate_city, validate_fuel_type
+from config import ТИПЫ_ТОПЛИВА, STATS_DAYS, STATS_HOURS, STATS_BAR_WIDTH
+
+router = Router()
+
+# Необязательный третий аргумент: почасовая динамика
+HOURLY_ARGS = ('часы', 'час', 'ч', '24ч')
+
+
+def render_chart(rows: list, period: str) -> str:
+    """Текстовый график медианной цены: строка на период"""
+    low = min(row['min_price'] for row in rows)
+    high = max(row['max_price'] for row in rows)
+    span = high - low
+
+    text = ""
+    for row in rows:
+        if period == 'hour':
+            label = row['period_start'][11:16]
+        else:
+            label = f"{row['period_start'][8:10]}.{row['period_start'][5:7]}"
+        median = row['median_price']
+        filled = round((median - low) / span * (STATS_BAR_WIDTH - 1)) + 1 if span else STATS_BAR_WIDTH
+        bar = "█" * filled + "░" * (STATS_BAR_WIDTH - filled)
+        text += (
+            f"{label} {bar} {median:.2f} "
+            f"({row['min_price']:.2f}–{row['max_price']:.2f}, {row['count']} шт.)\n"
+        )
+    return text
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message):
+    """Обработчик команды /stats"""
+    args = message.text.split()[1:] if len(message.text.split()) > 1 else []
+
+    if len(args) < 2:
+        await message.answer(
+            "❌ Неверный формат команды.\n\n"
+            "Использование: /stats <город> <тип_топлива> [часы]\n"
+            "Пример: /stats Минск 95\n"
+            "Почасовая динамика за сутки: /stats Минск 95 часы"
+        )
+        return
+
+    city = args[0].capitalize()
+    fuel_type = args[1].lower()
+    hourly = len(args) > 2 and args[2].lower() in HOURLY_ARGS
+
+    if not validate_city(city):
+        await message.answer(f"❌ Город '{city}' не найден в списке.")
+        return
+
+    if not validate_fuel_type(fuel_type):
+        await message.answer(
+            f"❌ Тип топлива '{fuel_type}' не поддерживается.\n"
+            f"Доступные типы: 92, 95, 98, дт, газ"
+        )
+        return
+
+    period, periods = ('hour', STATS_HOURS) if hourly else ('day', STATS_DAYS)
+    rows = await get_price_stats(city, fuel_type, period, periods)
+    fuel_name = ТИПЫ_ТОПЛИВА.get(fuel_type, fuel_type)
+    span_text = f"{STATS_HOURS} ч" if hourly else f"{STATS_DAYS} дн."
+
+    if not rows:
+        await message.answer(
+            f"😔 Нет цен на {fuel_name} в городе {city} за последние {span_text}\n\n"
+            f"Добавьте цену командой /addprice"
+        )
+        return
+
+    total = sum(row['count'] for row in rows)
+    average = sum(row['avg_price'] * row['count'] for row in rows) / total
+    text = (
+        f"📊 {fuel_name} в {city} за последние {span_text} (время UTC)\n"
+        f"Медиана по периоду, в скобках минимум–максимум и число цен\n\n"
+    )
+    text += render_chart(rows, period)
+    text += (
+        f"\nЗа весь период: {min(row['min_price'] for row in rows):.2f}–"
+        f"{max(row['max_price'] for row in rows):.2f} BYN, "
+        f"в среднем {average:.2f} BYN, цен: {total}"
+    )
+    await message.answer(text)
@@ -1,4 +1,6 @@
 """
 Клавиатуры для бота
-"""
 
+Статические клавиатуры строятся один раз (lru_cache) и переиспользуются
+всеми обработчиками, поэтому возвращаемые объекты нельзя изменять.
+"""
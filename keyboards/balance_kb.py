@@ -1,10 +1,13 @@
 """
 Клавиатуры для выбора приоритета (только для обычных водителей)
 """
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import BALANCE_TYPES
 
 
+@lru_cache(maxsize=None)
 def get_balance_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора приоритета для обычных водителей"""
     buttons = []
@@ -1,10 +1,13 @@
 """
 Клавиатуры для выбора категории водителя
 """
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import DRIVER_TYPES
 
 
+@lru_cache(maxsize=None)
 def get_category_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора категории водителя"""
     buttons = []
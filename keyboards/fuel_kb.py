@@ -1,9 +1,17 @@
 """
 Клавиатуры для работы с топливом
 """
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from functools import lru_cache
 
+from aiogram.types import (
+    InlineKeyboardMarkup,
+    InlineKeyboardButton,
+    ReplyKeyboardMarkup,
+    KeyboardButton
+)
 
+
+@lru_cache(maxsize=None)
 def get_fuel_type_selection_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора типа топлива для расчета"""
     buttons = []
@@ -22,3 +30,14 @@ def get_fuel_type_selection_keyboard() -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+
+@lru_cache(maxsize=None)
+def get_location_keyboard() -> ReplyKeyboardMarkup:
+    """Клавиатура с кнопкой отправки геопозиции"""
+    return ReplyKeyboardMarkup(
+        keyboard=[[
+            KeyboardButton(text="📍 Отправить местоположение", request_location=True)
+        ]],
+        resize_keyboard=True,
+        one_time_keyboard=True
+    )
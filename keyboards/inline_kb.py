@@ -1,10 +1,13 @@
 """
 Inline клавиатуры для бота
 """
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import СЕТИ_АЗС, ТИПЫ_ТОПЛИВА
 
 
+@lru_cache(maxsize=None)
 def get_network_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора сети АЗС"""
     buttons = []
@@ -16,6 +19,7 @@ def get_network_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@lru_cache(maxsize=None)
 def get_fuel_type_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура выбора типа топлива"""
     buttons = []
@@ -31,10 +35,11 @@ def get_fuel_type_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_azs_keyboard(azs_list: list) -> InlineKeyboardMarkup:
-    """Клавиатура выбора АЗС"""
+def get_azs_keyboard(azs_list: list, page: int = 0,
+                     has_next: bool = False) -> InlineKeyboardMarkup:
+    """Клавиатура выбора АЗС (одна страница) с кнопками листания"""
     buttons = []
-    for azs in azs_list[:10]:  # Ограничиваем 10 АЗС для удобства
+    for azs in azs_list:
         text = f"{azs['network']} - {azs['address']}"
         # Обрезаем текст, если слишком длинный
         if len(text) > 50:
@@ -46,5 +51,12 @@ def get_azs_keyboard(azs_list: list) -> InlineKeyboardMarkup:
             )
         ])
     
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"azspage_{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"azspage_{page + 1}"))
+    if nav:
+        buttons.append(nav)
+    
     return InlineKeyboardMarkup(inline_keyboard=buttons)
-
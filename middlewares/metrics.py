@@ -0,0 +1,36 @@
+"""
+Замер времени обработчиков
+"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from services.metrics import metrics
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Гистограмма задержки для каждого обработчика.
+
+    Регистрируется как внутренний middleware (dp.message.middleware и т.п.),
+    поэтому вызывается уже после фильтров и знает, какой обработчик выбран.
+    """
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("handler_errors_total", handler=name, event=self.event)
+            raise
+        finally:
+            metrics.observe("handler_seconds", time.perf_counter() - start,
+                            handler=name, event=self.event)
@@ -0,0 +1,219 @@
+"""
+Запись входящих обновлений для последующего воспроизведения
+
+Включается RECORD_UPDATES=1. Каждое обновление обезличивается и
+добавляется в буфер; фоновая задача раз в RECORD_FLUSH_INTERVAL секунд
+дописывает буфер в JSONL-файл в отдельном потоке, не блокируя обработку.
+Строка файла: {"t": время получения (unix), "update": обновление}.
+Воспроизведение: python -m tools.replay.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import (
+    RECORD_PATH,
+    RECORD_SALT,
+    RECORD_SALT_PATH,
+    RECORD_FLUSH_INTERVAL,
+    RECORD_BUFFER_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Персональные поля удаляются везде, где встречаются
+DROPPED_KEYS = ("contact", "phone_number", "username", "first_name", "last_name",
+                "title", "bio", "photo", "active_usernames", "birthdate", "vcard",
+                "forward_sender_name", "forward_signature", "author_signature")
+# Обязательные для Update.model_validate имена заменяются заглушкой
+PLACEHOLDER_NAME = "User"
+# Поля с id пользователя или чата вне объектов User/Chat
+ID_KEYS = ("chat_id", "user_id")
+CHAT_TYPES = ("private", "group", "supergroup", "channel")
+
+# Текст без команды сохраняется, только если это число (литры, цена)
+NUMBER_RE = re.compile(r"^\d+([.,]\d*)?$")
+
+
+def load_salt(path: str = RECORD_SALT_PATH) -> str:
+    """
+    Соль псевдонимов: RECORD_SALT или случайная, сохраненная в path.
+
+    Без соли псевдоним восстанавливается перебором id, поэтому пустая соль
+    не используется. Файл переживает перезапуск - псевдонимы остаются стабильными.
+    """
+    if RECORD_SALT:
+        return RECORD_SALT
+    try:
+        with open(path, encoding="utf-8") as f:
+            salt = f.read().strip()
+        if salt:
+            return salt
+    except FileNotFoundError:
+        pass
+    salt = secrets.token_hex(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(salt + "\n")
+    logger.info(f"RECORD_SALT не задан - случайная соль сохранена в {path}")
+    return salt
+
+
+def is_person(data: Dict[str, Any]) -> bool:
+    """Объект User (есть is_bot) или Chat (есть type чата) с числовым id"""
+    return isinstance(data.get("id"), int) and (
+        "is_bot" in data or data.get("type") in CHAT_TYPES
+    )
+
+
+def pseudonym(value: int, salt: str) -> int:
+    """Стабильный псевдоним id: одинаковый для всех обновлений одного пользователя"""
+    digest = hashlib.sha256(f"{salt}:{abs(value)}".encode()).hexdigest()
+    # 48 бит помещаются в диапазон id Telegram; знак (группы) сохраняется
+    alias = int(digest[:12], 16) or 1
+    return -alias if value < 0 else alias
+
+
+def anonymize(data: Any, salt: str) -> Any:
+    """
+    Обезличить обновление (dict из Update.model_dump).
+
+    Имена, username, телефоны удаляются, id всех вложенных объектов User
+    и Chat (from, chat, forward_origin, new_chat_members, ...) заменяются
+    псевдонимами, координаты округляются до ~1 км, свободный текст
+    маскируется (команды и числа сохраняются - от них зависит сценарий).
+    """
+    if isinstance(data, list):
+        return [anonymize(item, salt) for item in data]
+    if not isinstance(data, dict):
+        return data
+
+    person = is_person(data)
+    result = {}
+    for key, value in data.items():
+        if key in DROPPED_KEYS:
+            continue
+        if person and key == "id":
+            result[key] = pseudonym(value, salt)
+        elif key in ID_KEYS and isinstance(value, int):
+            result[key] = pseudonym(value, salt)
+        elif key == "sender_user_name":
+            result[key] = PLACEHOLDER_NAME
+        elif key in ("text", "caption") and isinstance(value, str):
+            keep = value.startswith("/") or NUMBER_RE.match(value.strip())
+            result[key] = value if keep else "*" * len(value)
+        elif key == "location" and isinstance(value, dict):
+            result[key] = {
+                k: round(v, 2) if k in ("latitude", "longitude") else v
+                for k, v in value.items()
+            }
+        else:
+            result[key] = anonymize(value, salt)
+    if person and "is_bot" in data:
+        result["first_name"] = PLACEHOLDER_NAME
+    return result
+
+
+class UpdateRecorder:
+    """Буферизованная асинхронная запись обновлений в JSONL"""
+
+    def __init__(self, path: str = RECORD_PATH,
+                 flush_interval: float = RECORD_FLUSH_INTERVAL,
+                 buffer_size: int = RECORD_BUFFER_SIZE,
+                 salt: Optional[str] = None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self._buffer: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+        # Загружается при первой записи: без RECORD_UPDATES файл соли не создается
+        self._salt = salt
+
+        # Метрики
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+
+    @property
+    def salt(self) -> str:
+        if self._salt is None:
+            self._salt = load_salt()
+        return self._salt
+
+    def record(self, update: Update, received_at: float):
+        if len(self._buffer) >= self.buffer_size:
+            # Диск не успевает - теряем запись, а не память и не обработку
+            self.dropped += 1
+            return
+        data = anonymize(update.model_dump(mode="json", exclude_none=True, by_alias=True),
+                         self.salt)
+        self._buffer.append(json.dumps({"t": received_at, "update": data}, ensure_ascii=False))
+        self.recorded += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка записи обновлений в {self.path}: {e}")
+
+    def _write(self, lines: List[str]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        lines, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, lines)
+        self.written += len(lines)
+        return len(lines)
+
+    async def close(self):
+        """Остановить фоновую запись и дописать буфер"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+class RecordMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: записывает каждое обновление до обработки"""
+
+    def __init__(self, recorder: UpdateRecorder):
+        self.recorder = recorder
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        try:
+            self.recorder.record(event, time.time())
+        except Exception as e:
+            logger.error(f"Не удалось записать обновление: {e}")
+        return await handler(event, data)
+
+
+update_recorder = UpdateRecorder()
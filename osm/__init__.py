@@ -0,0 +1,3 @@
+"""
+Загрузка и обработка каталога АЗС из OpenStreetMap
+"""
@@ -0,0 +1,110 @@
+"""
+Инкрементальное обновление каталога АЗС
+
+Снимок хранит для каждого элемента OSM его версию, хеш тегов и координат
+и уже построенную станцию (с адресом после геокодирования). При следующем
+запуске заново обрабатываются только добавленные и измененные элементы,
+остальные станции берутся из снимка.
+
+Изменения итогового каталога описываются компактным changeset:
+    {"added": [станции], "changed": [станции], "removed": [id]}
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+from osm.overpass import element_key
+
+SNAPSHOT_VERSION = 1
+
+
+def _hash(value: Any) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def snapshot_key(element: Dict[str, Any]) -> str:
+    element_type, element_id = element_key(element)
+    return f"{element_type}/{element_id}"
+
+
+def element_hash(element: Dict[str, Any]) -> str:
+    """Хеш тегов и координат: ловит изменения и без версии (out без meta)"""
+    center = element.get("center") or {}
+    return _hash([
+        element.get("tags") or {},
+        element.get("lat", center.get("lat")),
+        element.get("lon", center.get("lon")),
+    ])
+
+
+class ElementDiff(NamedTuple):
+    added: List[Dict[str, Any]]
+    changed: List[Dict[str, Any]]
+    unchanged: List[str]
+    removed: List[str]
+
+
+def diff_elements(elements: Iterable[Dict[str, Any]],
+                  snapshot: Dict[str, Dict[str, Any]]) -> ElementDiff:
+    """Сравнить новые элементы Overpass со снимком по id, версии и хешу тегов"""
+    added, changed, unchanged = [], [], []
+    seen = set()
+    for element in elements:
+        key = snapshot_key(element)
+        seen.add(key)
+        previous = snapshot.get(key)
+        if previous is None:
+            added.append(element)
+        elif (previous.get("version") != element.get("version")
+              or previous.get("hash") != element_hash(element)):
+            changed.append(element)
+        else:
+            unchanged.append(key)
+    removed = [key for key in snapshot if key not in seen]
+    return ElementDiff(added, changed, unchanged, removed)
+
+
+def snapshot_entry(element: Dict[str, Any], station: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "version": element.get("version"),
+        "hash": element_hash(element),
+        "station": station,
+    }
+
+
+def load_snapshot(path: str) -> Dict[str, Dict[str, Any]]:
+    """Снимок прошлого запуска; пустой, если его нет или формат устарел"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if data.get("format") != SNAPSHOT_VERSION:
+        return {}
+    return data.get("elements", {})
+
+
+def save_snapshot(path: str, snapshot: Dict[str, Dict[str, Any]]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"format": SNAPSHOT_VERSION, "elements": snapshot}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def diff_stations(old: Iterable[Dict[str, Any]],
+                  new: Iterable[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Changeset между двумя версиями итогового каталога (по id станции)"""
+    old_hashes = {station["id"]: _hash(station) for station in old}
+    added, changed = [], []
+    new_ids = set()
+    for station in new:
+        new_ids.add(station["id"])
+        previous = old_hashes.get(station["id"])
+        if previous is None:
+            added.append(station)
+        elif previous != _hash(station):
+            changed.append(station)
+    removed = [station_id for station_id in old_hashes if station_id not in new_ids]
+    return {"added": added, "changed": changed, "removed": removed}
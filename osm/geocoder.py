@@ -0,0 +1,193 @@
+"""
+Асинхронное обратное геокодирование через Nominatim
+
+Запросы идут параллельно (не больше concurrency одновременно) и не чаще
+rate в секунду (token bucket). Результаты сохраняются в SQLite-кеш по
+округленным координатам и переживают перезапуск скрипта.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+
+# Знаков после запятой в ключе кеша (5 знаков - около 1 метра)
+CACHE_PRECISION = 5
+
+UNKNOWN = "unknown"
+
+CacheKey = Tuple[float, float]
+
+
+def cache_key(lat: float, lon: float, precision: int = CACHE_PRECISION) -> CacheKey:
+    return round(lat, precision), round(lon, precision)
+
+
+class GeocodeCache:
+    """Кеш адресов в SQLite по округленным координатам"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode (
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                address TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (lat, lon)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT address FROM geocode WHERE lat = ? AND lon = ?", key
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: CacheKey, address: str):
+        self._conn.execute("""
+            INSERT INTO geocode (lat, lon, address) VALUES (?, ?, ?)
+            ON CONFLICT(lat, lon) DO UPDATE SET
+                address = excluded.address,
+                updated_at = CURRENT_TIMESTAMP
+        """, (*key, address))
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class TokenBucket:
+    """Ограничение частоты: в среднем rate запросов в секунду, всплеск до capacity"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncGeocoder:
+    """
+    Обратное геокодирование пачки координат.
+
+    Адрес берется из кеша, если он есть; иначе запрашивается у Nominatim.
+    Ответы 429 и 5xx повторяются с паузой, остальные ошибки дают 'unknown'
+    и не кешируются, чтобы следующий запуск попробовал снова.
+    """
+
+    def __init__(self, cache: Optional[GeocodeCache] = None,
+                 url: str = NOMINATIM_URL,
+                 user_agent: str = "azs-merger/1.0",
+                 concurrency: int = 4,
+                 rate: float = 1.0,
+                 timeout: float = 10.0,
+                 retries: int = 3,
+                 language: str = "ru"):
+        self.cache = cache
+        self.url = url
+        self.user_agent = user_agent
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.timeout = timeout
+        self.retries = retries
+        self.language = language
+
+        # Статистика последнего запуска
+        self.cache_hits = 0
+        self.requests = 0
+        self.failures = 0
+
+    async def geocode_many(self, points: Iterable[Tuple[float, float]]) -> Dict[CacheKey, str]:
+        """Адреса для точек (lat, lon) по ключу cache_key"""
+        result: Dict[CacheKey, str] = {}
+        pending = []
+        seen = set()
+        for lat, lon in points:
+            key = cache_key(lat, lon)
+            if key in seen:
+                continue
+            seen.add(key)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                result[key] = cached
+                self.cache_hits += 1
+            else:
+                pending.append(key)
+
+        if not pending:
+            return result
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {"User-Agent": self.user_agent}
+        done = 0
+
+        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+            async def worker(key: CacheKey):
+                nonlocal done
+                async with semaphore:
+                    address = await self._fetch(session, key)
+                result[key] = address if address is not None else UNKNOWN
+                if address is not None and self.cache is not None:
+                    self.cache.set(key, address)
+                done += 1
+                if done % 50 == 0:
+                    logger.info(f"Геокодировано {done}/{len(pending)}")
+
+            await asyncio.gather(*(worker(key) for key in pending))
+
+        return result
+
+    async def _fetch(self, session: aiohttp.ClientSession, key: CacheKey) -> Optional[str]:
+        """Адрес от Nominatim; None - ответ не получен"""
+        params = {
+            "format": "json",
+            "lat": key[0],
+            "lon": key[1],
+            "accept-language": self.language,
+        }
+        for attempt in range(1, self.retries + 1):
+            await self.bucket.acquire()
+            self.requests += 1
+            try:
+                async with session.get(self.url, params=params) as response:
+                    if response.status == 200:
+                        data = await response.json(content_type=None)
+                        return data.get("display_name", UNKNOWN)
+                    if response.status != 429 and response.status < 500:
+                        logger.warning(f"Nominatim HTTP {response.status} для {key}")
+                        break
+                    logger.warning(f"Nominatim HTTP {response.status}, попытка {attempt}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Ошибка Nominatim для {key}, попытка {attempt}: {e}")
+
+            if attempt < self.retries:
+                await asyncio.sleep(attempt)
+
+        self.failures += 1
+        return None
@@ -0,0 +1,72 @@
+"""
+Потоковое чтение JSON-массивов (каталоги и выгрузки АЗС)
+
+Модуль без зависимостей от бота и базы данных: его используют и
+data.catalog, и автономные скрипты osm/.
+"""
+import json
+from typing import Any, Iterator, Optional, TextIO
+
+# Размер порции чтения файла
+READ_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Потоково прочитать элементы JSON-массива верхнего уровня.
+
+    Файл читается порциями по chunk_size символов, в памяти держится
+    только текущий необработанный хвост, а не весь документ.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(chars: str) -> Optional[str]:
+        """Пропустить символы chars, вернуть следующий символ (None - конец файла)"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return None
+
+    if skip(_WHITESPACE) != "[":
+        raise ValueError("Ожидался JSON-массив")
+    pos += 1
+
+    while True:
+        char = skip(_WHITESPACE + ",")
+        if char is None:
+            raise ValueError("Неожиданный конец JSON-массива")
+        if char == "]":
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент не поместился в буфер - дочитываем
+                if eof or not fill():
+                    raise
+                continue
+            # Число на границе порции могло быть обрезано
+            if end == len(buffer) and not eof and fill():
+                continue
+            break
+        pos = end
+        yield item
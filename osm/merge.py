@@ -0,0 +1,144 @@
+"""
+Слияние дублей АЗС (одна заправка, отмеченная в OSM несколькими объектами)
+
+Точки раскладываются по сетке с ячейкой не меньше порога расстояния, и
+каждая точка сравнивается только с точками своей и восьми соседних ячеек.
+Пары ближе порога (по haversine, в метрах) объединяются в кластеры через
+union-find, поэтому результат не зависит от порядка станций во входных
+данных.
+"""
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from services.spatial_index import haversine_km, EARTH_RADIUS_KM
+
+# Станции ближе этого расстояния считаются одной АЗС (м)
+MERGE_DISTANCE_M = 50.0
+
+# Километров в градусе широты - в той же модели Земли, что и haversine_km
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * math.pi / 180
+
+# Запас размера ячейки: ошибки округления и отличие дуги большого круга
+# от дуги параллели не должны делать ячейку меньше порога
+CELL_MARGIN = 1.01
+
+# Поля, которые берутся у первой станции кластера, где они известны
+KNOWN_FIELDS = ("name", "brand", "workingHours", "address", "phone", "website", "city")
+AMENITY_FIELDS = ("hasCafe", "hasShop", "hasWash")
+
+
+class UnionFind:
+    """Система непересекающихся множеств со сжатием путей"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+
+
+def find_duplicate_clusters(stations: List[Dict[str, Any]],
+                            threshold_m: float = MERGE_DISTANCE_M) -> List[List[int]]:
+    """
+    Кластеры индексов станций, связанных цепочками расстояний < threshold_m.
+
+    Станции без координат образуют отдельные кластеры из одного элемента.
+    """
+    threshold_km = threshold_m / 1000
+    points = [
+        (i, s["latitude"], s["longitude"]) for i, s in enumerate(stations)
+        if s.get("latitude") is not None and s.get("longitude") is not None
+    ]
+
+    uf = UnionFind(len(stations))
+    if points:
+        # Ячейка по долготе рассчитана на самую северную точку: на меньших
+        # широтах она шире порога, и соседних ячеек по-прежнему достаточно
+        max_abs_lat = max(abs(lat) for _, lat, _ in points)
+        cos_lat = max(math.cos(math.radians(max_abs_lat)), 0.01)
+        cell_lat = threshold_km / KM_PER_DEGREE_LAT * CELL_MARGIN
+        cell_lon = cell_lat / cos_lat
+
+        grid: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = defaultdict(list)
+        for point in points:
+            _, lat, lon = point
+            grid[(math.floor(lat / cell_lat), math.floor(lon / cell_lon))].append(point)
+
+        for (row, col), cell_points in grid.items():
+            # Каждая пара ячеек просматривается один раз: своя и "следующие" соседи
+            neighbours = [cell_points]
+            for dr, dc in ((0, 1), (1, -1), (1, 0), (1, 1)):
+                other = grid.get((row + dr, col + dc))
+                if other:
+                    neighbours.append(other)
+
+            for n, (i, lat1, lon1) in enumerate(cell_points):
+                for k, other in enumerate(neighbours):
+                    start = n + 1 if k == 0 else 0
+                    for j, lat2, lon2 in other[start:]:
+                        if haversine_km(lat1, lon1, lat2, lon2) < threshold_km:
+                            uf.union(i, j)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(stations)):
+        clusters[uf.find(i)].append(i)
+    return list(clusters.values())
+
+
+def _station_order(station: Dict[str, Any]):
+    """Порядок станций: числовые id по значению (9 < 10), затем остальные как строки"""
+    station_id = station.get("id")
+    if isinstance(station_id, int) or (isinstance(station_id, str) and station_id.isdigit()):
+        id_key = (0, int(station_id), "")
+    else:
+        id_key = (1, 0, str(station_id))
+    return (id_key, station.get("latitude") or 0.0, station.get("longitude") or 0.0)
+
+
+def merge_group(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Объединить станции одного кластера в одну запись"""
+    group = sorted(group, key=_station_order)
+    merged = group[0].copy()
+    merged["fuelPrices"] = {}
+    for station in group:
+        merged["fuelPrices"].update(station.get("fuelPrices") or {})
+        for field in KNOWN_FIELDS:
+            if merged.get(field, "unknown") == "unknown" and station.get(field, "unknown") != "unknown":
+                merged[field] = station[field]
+        for field in AMENITY_FIELDS:
+            if merged.get(field) == "unknown" and station.get(field) == "yes":
+                merged[field] = "yes"
+    return merged
+
+
+def merge_duplicates(stations: List[Dict[str, Any]],
+                     threshold_m: float = MERGE_DISTANCE_M) -> List[Dict[str, Any]]:
+    """
+    Слить дубли АЗС.
+
+    Результат упорядочен по id первой станции кластера и не зависит от
+    порядка входных данных.
+    """
+    merged = [
+        merge_group([stations[i] for i in cluster])
+        for cluster in find_duplicate_clusters(stations, threshold_m)
+    ]
+    merged.sort(key=_station_order)
+    return merged
@@ -0,0 +1,199 @@
+"""
+Загрузка АЗС из Overpass API по тайлам
+
+Область делится на прямоугольные тайлы, тайлы запрашиваются параллельно
+(не больше concurrency одновременно). Каждый загруженный тайл сразу
+сохраняется на диск, поэтому прерванный запуск продолжается с
+незагруженных тайлов, а не начинается заново. Элементы всех тайлов
+объединяются по (type, id): объект на границе тайлов попадает в результат
+один раз.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+# Границы Беларуси (юг, запад, север, восток)
+BELARUS_BBOX = (51.25, 23.17, 56.18, 32.78)
+
+QUERY_TEMPLATE = """
+[out:json][timeout:{timeout}];
+area["ISO3166-1"="{country}"][admin_level=2]->.searchArea;
+(
+  node["amenity"="fuel"](area.searchArea)({bbox});
+  way["amenity"="fuel"](area.searchArea)({bbox});
+  relation["amenity"="fuel"](area.searchArea)({bbox});
+);
+out {out};
+"""
+
+
+class Tile(NamedTuple):
+    south: float
+    west: float
+    north: float
+    east: float
+
+    @property
+    def key(self) -> str:
+        return f"{self.south:.4f}_{self.west:.4f}_{self.north:.4f}_{self.east:.4f}"
+
+    @property
+    def bbox(self) -> str:
+        return f"{self.south},{self.west},{self.north},{self.east}"
+
+
+def split_bbox(bbox: Tuple[float, float, float, float], tile_deg: float) -> List[Tile]:
+    """Разбить прямоугольник на тайлы не больше tile_deg x tile_deg градусов"""
+    south, west, north, east = bbox
+    rows = max(1, math.ceil((north - south) / tile_deg))
+    cols = max(1, math.ceil((east - west) / tile_deg))
+    dlat = (north - south) / rows
+    dlon = (east - west) / cols
+    return [
+        Tile(round(south + r * dlat, 6), round(west + c * dlon, 6),
+             round(south + (r + 1) * dlat, 6), round(west + (c + 1) * dlon, 6))
+        for r in range(rows) for c in range(cols)
+    ]
+
+
+def element_key(element: Dict[str, Any]) -> Tuple[str, int]:
+    """id уникален только внутри типа (node/way/relation)"""
+    return element.get("type", "node"), element["id"]
+
+
+class TiledOverpassFetcher:
+    """Параллельная загрузка тайлов с контрольными точками на диске"""
+
+    def __init__(self, checkpoint_dir: str,
+                 url: str = OVERPASS_URL,
+                 user_agent: str = "azs-merger/1.0",
+                 country: str = "BY",
+                 out: str = "center tags",
+                 concurrency: int = 2,
+                 retries: int = 4,
+                 query_timeout: int = 180,
+                 retry_delay: float = 5.0):
+        self.checkpoint_dir = checkpoint_dir
+        self.url = url
+        self.user_agent = user_agent
+        self.country = country
+        self.out = out
+        self.concurrency = concurrency
+        self.retries = retries
+        self.query_timeout = query_timeout
+        self.retry_delay = retry_delay
+
+        # Статистика последнего запуска
+        self.from_checkpoint = 0
+        self.fetched = 0
+        self.failed: List[Tile] = []
+
+    def build_query(self, tile: Tile) -> str:
+        return QUERY_TEMPLATE.format(
+            timeout=self.query_timeout, country=self.country,
+            bbox=tile.bbox, out=self.out
+        )
+
+    def _checkpoint_path(self, tile: Tile) -> str:
+        return os.path.join(self.checkpoint_dir, f"{tile.key}.json")
+
+    def _load_checkpoint(self, tile: Tile) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with open(self._checkpoint_path(tile), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Поврежденная контрольная точка тайла {tile.key}, загружаем заново")
+            return None
+
+    def _save_checkpoint(self, tile: Tile, elements: List[Dict[str, Any]]):
+        # Запись через временный файл: оборванная запись не оставит битый тайл
+        path = self._checkpoint_path(tile)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(elements, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def clear_checkpoints(self, tiles: List[Tile]):
+        """Удалить контрольные точки после успешной загрузки всех тайлов"""
+        for tile in tiles:
+            try:
+                os.remove(self._checkpoint_path(tile))
+            except FileNotFoundError:
+                pass
+
+    async def _fetch_tile(self, session: aiohttp.ClientSession,
+                          tile: Tile) -> Optional[List[Dict[str, Any]]]:
+        query = self.build_query(tile)
+        for attempt in range(1, self.retries + 1):
+            try:
+                async with session.post(self.url, data={"data": query}) as response:
+                    if response.status == 200:
+                        data = await response.json(content_type=None)
+                        return data.get("elements", [])
+                    logger.warning(f"Overpass HTTP {response.status} для тайла {tile.key}, "
+                                   f"попытка {attempt}")
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                logger.warning(f"Ошибка Overpass для тайла {tile.key}, попытка {attempt}: {e}")
+            if attempt < self.retries:
+                await asyncio.sleep(self.retry_delay * attempt)
+        return None
+
+    async def fetch(self, tiles: List[Tile]) -> List[Dict[str, Any]]:
+        """
+        Элементы всех тайлов, объединенные по (type, id).
+
+        Незагруженные после всех попыток тайлы попадают в self.failed;
+        их контрольных точек нет, и следующий запуск загрузит только их.
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self.from_checkpoint = 0
+        self.fetched = 0
+        self.failed = []
+
+        results: Dict[Tile, List[Dict[str, Any]]] = {}
+        pending = []
+        for tile in tiles:
+            elements = self._load_checkpoint(tile)
+            if elements is None:
+                pending.append(tile)
+            else:
+                results[tile] = elements
+                self.from_checkpoint += 1
+
+        if pending:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            # Запрос ждет свободного слота Overpass, поэтому таймаут с запасом
+            timeout = aiohttp.ClientTimeout(total=self.query_timeout + 60)
+            headers = {"User-Agent": self.user_agent}
+
+            async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+                async def worker(tile: Tile):
+                    async with semaphore:
+                        elements = await self._fetch_tile(session, tile)
+                    if elements is None:
+                        self.failed.append(tile)
+                        return
+                    self._save_checkpoint(tile, elements)
+                    results[tile] = elements
+                    self.fetched += 1
+                    logger.info(f"Тайл {tile.key}: {len(elements)} элементов "
+                                f"({len(results)}/{len(tiles)})")
+
+                await asyncio.gather(*(worker(tile) for tile in pending))
+
+        merged: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for tile in tiles:
+            for element in results.get(tile, []):
+                merged[element_key(element)] = element
+        return list(merged.values())
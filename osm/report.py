@@ -0,0 +1,322 @@
+"""
+Потоковый анализ каталога АЗС
+
+Станции читаются по одной (osm.jsonstream.iter_json_array), все метрики
+считаются за один проход. В памяти держатся только счетчики и списки id
+проблемных станций; JSON-отчет содержит полные списки, текстовый - первые
+TEXT_SAMPLE_SIZE. Для очень больших выгрузок --sample-size ограничивает
+хранимые списки. Из одних и тех же агрегатов строятся текстовый, JSON-
+и CSV-отчеты.
+
+Использование:
+    python -m osm.report belarus_azs_merged.json --text report.txt --json report.json --csv report.csv
+"""
+import argparse
+import csv
+import json
+import sys
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from osm.jsonstream import iter_json_array
+
+# Сколько id и примеров хранить для каждой метрики (None - все)
+SAMPLE_SIZE: Optional[int] = None
+
+# Сколько id и станций показывать в текстовом отчете
+TEXT_SAMPLE_SIZE = 20
+
+# Значения, означающие отсутствие данных (разные версии выгрузки)
+UNKNOWN_VALUES = (None, "", "unknown", "Unknown", "Не указано")
+
+# Сайты брендов (на русском)
+BRAND_WEBSITES = {
+    "Белоруснефть": "https://azs.belorusneft.by",
+    "Лукойл": "https://lukoil.by",
+    "ЛУКОЙЛ": "https://lukoil.by",
+    "А-100": "https://a-100.by",
+    "Газпромнефть": "https://gpnbonus.by",
+    "Газпром нефть": "https://gpnbonus.by",
+    "United Company": "https://united-company.by",
+    "Юнайтед Компани": "https://united-company.by",
+    "Славнефть": "https://www.rn-west.by",
+    "Роснефть": "https://www.rn-west.by",
+    "Мингаз": "http://mingas.by",
+    "Белтрансгаз": "https://www.metan.by",
+    "Экогаз": "https://www.metan.by",
+    "БНК": "https://www.bnk.by",
+    "Легавтотранс": "Не найден",
+    "Милком": "Не найден",
+    "Бутан": "Не найден",
+    "Газ": "Не найден",
+}
+
+# Метрики проблемных записей: ключ -> подпись
+ISSUES = {
+    "name_unknown": "Нет имени",
+    "brand_unknown": "Нет бренда",
+    "coords_missing": "Нет координат",
+    "no_fuels": "Нет топлива",
+    "few_fuels": "Мало топлива (1-3 вида)",
+    "workingHours_unknown": "Нет часов работы",
+    "hasCafe_unknown": "Нет информации о кафе",
+    "hasShop_unknown": "Нет информации о магазине",
+    "hasWash_unknown": "Нет информации о мойке",
+    "website_missing": "Нет сайта",
+}
+
+
+def is_unknown(value: Any) -> bool:
+    return value in UNKNOWN_VALUES
+
+
+def iter_stations(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_json_array(f)
+
+
+class CatalogStats:
+    """Агрегаты каталога за один проход"""
+
+    def __init__(self, sample_size: Optional[int] = SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.total = 0
+        self.brand_count: Counter = Counter()
+        self.fuel_count: Counter = Counter()
+        self.issue_count: Counter = Counter()
+        self.issue_samples: Dict[str, List[Any]] = defaultdict(list)
+        # Примеры станций бренда и первый сайт, встреченный у бренда
+        self.brand_samples: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.brand_station_websites: Dict[str, str] = {}
+        self.website_samples: List[Dict[str, Any]] = []
+
+    def _has_room(self, samples: List[Any]) -> bool:
+        return self.sample_size is None or len(samples) < self.sample_size
+
+    def _issue(self, key: str, station_id: Any):
+        self.issue_count[key] += 1
+        samples = self.issue_samples[key]
+        if self._has_room(samples):
+            samples.append(station_id)
+
+    def add(self, station: Dict[str, Any]):
+        self.total += 1
+        station_id = station.get("id")
+        brand = station.get("brand") or "unknown"
+        name = station.get("name") or "unknown"
+        website = station.get("website")
+
+        self.brand_count[brand] += 1
+        brand_samples = self.brand_samples[brand]
+        if self._has_room(brand_samples):
+            brand_samples.append({
+                "id": station_id,
+                "name": name,
+                "address": station.get("address"),
+                "website": None if is_unknown(website) else website,
+            })
+
+        if is_unknown(name):
+            self._issue("name_unknown", station_id)
+        if is_unknown(brand):
+            self._issue("brand_unknown", station_id)
+        if station.get("latitude") is None or station.get("longitude") is None:
+            self._issue("coords_missing", station_id)
+
+        fuels = station.get("fuelPrices") or {}
+        self.fuel_count.update(fuels.keys())
+        if not fuels:
+            self._issue("no_fuels", station_id)
+        elif len(fuels) <= 3:
+            self._issue("few_fuels", station_id)
+
+        if is_unknown(station.get("workingHours")):
+            self._issue("workingHours_unknown", station_id)
+        for field in ("hasCafe", "hasShop", "hasWash"):
+            if is_unknown(station.get(field)):
+                self._issue(f"{field}_unknown", station_id)
+
+        if is_unknown(website):
+            self._issue("website_missing", station_id)
+        else:
+            self.brand_station_websites.setdefault(brand, website)
+            if len(self.website_samples) < TEXT_SAMPLE_SIZE:
+                self.website_samples.append({"brand": brand, "name": name, "website": website})
+
+    def add_all(self, stations: Iterable[Dict[str, Any]]) -> "CatalogStats":
+        for station in stations:
+            self.add(station)
+        return self
+
+    def brand_website(self, brand: str) -> str:
+        """Сайт бренда: из справочника, иначе с одной из станций бренда"""
+        for known, url in BRAND_WEBSITES.items():
+            if known.lower() in brand.lower() or brand.lower() in known.lower():
+                return url
+        return self.brand_station_websites.get(brand, "Не найден")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        JSON-отчет в прежнем формате: brand_count, brand_stations и списки id
+        по каждой проблеме (name_unknown, no_fuels, ...) плюс общие счетчики
+        """
+        report = {
+            "total": self.total,
+            "brand_count": dict(self.brand_count.most_common()),
+            "brand_stations": {
+                brand: [s["name"] for s in samples]
+                for brand, samples in self.brand_samples.items()
+            },
+        }
+        for key in ISSUES:
+            report[key] = self.issue_samples.get(key, [])
+        report.update({
+            "issue_count": {key: self.issue_count[key] for key in ISSUES},
+            "fuel_count": dict(sorted(self.fuel_count.items())),
+            "brand_websites": {brand: self.brand_website(brand) for brand in sorted(self.brand_count)},
+            "sample_size": self.sample_size,
+        })
+        return report
+
+
+def analyze_file(path: str, sample_size: Optional[int] = SAMPLE_SIZE) -> CatalogStats:
+    return CatalogStats(sample_size).add_all(iter_stations(path))
+
+
+# ---------- Отчеты ----------
+
+def write_json(stats: CatalogStats, f: TextIO):
+    json.dump(stats.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def write_csv(stats: CatalogStats, f: TextIO):
+    """Плоская таблица section,key,value"""
+    writer = csv.writer(f)
+    writer.writerow(["section", "key", "value"])
+    writer.writerow(["total", "stations", stats.total])
+    for brand, count in stats.brand_count.most_common():
+        writer.writerow(["brand", brand, count])
+    for fuel, count in sorted(stats.fuel_count.items()):
+        writer.writerow(["fuel", fuel, count])
+    for key in ISSUES:
+        writer.writerow(["issue", key, stats.issue_count[key]])
+
+
+def write_summary(stats: CatalogStats, f: TextIO):
+    """Краткая сводка (для консоли)"""
+    f.write("=== ОТЧЕТ ПО АЗС БЕЛАРУСИ ===\n")
+    f.write(f"Всего станций: {stats.total}\n")
+    f.write(f"Брендов: {len(stats.brand_count)}\n")
+    f.write("\nБренды:\n")
+    for brand, count in stats.brand_count.most_common():
+        f.write(f"  {brand}: {count}\n")
+    f.write("\n")
+    for key, title in ISSUES.items():
+        f.write(f"{title}: {stats.issue_count[key]}\n")
+
+
+def _write_ids(f: TextIO, stats: CatalogStats, key: str):
+    count = stats.issue_count[key]
+    if not count:
+        f.write("  Не найдено\n")
+        return
+    f.write(f"  Всего: {count} АЗС\n")
+    samples = stats.issue_samples[key][:TEXT_SAMPLE_SIZE]
+    for i, station_id in enumerate(samples, 1):
+        f.write(f"  {i}. {station_id}\n")
+    if count > len(samples):
+        f.write(f"  ... и ещё {count - len(samples)} АЗС\n")
+
+
+def write_text(stats: CatalogStats, f: TextIO):
+    """Подробный текстовый отчет"""
+    line = "=" * 80 + "\n"
+    section = "-" * 40 + "\n"
+
+    f.write(line)
+    f.write("АНАЛИЗ ДАННЫХ ОБ АЗС В БЕЛАРУСИ\n")
+    f.write(line + "\n")
+    f.write(f"Всего АЗС: {stats.total}\n")
+    f.write(f"Уникальных брендов: {len(stats.brand_count)}\n")
+    f.write(f"АЗС с указанием сайта: {stats.total - stats.issue_count['website_missing']}\n")
+    f.write(f"АЗС без сайта: {stats.issue_count['website_missing']}\n\n")
+
+    f.write("1. СТАТИСТИКА ПО БРЕНДАМ\n" + section)
+    for brand, count in stats.brand_count.most_common():
+        f.write(f"  {brand}: {count} АЗС\n")
+
+    f.write("\n\n2. СТАНЦИИ ПО БРЕНДАМ\n" + section)
+    for brand in sorted(stats.brand_samples):
+        f.write(f"\n{brand}:\n")
+        samples = stats.brand_samples[brand][:TEXT_SAMPLE_SIZE]
+        for i, station in enumerate(samples, 1):
+            website_info = f" (сайт: {station['website']})" if station["website"] else ""
+            f.write(f"  АЗС N{i} - {station['name']} ({station['address']}){website_info}\n")
+        if stats.brand_count[brand] > len(samples):
+            f.write(f"  ... и ещё {stats.brand_count[brand] - len(samples)} АЗС\n")
+
+    for number, (key, title) in enumerate(ISSUES.items(), 3):
+        f.write(f"\n\n{number}. {title.upper()} ({stats.issue_count[key]})\n" + section)
+        _write_ids(f, stats, key)
+
+    number = 3 + len(ISSUES)
+    f.write(f"\n\n{number}. САЙТЫ БРЕНДОВ В БЕЛАРУСИ\n" + section)
+    for brand in sorted(stats.brand_count):
+        f.write(f"  {brand}: {stats.brand_website(brand)}\n")
+
+    f.write(f"\n\n{number + 1}. СТАТИСТИКА ПО ТОПЛИВУ\n" + section)
+    f.write(f"Всего видов топлива: {len(stats.fuel_count)}\n")
+    f.write("\nРаспределение по типам:\n")
+    for fuel, count in sorted(stats.fuel_count.items()):
+        percentage = count / stats.total * 100 if stats.total else 0
+        f.write(f"  {fuel}: {count} АЗС ({percentage:.1f}%)\n")
+
+    if stats.website_samples:
+        f.write(f"\n\n{number + 2}. ПРИМЕРЫ САЙТОВ\n" + section)
+        for station in stats.website_samples:
+            f.write(f"  {station['brand']} - {station['name']}: {station['website']}\n")
+
+    f.write("\n\n" + line + "СВОДКА\n" + line)
+    f.write(f"Всего АЗС: {stats.total}\n")
+    f.write(f"Брендов: {len(stats.brand_count)}\n")
+    for key, title in ISSUES.items():
+        f.write(f"{title}: {stats.issue_count[key]}\n")
+    f.write(line)
+
+
+WRITERS = {
+    "text": write_text,
+    "json": write_json,
+    "csv": write_csv,
+}
+
+
+def write_report(stats: CatalogStats, fmt: str, path: str):
+    newline = "" if fmt == "csv" else None
+    with open(path, "w", encoding="utf-8", newline=newline) as f:
+        WRITERS[fmt](stats, f)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Анализ каталога АЗС за один проход")
+    parser.add_argument("path", help="JSON-файл каталога")
+    parser.add_argument("--text", help="Путь для текстового отчета")
+    parser.add_argument("--json", help="Путь для JSON-отчета")
+    parser.add_argument("--csv", help="Путь для CSV-отчета")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE,
+                        help="Хранить не больше стольких id для каждой метрики "
+                             "(по умолчанию - все)")
+    args = parser.parse_args(argv)
+
+    stats = analyze_file(args.path, args.sample_size)
+    for fmt in WRITERS:
+        path = getattr(args, fmt)
+        if path:
+            write_report(stats, fmt, path)
+            print(f"Отчет ({fmt}) сохранен в {path}")
+
+    write_summary(stats, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+"""
+HTTP-сервер бота (режим webhook)
+"""
@@ -0,0 +1,195 @@
+"""
+Прием обновлений Telegram через webhook (aiohttp)
+
+HTTP-обработчик только проверяет запрос и кладет обновление в
+ограниченную очередь, поэтому Telegram получает ответ сразу. Обновления
+обрабатывают workers фоновых задач. Если обработка не успевает и очередь
+заполнена, сервер отвечает 503: Telegram сохраняет обновление у себя и
+повторяет доставку позже, а не теряет его.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_WORKERS,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_DRAIN_TIMEOUT,
+    METRICS_PATH
+)
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Через сколько секунд повторять запрос при переполнении очереди
+RETRY_AFTER = 1
+
+
+class WebhookServer:
+    """Очередь обновлений с фиксированным числом обработчиков"""
+
+    def __init__(self, bot: Bot, dp: Dispatcher,
+                 workers: int = WEBHOOK_WORKERS,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE,
+                 path: str = WEBHOOK_PATH,
+                 secret: str = WEBHOOK_SECRET):
+        self.bot = bot
+        self.dp = dp
+        self.workers = workers
+        self.path = path
+        self.secret = secret
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+        self._accepting = False
+
+        # Метрики
+        self.received = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.lost = 0
+        self._in_flight = 0
+
+    # ---------- HTTP ----------
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and request.headers.get(SECRET_HEADER) != self.secret:
+            return web.Response(status=401)
+        if not self._accepting:
+            return web.Response(status=503, headers={"Retry-After": str(RETRY_AFTER)})
+
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={"bot": self.bot})
+        except Exception as e:
+            # Повтор некорректного обновления ничего не даст - подтверждаем
+            logger.warning(f"Некорректное обновление: {e}")
+            return web.Response()
+
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503, headers={"Retry-After": str(RETRY_AFTER)})
+
+        self.received += 1
+        return web.Response()
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render_prometheus(),
+                            content_type="text/plain", charset="utf-8")
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        if METRICS_PATH:
+            app.router.add_get(METRICS_PATH, self.handle_metrics)
+        return app
+
+    # ---------- Обработка ----------
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            self._in_flight += 1
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    def start_workers(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._accepting = True
+
+    async def stop_workers(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Перестать принимать обновления и дообработать очередь (не дольше timeout)"""
+        self._accepting = False
+        done_before = self.processed + self.failed
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        # Обновления в очереди и в обработке на момент отмены уже подтверждены
+        # Telegram и повторно доставлены не будут
+        lost = self._queue.qsize() + self._in_flight
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.lost += lost
+        drained = self.processed + self.failed - done_before
+        if lost:
+            logger.warning(f"Обработчики webhook остановлены по таймауту {timeout:g} с: "
+                           f"дообработано {drained}, потеряно {lost} обновлений")
+        else:
+            logger.info(f"Обработчики webhook остановлены, дообработано при остановке: {drained}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "workers": self.workers,
+            "received": self.received,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "lost": self.lost,
+        }
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher,
+                      host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                      base_url: Optional[str] = WEBHOOK_BASE_URL,
+                      stop_event: Optional[asyncio.Event] = None) -> WebhookServer:
+    """
+    Запустить webhook-сервер и работать до stop_event (или отмены).
+
+    Webhook регистрируется с drop_pending_updates=False: обновления,
+    накопившиеся у Telegram за время перезапуска, будут доставлены.
+    """
+    server = WebhookServer(bot, dp)
+    metrics.add_source("webhook", server.stats)
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+
+    await dp.emit_startup(bot=bot)
+    server.start_workers()
+    await site.start()
+    logger.info(f"Webhook-сервер слушает {host}:{port}{server.path}, "
+                f"обработчиков: {server.workers}")
+
+    if base_url:
+        await bot.set_webhook(
+            url=base_url.rstrip("/") + server.path,
+            secret_token=server.secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=False
+        )
+        logger.info("Webhook зарегистрирован в Telegram")
+    else:
+        logger.info("WEBHOOK_BASE_URL не задан - webhook в Telegram не регистрируется")
+
+    try:
+        await (stop_event or asyncio.Event()).wait()
+    finally:
+        # Новые обновления получают 503, принятые дообрабатываются
+        await server.stop_workers()
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot)
+    return server
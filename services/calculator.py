@@ -1,9 +1,63 @@
 """
 Расчетный движок для вычисления полной стоимости заправки
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+import numpy as np
+from config import SCORE_WEIGHTS
 from data.stations import get_all_stations
-from services.discount_service import DiscountService
+from services.discount_service import DiscountService, DiscountPlan
+from services.pareto import pareto_front
+from services.metrics import metrics
+
+
+class CalculationBatch:
+    """
+    Результаты расчета по набору АЗС в виде колонок NumPy.
+    
+    Словари в формате FuelCalculator.calculate собираются только
+    для строк, которые действительно нужны (row).
+    """
+    
+    def __init__(self, stations: List[Dict[str, Any]], liters: float,
+                 columns: Dict[str, np.ndarray], discount_plan: DiscountPlan):
+        self.stations = stations
+        self.liters = liters
+        self.columns = columns
+        self.discount_plan = discount_plan
+    
+    def __len__(self) -> int:
+        return len(self.stations)
+    
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+    
+    def pareto_front(self) -> np.ndarray:
+        """Недоминируемые строки по (полная стоимость, время), по возрастанию стоимости"""
+        return pareto_front(self.columns["total_cost"], self.columns["time_minutes"])
+    
+    def row(self, i: int) -> Dict[str, Any]:
+        """Результат расчета для одной АЗС (формат calculate)"""
+        c = self.columns
+        plan = self.discount_plan
+        return {
+            "station": self.stations[i],
+            "base_price": float(c["base_price"][i]),
+            "azs_discount": float(c["azs_discount"][i]) * 100,
+            "user_discount": plan.total_discount_percent,
+            "total_discount_percent": float(c["azs_discount"][i]) * 100 + plan.total_discount_percent,
+            "final_price": float(c["final_price"][i]),
+            "fuel_cost": float(c["fuel_cost"][i]),
+            "distance": float(c["distance"][i]),
+            "fuel_for_trip": float(c["fuel_for_trip"][i]),
+            "fuel_cost_for_trip": float(c["fuel_cost_for_trip"][i]),
+            "time_minutes": float(c["time_minutes"][i]),
+            "time_cost": float(c["time_cost"][i]),
+            "total_cost": float(c["total_cost"][i]),
+            "savings": float(c["savings"][i]),
+            "liters": self.liters,
+            "discount_breakdown": dict(plan.breakdown),
+            "applied_discounts": list(plan.applied_discounts)
+        }
 
 
 class FuelCalculator:
@@ -11,10 +65,14 @@ class FuelCalculator:
     
     def __init__(self):
         self.discount_service = DiscountService()
+        # Ближайшая тестовая АЗС, кешируется до смены каталога
+        self._nearest_cache = None
     
+    @metrics.timed("service_seconds")
     async def calculate(self, user: Dict[str, Any], station: Dict[str, Any], 
                        liters: float, fuel_type: str, 
-                       user_discounts: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+                       user_discounts: List[Dict[str, Any]] = None,
+                       discount_plan: DiscountPlan = None) -> Optional[Dict[str, Any]]:
         """
         Рассчитывает полную стоимость заправки с учетом:
         - Цены топлива
@@ -28,90 +86,93 @@ class FuelCalculator:
             station: Данные АЗС
             liters: Количество литров
             fuel_type: Тип топлива
+            user_discounts: Дисконты пользователя (по умолчанию - из БД)
+            discount_plan: Готовый план дисконтов (приоритетнее user_discounts)
             
         Returns:
             Словарь с расчетами
         """
-        # Базовая цена за литр
-        base_price = station["prices"].get(fuel_type, 0)
-        if base_price == 0:
+        batch = await self.calculate_batch(
+            user, [station], liters, fuel_type, user_discounts, discount_plan,
+            reference_station=self._get_nearest_station()
+        )
+        if not len(batch):
             return None
+        return batch.row(0)
+    
+    @metrics.timed("service_seconds")
+    async def calculate_batch(self, user: Dict[str, Any], stations: List[Dict[str, Any]],
+                              liters: float, fuel_type: str,
+                              user_discounts: List[Dict[str, Any]] = None,
+                              discount_plan: DiscountPlan = None,
+                              reference_station: Dict[str, Any] = None) -> CalculationBatch:
+        """
+        Расчет полной стоимости сразу для всех АЗС над массивами NumPy.
         
-        # Получаем дисконты пользователя, если не переданы
-        if user_discounts is None:
-            user_id = user.get("user_id")
-            if user_id:
-                user_discounts = await self.discount_service.get_user_discounts(user_id)
-            else:
-                user_discounts = []
-        
-        # Применяем дисконты пользователя
-        discount_calc = self.discount_service.calculate_total_discount(
-            user_discounts, base_price
-        )
+        АЗС без цены на выбранное топливо в результат не попадают.
+        Экономия считается относительно ближайшей АЗС из `stations`
+        (ищется в том же проходе), если reference_station не передана.
         
-        # Также учитываем скидку АЗС (если есть)
-        azs_discount = station.get("discount_card", 0) / 100
-        azs_discounted_price = base_price * (1 - azs_discount)
+        Returns:
+            CalculationBatch со строками в порядке исходного списка
+        """
+        if discount_plan is None:
+            discount_plan = await self.get_discount_plan(user, user_discounts)
         
-        # Итоговая цена: применяем пользовательские дисконты к цене АЗС
-        # Если есть скидка АЗС, применяем к ней пользовательские дисконты
-        if azs_discount > 0:
-            # Применяем пользовательские дисконты к уже скидочной цене АЗС
-            final_discount_calc = self.discount_service.calculate_total_discount(
-                user_discounts, azs_discounted_price
-            )
-            final_price = final_discount_calc["final_price"]
-            total_user_discount = final_discount_calc["total_discount_percent"]
-        else:
-            final_price = discount_calc["final_price"]
-            total_user_discount = discount_calc["total_discount_percent"]
+        n = len(stations)
+        all_prices = np.fromiter(
+            (s["prices"].get(fuel_type, 0) for s in stations), dtype=float, count=n
+        )
+        all_distance = np.fromiter(
+            (s.get("distance", 999) for s in stations), dtype=float, count=n
+        )
         
-        # Общая скидка (АЗС + пользователь)
-        total_discount_percent = azs_discount * 100 + total_user_discount
+        # Ближайшая АЗС среди всех кандидатов - эталон для расчета экономии
+        if reference_station is None and n:
+            reference_station = stations[int(np.argmin(all_distance))]
+        
+        # Только АЗС с ценой на выбранное топливо
+        available = np.flatnonzero(all_prices)
+        stations = [stations[i] for i in available]
+        n = len(stations)
+        base_price = all_prices[available]
+        distance = np.fromiter(
+            (s.get("distance", 0) for s in stations), dtype=float, count=n
+        )
+        azs_discount = np.fromiter(
+            (s.get("discount_card", 0) for s in stations), dtype=float, count=n
+        ) / 100
         
-        # Стоимость топлива
+        # Пользовательские дисконты применяются к цене со скидкой АЗС
+        final_price = base_price * (1 - azs_discount) * discount_plan.multiplier
         fuel_cost = final_price * liters
         
-        # Расстояние до АЗС (туда и обратно)
-        distance = station.get("distance", 0)
-        total_distance = distance * 2  # туда и обратно
-        
-        # Расход топлива на дорогу
+        # Расход топлива на дорогу туда и обратно
         consumption = user.get("car_consumption", 8.0)  # л/100км
-        fuel_for_trip = (total_distance / 100) * consumption
-        
-        # Стоимость топлива на дорогу
+        fuel_for_trip = (distance * 2 / 100) * consumption
         fuel_cost_for_trip = fuel_for_trip * final_price
         
-        # Время в пути (примерно 1 км = 1 минута в городе)
-        time_minutes = distance * 1.2  # с учетом пробок
-        time_hours = time_minutes / 60
-        
-        # Стоимость времени
+        # Время в пути (примерно 1 км = 1 минута в городе, с учетом пробок)
+        time_minutes = distance * 1.2
         time_value = user.get("time_value", 10.0)  # BYN/час
-        time_cost = time_hours * time_value
+        time_cost = time_minutes / 60 * time_value
         
-        # Полная стоимость
         total_cost = fuel_cost + fuel_cost_for_trip + time_cost
         
         # Для сравнения: стоимость у ближайшей АЗС
-        nearest_station = self._get_nearest_station()
-        if nearest_station:
-            nearest_price = nearest_station["prices"].get(fuel_type, base_price)
-            nearest_discount = nearest_station.get("discount_card", 0) / 100
-            nearest_final_price = nearest_price * (1 - nearest_discount)
-            nearest_fuel_cost = nearest_final_price * liters
+        if reference_station:
+            nearest_price = reference_station["prices"].get(fuel_type)
+            if nearest_price is None:
+                nearest_price = base_price
+            nearest_discount = reference_station.get("discount_card", 0) / 100
+            nearest_fuel_cost = nearest_price * (1 - nearest_discount) * liters
             savings = nearest_fuel_cost - total_cost
         else:
-            savings = 0
+            savings = np.zeros(n)
         
-        return {
-            "station": station,
+        columns = {
             "base_price": base_price,
-            "azs_discount": azs_discount * 100,
-            "user_discount": total_user_discount,
-            "total_discount_percent": total_discount_percent,
+            "azs_discount": azs_discount,
             "final_price": final_price,
             "fuel_cost": fuel_cost,
             "distance": distance,
@@ -121,17 +182,32 @@ class FuelCalculator:
             "time_cost": time_cost,
             "total_cost": total_cost,
             "savings": savings,
-            "liters": liters,
-            "discount_breakdown": discount_calc.get("breakdown", {}),
-            "applied_discounts": discount_calc.get("applied_discounts", [])
         }
+        return CalculationBatch(stations, liters, columns, discount_plan)
+    
+    @metrics.timed("service_seconds")
+    async def get_discount_plan(self, user: Dict[str, Any],
+                                user_discounts: List[Dict[str, Any]] = None) -> DiscountPlan:
+        """
+        План дисконтов для запроса: из переданного списка или
+        из кеша сервиса дисконтов (один раз на запрос, а не на каждую АЗС)
+        """
+        if user_discounts is not None:
+            return self.discount_service.compile_plan(user_discounts)
+        user_id = user.get("user_id")
+        if user_id:
+            return await self.discount_service.get_discount_plan(user_id)
+        return self.discount_service.compile_plan([])
     
-    def _get_nearest_station(self) -> Dict[str, Any]:
-        """Получить ближайшую АЗС (для сравнения)"""
+    def _get_nearest_station(self) -> Optional[Dict[str, Any]]:
+        """Получить ближайшую тестовую АЗС (для сравнения)"""
         stations = get_all_stations()
-        if not stations:
-            return None
-        return min(stations, key=lambda s: s.get("distance", 999))
+        # Версия каталога: сам список и его размер
+        version = (id(stations), len(stations))
+        if self._nearest_cache is None or self._nearest_cache[0] != version:
+            nearest = min(stations, key=lambda s: s.get("distance", 999)) if stations else None
+            self._nearest_cache = (version, nearest)
+        return self._nearest_cache[1]
     
     def calculate_value_score(self, calculation: Dict[str, Any], 
                              balance_type: str = "balanced") -> float:
@@ -143,20 +219,28 @@ class FuelCalculator:
             calculation: Результат расчета
             balance_type: Тип баланса (economy, balanced, convenience)
         """
-        total_cost = calculation["total_cost"]
-        distance = calculation["distance"]
-        
-        if balance_type == "economy":
-            # Только цена (100% веса)
-            return total_cost
-        
-        elif balance_type == "convenience":
-            # Только расстояние (100% веса)
-            return distance * 100  # умножаем для нормализации
+        weights = SCORE_WEIGHTS.get(balance_type, SCORE_WEIGHTS["balanced"])
+        return sum(calculation[column] * weight for column, weight in weights.items())
+    
+    def value_scores(self, batch: CalculationBatch, balance_type: str = "balanced",
+                     rows: np.ndarray = None) -> np.ndarray:
+        """Оценки "ценности" строк расчета (см. calculate_value_score)"""
+        weights = SCORE_WEIGHTS.get(balance_type, SCORE_WEIGHTS["balanced"])
+        return self.weighted_scores(batch, weights, rows)
+    
+    def weighted_scores(self, batch: CalculationBatch, weights: Dict[str, float],
+                        rows: np.ndarray = None) -> np.ndarray:
+        """
+        Взвешенная сумма колонок расчета
         
-        else:  # balanced
-            # 70% цене, 30% расстоянию
-            price_score = total_cost * 0.7
-            distance_score = distance * 30
-            return price_score + distance_score
-
+        Args:
+            batch: Результаты расчета
+            weights: Колонка -> вес (см. SCORE_WEIGHTS)
+            rows: Индексы строк (по умолчанию - все)
+        """
+        size = len(batch) if rows is None else len(rows)
+        scores = np.zeros(size)
+        for column, weight in weights.items():
+            values = batch[column] if rows is None else batch[column][rows]
+            scores += values * weight
+        return scores
@@ -0,0 +1,108 @@
+"""
+Сервис дисконтов: банковские карты, карты АЗС и промокоды
+"""
+from typing import Dict, Any, List
+
+from config import (
+    DISCOUNT_CATEGORY_RULES,
+    DISCOUNT_CACHE_SIZE,
+    DISCOUNT_CACHE_TTL
+)
+from database import crud
+from services.cache import TTLCache
+
+# Планы дисконтов по user_id, общий для всех экземпляров сервиса
+_plan_cache = TTLCache(maxsize=DISCOUNT_CACHE_SIZE, ttl=DISCOUNT_CACHE_TTL)
+
+
+class DiscountPlan:
+    """
+    Скомпилированный набор дисконтов пользователя.
+
+    Категории с правилом 'additive' складываются, из категорий с правилом
+    'max' берется максимальный дисконт (DISCOUNT_CATEGORY_RULES). Итоговый
+    процент не зависит от цены, поэтому один план применяется ко всем АЗС.
+    """
+
+    def __init__(self, user_discounts: List[Dict[str, Any]]):
+        self.applied_discounts = []
+        self.breakdown: Dict[str, float] = {}
+
+        for discount in user_discounts:
+            category = discount["type"]
+            percent = discount["discount_percent"]
+            rule = DISCOUNT_CATEGORY_RULES.get(category, discount.get("apply_rule", "additive"))
+
+            if rule == "max":
+                if percent <= self.breakdown.get(category, 0):
+                    continue
+                # Заменяем предыдущий максимальный дисконт категории
+                self.applied_discounts = [
+                    d for d in self.applied_discounts if d["type"] != category
+                ]
+                self.breakdown[category] = percent
+            else:
+                self.breakdown[category] = self.breakdown.get(category, 0) + percent
+            self.applied_discounts.append(discount)
+
+        self.total_discount_percent = min(100.0, sum(self.breakdown.values()))
+        self.multiplier = 1 - self.total_discount_percent / 100
+
+    def apply(self, price: float) -> float:
+        """Цена с учетом дисконтов"""
+        return price * self.multiplier
+
+    def as_calculation(self, price: float) -> Dict[str, Any]:
+        """Результат в формате calculate_total_discount"""
+        return {
+            "base_price": price,
+            "final_price": self.apply(price),
+            "total_discount_percent": self.total_discount_percent,
+            "breakdown": dict(self.breakdown),
+            "applied_discounts": list(self.applied_discounts)
+        }
+
+
+class DiscountService:
+    """Работа с дисконтами пользователей"""
+
+    async def get_all_discounts(self) -> List[Dict[str, Any]]:
+        """Справочник доступных дисконтов"""
+        return await crud.get_active_discounts()
+
+    async def get_user_discounts(self, user_id: int) -> List[Dict[str, Any]]:
+        """Активные дисконты пользователя"""
+        return await crud.get_user_discounts(user_id)
+
+    async def get_discount_plan(self, user_id: int) -> DiscountPlan:
+        """План дисконтов пользователя (из кеша или из БД)"""
+        plan = _plan_cache.get(user_id)
+        if plan is None:
+            plan = DiscountPlan(await crud.get_user_discounts(user_id))
+            _plan_cache.set(user_id, plan)
+        return plan
+
+    def compile_plan(self, user_discounts: List[Dict[str, Any]]) -> DiscountPlan:
+        """Скомпилировать план из списка дисконтов"""
+        return DiscountPlan(user_discounts)
+
+    def calculate_total_discount(self, user_discounts: List[Dict[str, Any]],
+                                 price: float) -> Dict[str, Any]:
+        """Применить дисконты пользователя к цене"""
+        return DiscountPlan(user_discounts).as_calculation(price)
+
+    async def add_user_discount(self, user_id: int, discount_id: int) -> bool:
+        """Добавить дисконт пользователю"""
+        added = await crud.add_user_discount(user_id, discount_id)
+        self.invalidate(user_id)
+        return added
+
+    async def remove_user_discount(self, user_id: int, discount_id: int) -> bool:
+        """Удалить дисконт пользователя"""
+        removed = await crud.remove_user_discount(user_id, discount_id)
+        self.invalidate(user_id)
+        return removed
+
+    def invalidate(self, user_id: int):
+        """Сбросить кешированный план пользователя"""
+        _plan_cache.pop(user_id)
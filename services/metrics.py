@@ -0,0 +1,239 @@
+"""
+Метрики производительности бота
+
+Гистограммы задержек (обработчики, запросы к БД, расчеты) и счетчики
+хранятся в памяти процесса. Значения из внешних источников (очередь цен,
+webhook, хранилище FSM) снимаются в момент вывода. Вывод - текстовая
+сводка для /admin stats и формат Prometheus (файл или /metrics).
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "fuelradar_"
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как в Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class MetricsRegistry:
+    """Реестр гистограмм, счетчиков и источников статистики"""
+
+    def __init__(self):
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.help: Dict[str, str] = {}
+        self.sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def describe(self, name: str, text: str):
+        self.help[name] = text
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        family = self.histograms.setdefault(name, {})
+        histogram = family.get(key)
+        if histogram is None:
+            histogram = family[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        family = self.counters.setdefault(name, {})
+        family[key] = family.get(key, 0) + amount
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Замерить время блока"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name: str) -> Callable:
+        """Декоратор: время вызова функции с меткой function=<имя>"""
+        def decorator(func: Callable) -> Callable:
+            label = func.__name__
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.observe(name, time.perf_counter() - start, function=label)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start, function=label)
+            return wrapper
+        return decorator
+
+    def add_source(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        """Источник статистики (например, price_queue.stats), опрашивается при выводе"""
+        self.sources[name] = stats
+
+    def snapshot_sources(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for name, stats in self.sources.items():
+            try:
+                result[name] = stats()
+            except Exception as e:
+                logger.error(f"Ошибка получения статистики {name}: {e}")
+        return result
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+
+    # ---------- Вывод ----------
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines: List[str] = []
+
+        for name, family in sorted(self.histograms.items()):
+            full = PREFIX + name
+            if name in self.help:
+                lines.append(f"# HELP {full} {self.help[name]}")
+            lines.append(f"# TYPE {full} histogram")
+            for labels, h in sorted(family.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full}_bucket{_labels(labels, le=le)} {cumulative}")
+                lines.append(f"{full}_sum{_labels(labels)} {h.sum}")
+                lines.append(f"{full}_count{_labels(labels)} {h.count}")
+
+        for name, family in sorted(self.counters.items()):
+            full = PREFIX + name
+            if name in self.help:
+                lines.append(f"# HELP {full} {self.help[name]}")
+            lines.append(f"# TYPE {full} counter")
+            for labels, value in sorted(family.items()):
+                lines.append(f"{full}{_labels(labels)} {value}")
+
+        for source, stats in sorted(self.snapshot_sources().items()):
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {PREFIX}{source}_{key} gauge")
+                    lines.append(f"{PREFIX}{source}_{key} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    def render_text(self, top: int = 15) -> str:
+        """Краткая сводка для администратора: самые затратные операции"""
+        text = "📈 МЕТРИКИ\n"
+        for name, family in sorted(self.histograms.items()):
+            rows = sorted(family.items(), key=lambda item: item[1].sum, reverse=True)
+            text += f"\n{name}:\n"
+            for labels, h in rows[:top]:
+                label = ",".join(value for _, value in labels) or "-"
+                text += (
+                    f"  {label}: {h.count} шт., всего {h.sum:.2f} с, "
+                    f"p50 {h.quantile(0.5) * 1000:.1f} / p95 {h.quantile(0.95) * 1000:.1f} / "
+                    f"p99 {h.quantile(0.99) * 1000:.1f} мс\n"
+                )
+            if len(rows) > top:
+                text += f"  ... и ещё {len(rows) - top}\n"
+
+        for name, family in sorted(self.counters.items()):
+            text += f"\n{name}:\n"
+            for labels, value in sorted(family.items()):
+                label = ",".join(value for _, value in labels) or "-"
+                text += f"  {label}: {value:g}\n"
+
+        for source, stats in sorted(self.snapshot_sources().items()):
+            text += f"\n{source}:\n"
+            for key, value in stats.items():
+                if isinstance(value, float):
+                    value = f"{value:.2f}"
+                text += f"  {key}: {value}\n"
+        return text
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def write_prometheus_file(path: str, registry: Optional[MetricsRegistry] = None):
+    """Записать метрики в файл атомарно (для textfile collector node_exporter)"""
+    registry = registry or metrics
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(registry.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+async def write_prometheus_file_periodically(path: str, interval: float):
+    while True:
+        try:
+            write_prometheus_file(path)
+        except Exception as e:
+            logger.error(f"Ошибка записи метрик в {path}: {e}")
+        await asyncio.sleep(interval)
+
+
+metrics = MetricsRegistry()
+metrics.describe("handler_seconds", "Время обработки события обработчиком")
+metrics.describe("handler_errors_total", "Исключения в обработчиках")
+metrics.describe("db_query_seconds", "Время запросов database.crud")
+metrics.describe("db_pool_wait_seconds", "Ожидание свободного соединения пула БД")
+metrics.describe("service_seconds", "Время расчетов FuelCalculator и RecommendationEngine")
@@ -0,0 +1,32 @@
+"""
+Парето-фронт вариантов заправки по (полная стоимость, время в пути)
+"""
+import numpy as np
+
+
+def pareto_front(costs: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Индексы недоминируемых вариантов за O(n log n).
+
+    Вариант доминируется, если другой не хуже по обоим критериям и строго
+    лучше хотя бы по одному. Из полностью совпадающих вариантов остается
+    первый.
+
+    Returns:
+        Индексы фронта по возрастанию стоимости (и убыванию времени)
+    """
+    costs = np.asarray(costs, dtype=float)
+    times = np.asarray(times, dtype=float)
+    if costs.size == 0:
+        return np.empty(0, dtype=int)
+
+    # Сортировка по стоимости, при равной стоимости - по времени
+    order = np.lexsort((times, costs))
+    sorted_times = times[order]
+
+    # Вариант на фронте, если он быстрее всех более дешевых
+    best_before = np.minimum.accumulate(sorted_times)
+    on_front = np.empty(order.size, dtype=bool)
+    on_front[0] = True
+    on_front[1:] = sorted_times[1:] < best_before[:-1]
+    return order[on_front]
@@ -2,8 +2,11 @@
 Движок рекомендаций для разных категорий водителей
 """
 from typing import Dict, Any, List
-from services.calculator import FuelCalculator
+import numpy as np
+from config import SCORE_WEIGHTS
+from services.calculator import FuelCalculator, CalculationBatch
 from data.stations import get_all_stations
+from services.metrics import metrics
 
 
 class RecommendationEngine:
@@ -12,8 +15,10 @@ class RecommendationEngine:
     def __init__(self):
         self.calculator = FuelCalculator()
     
+    @metrics.timed("service_seconds")
     async def get_recommendations(self, user: Dict[str, Any], liters: float, 
-                                  fuel_type: str) -> Dict[str, Any]:
+                                  fuel_type: str, 
+                                  stations: List[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Генерация рекомендаций в зависимости от категории водителя
         
@@ -21,48 +26,57 @@ class RecommendationEngine:
             user: Профиль пользователя
             liters: Количество литров
             fuel_type: Тип топлива
+            stations: АЗС-кандидаты (по умолчанию - все тестовые АЗС)
             
         Returns:
             Словарь с рекомендациями
         """
-        stations = get_all_stations()
+        if stations is None:
+            stations = get_all_stations()
         driver_type = user.get("driver_type", "regular")
         
+        # Дисконты разрешаются один раз на весь запрос
+        discount_plan = await self.calculator.get_discount_plan(user)
+        batch = await self.calculator.calculate_batch(
+            user, stations, liters, fuel_type, discount_plan=discount_plan
+        )
+        
         if driver_type == "regular":
             # Для обычных - ДВА варианта
-            return await self._get_dual_recommendations(user, stations, liters, fuel_type)
+            return self._get_dual_recommendations(user, batch)
         else:
             # Для остальных - ОДИН лучший
-            return await self._get_single_recommendation(user, stations, liters, fuel_type)
+            return self._get_single_recommendation(user, batch)
     
-    async def _get_dual_recommendations(self, user: Dict[str, Any], 
-                                       stations: List[Dict[str, Any]], 
-                                       liters: float, fuel_type: str) -> Dict[str, Any]:
+    def _get_dual_recommendations(self, user: Dict[str, Any], 
+                                  batch: CalculationBatch) -> Dict[str, Any]:
         """Двойная рекомендация для обычных водителей"""
         
-        calculations = []
-        for station in stations:
-            calc = await self.calculator.calculate(user, station, liters, fuel_type)
-            if calc:
-                balance_type = user.get("preferred_balance", "balanced")
-                value_score = self.calculator.calculate_value_score(calc, balance_type)
-                calculations.append({
-                    "station": station,
-                    "calculation": calc,
-                    "value_score": value_score
-                })
-        
-        if not calculations:
+        if not len(batch):
             return {"error": "Нет доступных АЗС"}
         
-        # 1. Самый дешевый (абсолютная экономия)
-        cheapest = min(calculations, key=lambda x: x["calculation"]["total_cost"])
+        # Все три варианта лежат на Парето-фронте (стоимость, время):
+        # любой доминируемый вариант и дороже, и дольше
+        front = batch.pareto_front()
+        balance_type = user.get("preferred_balance", "balanced")
+        value_scores = self.calculator.value_scores(batch, balance_type, front)
+        
+        def pick(position: int) -> Dict[str, Any]:
+            i = int(front[position])
+            return {
+                "station": batch.stations[i],
+                "calculation": batch.row(i),
+                "value_score": float(value_scores[position])
+            }
+        
+        # 1. Самый дешевый (абсолютная экономия) - начало фронта
+        cheapest = pick(0)
         
         # 2. Лучшее соотношение цена/расстояние
-        best_value = min(calculations, key=lambda x: x["value_score"])
+        best_value = pick(int(np.argmin(value_scores)))
         
-        # 3. Ближайшая (для справки)
-        nearest = min(calculations, key=lambda x: x["station"]["distance"])
+        # 3. Ближайшая (для справки) - конец фронта
+        nearest = pick(len(front) - 1)
         
         return {
             "cheapest": cheapest,      # Вариант А: Максимальная экономия
@@ -71,40 +85,28 @@ class RecommendationEngine:
             "has_dual": True
         }
     
-    async def _get_single_recommendation(self, user: Dict[str, Any], 
-                                         stations: List[Dict[str, Any]], 
-                                         liters: float, fuel_type: str) -> Dict[str, Any]:
+    def _get_single_recommendation(self, user: Dict[str, Any], 
+                                   batch: CalculationBatch) -> Dict[str, Any]:
         """Одна рекомендация для других категорий"""
         
-        calculations = []
-        for station in stations:
-            calc = await self.calculator.calculate(user, station, liters, fuel_type)
-            if calc:
-                driver_type = user.get("driver_type", "regular")
-                
-                if driver_type == "taxi":
-                    # Для таксиста: минимум времени (ближайшая приемлемая)
-                    score = calc["time_cost"] + calc["distance"] * 5
-                elif driver_type == "budget":
-                    # Для бюджетного: только цена
-                    score = calc["total_cost"]
-                else:  # traveler
-                    # Для путешественника: баланс
-                    score = calc["total_cost"] * 0.6 + calc["distance"] * 20
-                
-                calculations.append({
-                    "station": station,
-                    "calculation": calc,
-                    "score": score
-                })
-        
-        if not calculations:
+        if not len(batch):
             return {"error": "Нет доступных АЗС"}
         
-        best = min(calculations, key=lambda x: x["score"])
+        driver_type = user.get("driver_type", "regular")
+        # taxi - минимум времени, budget - только цена, иначе (traveler) - баланс
+        weights = SCORE_WEIGHTS.get(driver_type, SCORE_WEIGHTS["traveler"])
+        
+        front = batch.pareto_front()
+        scores = self.calculator.weighted_scores(batch, weights, front)
+        position = int(np.argmin(scores))
+        i = int(front[position])
+        best = {
+            "station": batch.stations[i],
+            "calculation": batch.row(i),
+            "score": float(scores[position])
+        }
         
         return {
             "best": best,
             "has_dual": False
         }
-
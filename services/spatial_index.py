@@ -0,0 +1,124 @@
+"""
+Пространственный индекс АЗС (равномерная сетка по координатам)
+"""
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между двумя точками по поверхности Земли (км)"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = (math.sin(dphi / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class StationIndex:
+    """
+    Сеточный индекс для поиска ближайших АЗС.
+
+    Станции раскладываются по ячейкам размером cell_deg x cell_deg градусов.
+    Запрос по радиусу просматривает только ячейки, пересекающие ограничивающий
+    прямоугольник круга, поиск k ближайших расширяет радиус до тех пор,
+    пока внутри не окажется k станций.
+    """
+
+    def __init__(self, stations: Iterable[Dict[str, Any]], cell_deg: float = 0.1):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], List[Dict[str, Any]]] = defaultdict(list)
+        # id станции -> ячейка: удаление просматривает одну ячейку, а не всю сетку
+        self._cell_of: Dict[Any, Tuple[int, int]] = {}
+        for station in stations:
+            self.add(station)
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def add(self, station: Dict[str, Any]) -> bool:
+        """Добавить станцию (станции без координат пропускаются, с тем же id - заменяются)"""
+        lat, lon = station.get("lat"), station.get("lon")
+        if lat is None or lon is None:
+            return False
+        self.remove(station["id"])
+        key = self._cell(lat, lon)
+        self._cells[key].append(station)
+        self._cell_of[station["id"]] = key
+        return True
+
+    def remove(self, station_id: Any) -> bool:
+        """Удалить станцию по id"""
+        key = self._cell_of.pop(station_id, None)
+        if key is None:
+            return False
+        bucket = self._cells[key]
+        for i, station in enumerate(bucket):
+            if station["id"] == station_id:
+                bucket.pop(i)
+                break
+        if not bucket:
+            del self._cells[key]
+        return True
+
+    def within(self, lat: float, lon: float,
+               radius_km: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Станции в радиусе radius_km от точки.
+
+        Returns:
+            Список (расстояние_км, станция), отсортированный по расстоянию
+        """
+        dlat = radius_km / KM_PER_DEGREE
+        # Долготный размах берем по самой "узкой" широте прямоугольника
+        max_abs_lat = min(89.9, abs(lat) + dlat)
+        dlon = min(360.0, radius_km / (KM_PER_DEGREE * math.cos(math.radians(max_abs_lat))))
+
+        i_min, j_min = self._cell(lat - dlat, lon - dlon)
+        i_max, j_max = self._cell(lat + dlat, lon + dlon)
+
+        if (i_max - i_min + 1) * (j_max - j_min + 1) <= len(self._cells):
+            keys = ((i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1))
+        else:
+            # Прямоугольник больше числа занятых ячеек - дешевле перебрать занятые
+            keys = [key for key in self._cells
+                    if i_min <= key[0] <= i_max and j_min <= key[1] <= j_max]
+
+        found = []
+        for key in keys:
+            for station in self._cells.get(key, ()):
+                distance = haversine_km(lat, lon, station["lat"], station["lon"])
+                if distance <= radius_km:
+                    found.append((distance, station))
+
+        found.sort(key=lambda x: x[0])
+        return found
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_radius_km: Optional[float] = None) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        k ближайших станций к точке.
+
+        Returns:
+            Список (расстояние_км, станция), отсортированный по расстоянию
+        """
+        if k <= 0 or not self._cell_of:
+            return []
+
+        radius = self.cell_deg * KM_PER_DEGREE
+        # Радиус, гарантированно покрывающий всю планету
+        limit = max_radius_km if max_radius_km is not None else math.pi * EARTH_RADIUS_KM
+        while True:
+            radius = min(radius, limit)
+            found = self.within(lat, lon, radius)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius *= 2
@@ -0,0 +1,3 @@
+"""
+Инструменты для тестирования бота без Telegram
+"""
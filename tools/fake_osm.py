@@ -0,0 +1,309 @@
+"""
+Локальная замена Overpass API и Nominatim для проверки сборки каталога АЗС
+
+aiohttp-сервер отвечает на POST /api/interpreter так же, как Overpass на
+запрос osm/overpass.py: возвращает синтетические АЗС (amenity=fuel),
+попавшие в bbox тайла. Набор станций детерминирован (--seed); --revision
+меняет, удаляет и добавляет часть станций, что позволяет проверить
+инкрементальный режим. GET /reverse отвечает как обратное геокодирование
+Nominatim (osm/geocoder.py): адрес детерминирован по координатам, сверх
+--nominatim-rate запросов в секунду возвращается 429. --error-rate и
+--latency имитируют перегруженный сервер (429/5xx и медленные ответы).
+
+Запуск (скрипт пишет каталог и кеши в текущий каталог - запускайте во временном):
+    python -m tools.fake_osm --port 8082 --stations 2000
+    cd /tmp/osm-test && OVERPASS_URL=http://127.0.0.1:8082/api/interpreter \\
+        NOMINATIM_URL=http://127.0.0.1:8082/reverse GEOCODE_RATE=50 \\
+        OVERPASS_CHECKPOINT_DIR=tiles python /path/to/repo/gpt_script.py
+"""
+import argparse
+import asyncio
+import logging
+import random
+import re
+import time
+import zlib
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from osm.overpass import BELARUS_BBOX
+
+logger = logging.getLogger(__name__)
+
+# Первые id синтетических элементов (id уникален внутри типа)
+FIRST_NODE_ID = 10_000_000
+FIRST_WAY_ID = 20_000_000
+
+BRANDS = ["Белоруснефть", "Лукойл", "А-100", "Газпромнефть", "United Company", "Татнефть"]
+FUEL_TAGS = ["fuel:octane_92", "fuel:octane_95", "fuel:octane_98", "fuel:diesel",
+             "fuel:diesel:premium", "fuel:lpg", "fuel:cng"]
+STREETS = ["ул. Ленина", "пр. Независимости", "ул. Советская", "Московское шоссе",
+           "ул. Гагарина", "ул. Молодежная", "ул. Победы"]
+CITIES = ["Минск", "Гомель", "Могилёв", "Витебск", "Гродно", "Брест", "Бобруйск"]
+OPENING_HOURS = ["24/7", "Mo-Su 07:00-23:00", "Mo-Fr 08:00-20:00; Sa-Su 09:00-18:00"]
+
+# Доля станций, затронутых одной ревизией (изменение, удаление, добавление)
+REVISION_FRACTION = 0.01
+
+# Доля станций с дублем рядом (та же АЗС, отмеченная и точкой, и контуром)
+DUPLICATE_FRACTION = 0.02
+
+BBOX_RE = re.compile(r"\((-?[\d.]+),(-?[\d.]+),(-?[\d.]+),(-?[\d.]+)\)")
+OUT_RE = re.compile(r"out ([^;]*);")
+
+Station = Dict[str, Any]
+
+
+def random_tags(rng: random.Random, number: int) -> Dict[str, str]:
+    """Теги АЗС: часть станций без бренда, адреса, часов работы"""
+    tags = {"amenity": "fuel"}
+    if rng.random() < 0.9:
+        brand = rng.choice(BRANDS)
+        tags["brand"] = brand
+        tags["name"] = f"{brand} №{number}"
+    for tag in rng.sample(FUEL_TAGS, rng.randint(0, len(FUEL_TAGS))):
+        tags[tag] = "yes"
+    if rng.random() < 0.8:
+        tags["opening_hours"] = rng.choice(OPENING_HOURS)
+    # Без addr:* станцию дозаполняет обратное геокодирование
+    if rng.random() < 0.6:
+        tags["addr:street"] = rng.choice(STREETS)
+        tags["addr:housenumber"] = str(rng.randint(1, 200))
+        tags["addr:city"] = rng.choice(CITIES)
+    if rng.random() < 0.3:
+        tags["shop"] = "convenience"
+    if rng.random() < 0.2:
+        tags["car_wash"] = "yes"
+    if rng.random() < 0.1:
+        tags["cafe"] = "yes"
+    return tags
+
+
+def build_stations(count: int, seed: int, revision: int = 0,
+                   bbox: Tuple[float, float, float, float] = BELARUS_BBOX) -> List[Station]:
+    """
+    Синтетические элементы Overpass (node с lat/lon, way с center).
+
+    Ревизия r > 0 - тот же набор, в котором REVISION_FRACTION станций
+    изменены (версия + 1), столько же удалены и добавлены.
+    """
+    rng = random.Random(seed)
+    south, west, north, east = bbox
+
+    def station(number: int) -> Station:
+        lat = round(rng.uniform(south, north), 6)
+        lon = round(rng.uniform(west, east), 6)
+        if rng.random() < 0.8:
+            element = {"type": "node", "id": FIRST_NODE_ID + number, "lat": lat, "lon": lon}
+        else:
+            element = {"type": "way", "id": FIRST_WAY_ID + number,
+                       "center": {"lat": lat, "lon": lon}}
+        element["version"] = 1
+        element["tags"] = random_tags(rng, number)
+        return element
+
+    elements = [station(number) for number in range(count)]
+
+    # Дубли: точка в ~20 м от контура той же АЗС
+    for number, element in enumerate(rng.sample(elements, int(count * DUPLICATE_FRACTION)), count):
+        center = element.get("center") or element
+        elements.append({
+            "type": "node",
+            "id": FIRST_NODE_ID + number,
+            "lat": round(center["lat"] + 0.0002, 6),
+            "lon": round(center["lon"], 6),
+            "version": 1,
+            "tags": dict(element["tags"]),
+        })
+
+    if revision:
+        rng = random.Random(seed * 1000 + revision)
+        touched = max(1, int(count * REVISION_FRACTION))
+        changed, removed = (set(ids) for ids in (
+            rng.sample(range(len(elements)), touched) for _ in range(2)
+        ))
+        result = []
+        for i, element in enumerate(elements):
+            if i in removed:
+                continue
+            if i in changed:
+                element = dict(element, version=element["version"] + revision,
+                               tags=dict(element["tags"], opening_hours=rng.choice(OPENING_HOURS)))
+            result.append(element)
+        start = count * 2 + (revision - 1) * touched
+        result.extend(station(number) for number in range(start, start + touched))
+        elements = result
+    return elements
+
+
+def element_point(element: Station) -> Tuple[float, float]:
+    center = element.get("center") or element
+    return center["lat"], center["lon"]
+
+
+def reverse_address(lat: float, lon: float) -> Dict[str, str]:
+    """Синтетический адрес, одинаковый для одних и тех же координат"""
+    digest = zlib.crc32(f"{lat:.5f},{lon:.5f}".encode())
+    return {
+        "house_number": str(digest % 200 + 1),
+        "road": STREETS[digest // 200 % len(STREETS)],
+        "city": CITIES[digest // 7 % len(CITIES)],
+        "country": "Беларусь",
+        "country_code": "by",
+    }
+
+
+class FakeOsmServer:
+    """Overpass API и Nominatim в памяти процесса"""
+
+    def __init__(self, stations: int = 2000, seed: int = 1, revision: int = 0,
+                 error_rate: float = 0.0, latency: float = 0.0,
+                 nominatim_rate: float = 0.0):
+        self.elements = build_stations(stations, seed, revision)
+        self.error_rate = error_rate
+        self.latency = latency
+        self.nominatim_rate = nominatim_rate
+        self._reverse_times: deque = deque()
+        self._rng = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.calls: Counter = Counter()
+
+    def _in_bbox(self, bbox: Tuple[float, ...]) -> List[Station]:
+        south, west, north, east = bbox
+        return [element for element in self.elements
+                if south <= element_point(element)[0] <= north
+                and west <= element_point(element)[1] <= east]
+
+    async def _delay_or_fail(self, statuses: Tuple[int, ...]) -> Optional[web.Response]:
+        """Задержка ответа и случайная ошибка сервера"""
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            status = self._rng.choice(statuses)
+            self.calls[f"error_{status}"] += 1
+            return web.Response(status=status, headers={"Retry-After": "1"})
+        return None
+
+    # ---------- Overpass ----------
+
+    async def handle_interpreter(self, request: web.Request) -> web.Response:
+        self.calls["interpreter"] += 1
+        form = await request.post()
+        query = form.get("data") or request.query.get("data") or ""
+        match = BBOX_RE.search(query)
+        if not match:
+            return web.Response(status=400, text="bbox not found in query")
+
+        failure = await self._delay_or_fail((429, 504))
+        if failure is not None:
+            return failure
+
+        out = OUT_RE.search(query)
+        with_meta = out is not None and "meta" in out.group(1)
+        elements = []
+        for element in self._in_bbox(tuple(float(value) for value in match.groups())):
+            if not with_meta:
+                element = {k: v for k, v in element.items() if k != "version"}
+            elements.append(element)
+        return web.json_response({"version": 0.6, "generator": "fake_osm",
+                                  "elements": elements})
+
+    # ---------- Nominatim ----------
+
+    def _rate_limited(self) -> bool:
+        """Больше nominatim_rate запросов за последнюю секунду (политика Nominatim)"""
+        if not self.nominatim_rate:
+            return False
+        now = time.monotonic()
+        while self._reverse_times and now - self._reverse_times[0] >= 1.0:
+            self._reverse_times.popleft()
+        if len(self._reverse_times) >= self.nominatim_rate:
+            return True
+        self._reverse_times.append(now)
+        return False
+
+    async def handle_reverse(self, request: web.Request) -> web.Response:
+        self.calls["reverse"] += 1
+        try:
+            lat = float(request.query["lat"])
+            lon = float(request.query["lon"])
+        except (KeyError, ValueError):
+            return web.json_response({"error": "Need lat and lon"}, status=400)
+
+        if self._rate_limited():
+            self.calls["rate_limited"] += 1
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        failure = await self._delay_or_fail((429, 500, 503))
+        if failure is not None:
+            return failure
+
+        address = reverse_address(lat, lon)
+        display_name = ", ".join(address[key] for key in
+                                 ("house_number", "road", "city", "country"))
+        return web.json_response({
+            "place_id": zlib.crc32(display_name.encode()),
+            "lat": str(lat),
+            "lon": str(lon),
+            "display_name": display_name,
+            "address": address,
+        })
+
+    # ---------- Запуск ----------
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 ** 2)
+        app.router.add_post("/api/interpreter", self.handle_interpreter)
+        app.router.add_get("/api/interpreter", self.handle_interpreter)
+        app.router.add_get("/reverse", self.handle_reverse)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8082):
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Тестовый OSM-сервер слушает {host}:{port}, "
+                    f"элементов: {len(self.elements)}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(args: argparse.Namespace):
+    server = FakeOsmServer(args.stations, args.seed, args.revision,
+                           args.error_rate, args.latency, args.nominatim_rate)
+    await server.start(args.host, args.port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        print(f"Запросы: {dict(server.calls)}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Тестовый сервер Overpass API и Nominatim")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--stations", type=int, default=2000, help="Синтетических АЗС")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--revision", type=int, default=0,
+                        help="Ревизия набора: >0 - часть станций изменена, удалена и добавлена")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Доля запросов с ответом 429/5xx")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, с")
+    parser.add_argument("--nominatim-rate", type=float, default=0.0,
+                        help="Запросов /reverse в секунду, сверх - 429 (0 - без ограничения)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(message)s")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
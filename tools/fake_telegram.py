@@ -0,0 +1,173 @@
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов
+
+aiohttp-сервер отвечает на запросы бота по адресу /bot<token>/<method>:
+отдает синтетические обновления через getUpdates (long polling) и
+принимает sendMessage, editMessageText и прочие методы. Каждый ответ бота
+передается в on_reply, чтобы драйвер нагрузки мог измерить задержку и
+выбрать следующий шаг сценария. Бот направляется сюда через
+TELEGRAM_API_URL.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FuelRadar", "username": "fuelradar_test_bot"}
+
+# Методы, результат которых - отправленное или измененное сообщение
+MESSAGE_METHODS = ("sendMessage", "editMessageText", "editMessageReplyMarkup")
+
+# (метод, параметры запроса, message_id сообщения бота)
+ReplyHandler = Callable[[str, Dict[str, Any], Optional[int]], None]
+
+
+def user_object(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+            "username": f"user{user_id}"}
+
+
+class FakeTelegramServer:
+    """Bot API в памяти процесса"""
+
+    def __init__(self, on_reply: Optional[ReplyHandler] = None):
+        self.on_reply = on_reply
+        self._updates: List[Dict[str, Any]] = []
+        self._arrived = asyncio.Condition()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.calls: Counter = Counter()
+
+    # ---------- Синтетические обновления ----------
+
+    def message_update(self, user_id: int, text: str) -> Dict[str, Any]:
+        """Текстовое сообщение пользователя (команды размечаются как bot_command)"""
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user_object(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+            ]
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def callback_update(self, user_id: int, data: str, message_id: int) -> Dict[str, Any]:
+        """Нажатие inline-кнопки под сообщением бота message_id"""
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._message_ids)),
+                "from": user_object(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "...",
+                },
+            },
+        }
+
+    async def push(self, update: Dict[str, Any]):
+        """Поставить обновление в очередь getUpdates"""
+        async with self._arrived:
+            self._updates.append(update)
+            self._arrived.notify_all()
+
+    def pending(self) -> int:
+        return len(self._updates)
+
+    # ---------- Bot API ----------
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        async with self._arrived:
+            # Подтвержденные ботом обновления (id < offset) удаляются
+            if offset:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if not self._updates and timeout:
+                try:
+                    await asyncio.wait_for(self._arrived.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            return self._updates[:limit]
+
+    def _message_result(self, params: Dict[str, Any], message_id: int) -> Dict[str, Any]:
+        chat_id = int(params["chat_id"])
+        result = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            result["text"] = params["text"]
+        if params.get("reply_markup"):
+            result["reply_markup"] = params["reply_markup"]
+        return result
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        # Сложные поля в form-data приходят JSON-строкой
+        if isinstance(params.get("reply_markup"), str):
+            params["reply_markup"] = json.loads(params["reply_markup"])
+
+        if method == "getUpdates":
+            result: Any = await self._get_updates(params)
+        elif method == "getMe":
+            result = BOT_USER
+        elif method in MESSAGE_METHODS:
+            if method == "sendMessage":
+                message_id = next(self._message_ids)
+            else:
+                message_id = int(params.get("message_id") or 0)
+            result = self._message_result(params, message_id)
+            if self.on_reply:
+                self.on_reply(method, params, message_id)
+        else:
+            # answerCallbackQuery, deleteWebhook, setWebhook и прочее
+            result = True
+            if self.on_reply:
+                self.on_reply(method, params, None)
+
+        return web.json_response({"ok": True, "result": result})
+
+    # ---------- Запуск ----------
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 ** 2)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081):
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Тестовый Bot API слушает {host}:{port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,310 @@
+"""
+Нагрузочный тест настоящего диспетчера bot.py без обращения к Telegram
+
+Поднимает тестовый Bot API (tools.fake_telegram), направляет на него бота
+через TELEGRAM_API_URL и запускает тысячи одновременных пользователей.
+Каждый проходит сценарии /start, /fuel 95 40, /addprice (выбор сети,
+топлива, АЗС и ввод цены) и /compare 95 40; следующий шаг отправляется
+после ответа бота. База - отдельный временный файл.
+
+Использование:
+    python -m tools.load_test --users 2000
+    python -m tools.load_test --users 500 --iterations 3 --mode webhook --json report.json
+
+Отчет: обновлений в секунду, p50/p95/p99 задержки ответа (от отправки
+обновления до ответа бота) по шагам, время обработчиков из метрик бота,
+ожидание соединения с БД и статистика очереди записи цен.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from tools.fake_telegram import FakeTelegramServer, MESSAGE_METHODS
+
+logger = logging.getLogger(__name__)
+
+# id тестовых пользователей начинаются отсюда
+USER_ID_BASE = 10_000_000
+
+Reply = Dict[str, Any]
+StepBuilder = Callable[[FakeTelegramServer, int, Optional[Reply]], Optional[Dict[str, Any]]]
+
+
+def text(value: str) -> StepBuilder:
+    return lambda api, user_id, last: api.message_update(user_id, value)
+
+
+def button(prefix: str, prefer: str = None) -> StepBuilder:
+    """Нажать кнопку последнего ответа бота (prefer - если есть, иначе первую с prefix)"""
+    def build(api: FakeTelegramServer, user_id: int, last: Optional[Reply]):
+        markup = (last or {}).get("params", {}).get("reply_markup") or {}
+        options = [
+            b.get("callback_data", "")
+            for row in markup.get("inline_keyboard", []) for b in row
+            if b.get("callback_data", "").startswith(prefix)
+        ]
+        if not options:
+            return None
+        data = prefer if prefer in options else options[0]
+        return api.callback_update(user_id, data, last["message_id"])
+    return build
+
+
+# Сценарии: шаги выполняются по порядку, пока бот отвечает
+FLOWS: List[List[Tuple[str, StepBuilder]]] = [
+    [("start", text("/start"))],
+    [("fuel", text("/fuel 95 40"))],
+    [
+        ("addprice", text("/addprice")),
+        ("addprice_network", button("network_", "network_лукойл")),
+        ("addprice_fuel", button("fuel_", "fuel_95")),
+        ("addprice_azs", button("azs_")),
+        ("addprice_price", text("2.45")),
+    ],
+    [("compare", text("/compare 95 40"))],
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    values = sorted(values)
+
+    def at(q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+    return {"count": len(values), "p50_ms": at(0.5), "p95_ms": at(0.95),
+            "p99_ms": at(0.99), "max_ms": values[-1] * 1000}
+
+
+class LoadDriver:
+    """Одновременные пользователи; у каждого не больше одного обновления без ответа"""
+
+    def __init__(self, api: FakeTelegramServer, timeout: float):
+        self.api = api
+        self.timeout = timeout
+        self.send: Callable[[Dict[str, Any]], Any] = api.push
+        self._waiting: Dict[int, Tuple[asyncio.Future, float, str]] = {}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.sent = 0
+        self.timeouts = 0
+        self.aborted = 0
+        self.retries = 0
+
+    def on_reply(self, method: str, params: Dict[str, Any], message_id: Optional[int]):
+        """Первый ответ бота в чат завершает текущий шаг пользователя"""
+        if method not in MESSAGE_METHODS:
+            return
+        waiting = self._waiting.pop(int(params["chat_id"]), None)
+        if waiting is None:
+            return
+        future, start, step = waiting
+        self.latencies[step].append(time.perf_counter() - start)
+        if not future.done():
+            future.set_result({"method": method, "params": params, "message_id": message_id})
+
+    async def step(self, user_id: int, name: str, update: Dict[str, Any]) -> Optional[Reply]:
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[user_id] = (future, time.perf_counter(), name)
+        await self.send(update)
+        self.sent += 1
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._waiting.pop(user_id, None)
+            self.timeouts += 1
+            return None
+
+    async def run_user(self, user_id: int, iterations: int, think: float):
+        for _ in range(iterations):
+            for flow in FLOWS:
+                last = None
+                for name, build in flow:
+                    update = build(self.api, user_id, last)
+                    if update is None:
+                        # Бот не показал нужную кнопку - сценарий не продолжить
+                        self.aborted += 1
+                        break
+                    last = await self.step(user_id, name, update)
+                    if last is None:
+                        break
+                    if think:
+                        await asyncio.sleep(think)
+
+    async def run(self, users: int, iterations: int, ramp: float, think: float):
+        async def delayed(i: int):
+            if ramp:
+                await asyncio.sleep(ramp * i / users)
+            await self.run_user(USER_ID_BASE + i, iterations, think)
+
+        await asyncio.gather(*(delayed(i) for i in range(users)))
+
+
+def webhook_sender(driver: LoadDriver, session: aiohttp.ClientSession, url: str):
+    """Отправка обновлений POST-запросом; на 503 - повтор, как делает Telegram"""
+    async def send(update: Dict[str, Any]):
+        while True:
+            async with session.post(url, json=update) as response:
+                if response.status != 503:
+                    return
+            driver.retries += 1
+            await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+    return send
+
+
+def histogram_report(metrics, name: str) -> Dict[str, Dict[str, float]]:
+    result = {}
+    for labels, h in sorted(metrics.histograms.get(name, {}).items()):
+        label = ",".join(value for _, value in labels) or "all"
+        result[label] = {
+            "count": h.count,
+            "total_s": h.sum,
+            "p50_ms": h.quantile(0.5) * 1000,
+            "p95_ms": h.quantile(0.95) * 1000,
+            "p99_ms": h.quantile(0.99) * 1000,
+            "max_ms": h.max * 1000,
+        }
+    return result
+
+
+def print_report(report: Dict[str, Any]):
+    summary = report["summary"]
+    print("\n=== НАГРУЗОЧНЫЙ ТЕСТ ===")
+    print(f"Режим: {summary['mode']}, пользователей: {summary['users']}, "
+          f"повторов сценариев: {summary['iterations']}")
+    print(f"Обновлений: {summary['updates']} за {summary['elapsed_s']:.1f} с "
+          f"({summary['updates_per_sec']:.1f} в секунду)")
+    print(f"Без ответа: {summary['timeouts']}, прервано сценариев: {summary['aborted']}, "
+          f"повторов после 503: {summary['retries']}")
+
+    def table(title: str, rows: Dict[str, Dict[str, float]]):
+        print(f"\n{title}")
+        for name, row in rows.items():
+            print(f"  {name:40s} {row['count']:8d}  p50 {row['p50_ms']:8.1f}  "
+                  f"p95 {row['p95_ms']:8.1f}  p99 {row['p99_ms']:8.1f}  max {row['max_ms']:8.1f} мс")
+
+    table("Задержка ответа по шагам:", report["response_latency"])
+    table("Время обработчиков (handler_seconds):", report["handlers"])
+    table("Ожидание соединения с БД (db_pool_wait_seconds):", report["db_pool_wait"])
+    table("Ожидание блокировки записи (db_write_lock_wait_seconds):", report["db_write_lock_wait"])
+    table("Транзакции записи (db_write_seconds):", report["db_writes"])
+    print("\nОчередь записи цен:")
+    for key, value in report["price_queue"].items():
+        print(f"  {key}: {value}")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Модули бота читают конфигурацию при импорте
+    import bot as bot_module
+    from database.ingest import price_queue
+    from server.webhook import run_webhook
+    from services.metrics import metrics
+
+    api = FakeTelegramServer()
+    driver = LoadDriver(api, args.timeout)
+    api.on_reply = driver.on_reply
+    await api.start(args.host, args.api_port)
+
+    await bot_module.start_services()
+    bot = bot_module.build_bot()
+    dp = bot_module.build_dispatcher()
+    metrics.reset()
+
+    session = None
+    if args.mode == "webhook":
+        stop = asyncio.Event()
+        task = asyncio.create_task(run_webhook(
+            bot, dp, host=args.host, port=args.webhook_port, base_url="", stop_event=stop
+        ))
+        session = aiohttp.ClientSession()
+        driver.send = webhook_sender(
+            driver, session, f"http://{args.host}:{args.webhook_port}/webhook"
+        )
+    else:
+        task = asyncio.create_task(dp.start_polling(
+            bot, handle_signals=False, close_bot_session=False, polling_timeout=1
+        ))
+    await asyncio.sleep(0.5)
+
+    start = time.perf_counter()
+    await driver.run(args.users, args.iterations, args.ramp, args.think)
+    elapsed = time.perf_counter() - start
+
+    if args.mode == "webhook":
+        stop.set()
+        await session.close()
+    else:
+        await dp.stop_polling()
+    await task
+    await bot_module.stop_services(bot, dp)
+    await api.stop()
+
+    all_latencies = [x for values in driver.latencies.values() for x in values]
+    response_latency = {step: percentiles(values) for step, values in driver.latencies.items()}
+    response_latency["все шаги"] = percentiles(all_latencies)
+    return {
+        "summary": {
+            "mode": args.mode,
+            "users": args.users,
+            "iterations": args.iterations,
+            "updates": driver.sent,
+            "elapsed_s": elapsed,
+            "updates_per_sec": driver.sent / elapsed if elapsed else 0.0,
+            "timeouts": driver.timeouts,
+            "aborted": driver.aborted,
+            "retries": driver.retries,
+            "api_calls": dict(api.calls),
+        },
+        "response_latency": response_latency,
+        "handlers": histogram_report(metrics, "handler_seconds"),
+        "db_pool_wait": histogram_report(metrics, "db_pool_wait_seconds"),
+        "db_queries": histogram_report(metrics, "db_query_seconds"),
+        "db_write_lock_wait": histogram_report(metrics, "db_write_lock_wait_seconds"),
+        "db_writes": histogram_report(metrics, "db_write_seconds"),
+        "price_queue": price_queue.stats(),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на тестовом Bot API")
+    parser.add_argument("--users", type=int, default=1000, help="Одновременных пользователей")
+    parser.add_argument("--iterations", type=int, default=1, help="Повторов всех сценариев")
+    parser.add_argument("--ramp", type=float, default=5.0,
+                        help="За сколько секунд подключаются все пользователи")
+    parser.add_argument("--think", type=float, default=0.0, help="Пауза между шагами, секунд")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Ожидание ответа бота, секунд")
+    parser.add_argument("--mode", choices=("polling", "webhook"), default="polling")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081, help="Порт тестового Bot API")
+    parser.add_argument("--webhook-port", type=int, default=8082)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "fuelradar_load.db"),
+                        help="Временная база (пересоздается)")
+    parser.add_argument("--json", help="Сохранить отчет в JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    os.environ["DB_PATH"] = args.db
+    os.environ["TELEGRAM_API_URL"] = f"http://{args.host}:{args.api_port}"
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nОтчет сохранен в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Воспроизведение записанных обновлений (middlewares/recorder.py)
+
+Обновления из JSONL подаются в настоящий диспетчер bot.py через
+Dispatcher.feed_update с исходными интервалами, ускоренными в --speed раз,
+или без пауз (--speed max). Ответы бота уходят в тестовый Bot API
+(tools.fake_telegram), данные пишутся во временную базу: пустую или копию
+--source-db. Отчет (пропускная способность, задержки обработчиков,
+отставание от расписания) можно сохранить в JSON и сравнить до и после
+изменений.
+
+Использование:
+    python -m tools.replay recorded_updates.jsonl --speed 10
+    python -m tools.replay recorded_updates.jsonl --speed max --json after.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tools.fake_telegram import FakeTelegramServer
+from tools.load_test import histogram_report, percentiles
+
+logger = logging.getLogger(__name__)
+
+
+def iter_records(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["t"], record["update"]
+
+
+def sender_id(data: Dict[str, Any]) -> Optional[int]:
+    """Псевдоним отправителя обновления (None - если отправителя нет)"""
+    for value in data.values():
+        if isinstance(value, dict) and isinstance(value.get("from"), dict):
+            return value["from"].get("id")
+    return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Модули бота читают конфигурацию при импорте
+    from aiogram.types import Update
+    import bot as bot_module
+    from database.ingest import price_queue
+    from services.metrics import metrics
+
+    api = FakeTelegramServer()
+    await api.start(args.host, args.api_port)
+    await bot_module.start_services()
+    bot = bot_module.build_bot()
+    dp = bot_module.build_dispatcher()
+    metrics.reset()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    limit = asyncio.Semaphore(args.concurrency)
+    lags: List[float] = []
+    errors = 0
+    count = 0
+    # Последнее обновление каждого пользователя: его обновления обрабатываются
+    # по порядку, как в живом диалоге (ответ на кнопку - после команды)
+    previous: Dict[Optional[int], asyncio.Task] = {}
+
+    async def feed(update: Update, before: Optional[asyncio.Task]):
+        nonlocal errors
+        try:
+            if before is not None:
+                await asyncio.wait([before])
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors += 1
+            logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+        finally:
+            limit.release()
+
+    tasks = set()
+    first = None
+    start = time.perf_counter()
+    for recorded_at, data in iter_records(args.path):
+        if first is None:
+            first = recorded_at
+        if speed:
+            due = start + (recorded_at - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await limit.acquire()
+        if speed:
+            lags.append(max(0.0, time.perf_counter() - due))
+        update = Update.model_validate(data, context={"bot": bot})
+        user_id = sender_id(data)
+        before = previous.get(user_id) if user_id is not None else None
+        task = asyncio.create_task(feed(update, before))
+        previous[user_id] = task
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        count += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    await bot_module.stop_services(bot, dp)
+    await api.stop()
+
+    return {
+        "summary": {
+            "path": args.path,
+            "speed": args.speed,
+            "updates": count,
+            "errors": errors,
+            "elapsed_s": elapsed,
+            "updates_per_sec": count / elapsed if elapsed else 0.0,
+            "api_calls": dict(api.calls),
+        },
+        "schedule_lag": percentiles(lags),
+        "handlers": histogram_report(metrics, "handler_seconds"),
+        "db_pool_wait": histogram_report(metrics, "db_pool_wait_seconds"),
+        "db_queries": histogram_report(metrics, "db_query_seconds"),
+        "db_write_lock_wait": histogram_report(metrics, "db_write_lock_wait_seconds"),
+        "db_writes": histogram_report(metrics, "db_write_seconds"),
+        "price_queue": price_queue.stats(),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    summary = report["summary"]
+    print("\n=== ВОСПРОИЗВЕДЕНИЕ ===")
+    print(f"Файл: {summary['path']}, скорость: {summary['speed']}")
+    print(f"Обновлений: {summary['updates']} за {summary['elapsed_s']:.1f} с "
+          f"({summary['updates_per_sec']:.1f} в секунду), ошибок: {summary['errors']}")
+    lag = report["schedule_lag"]
+    if lag["count"]:
+        print(f"Отставание от расписания: p50 {lag['p50_ms']:.1f}, p95 {lag['p95_ms']:.1f}, "
+              f"p99 {lag['p99_ms']:.1f} мс")
+
+    for title, key in (("Время обработчиков (handler_seconds):", "handlers"),
+                       ("Ожидание соединения с БД (db_pool_wait_seconds):", "db_pool_wait"),
+                       ("Ожидание блокировки записи (db_write_lock_wait_seconds):",
+                        "db_write_lock_wait"),
+                       ("Транзакции записи (db_write_seconds):", "db_writes")):
+        print(f"\n{title}")
+        for name, row in report[key].items():
+            print(f"  {name:40s} {row['count']:8d}  p50 {row['p50_ms']:8.1f}  "
+                  f"p95 {row['p95_ms']:8.1f}  p99 {row['p99_ms']:8.1f} мс")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений")
+    parser.add_argument("path", help="JSONL-файл, записанный при RECORD_UPDATES=1")
+    parser.add_argument("--speed", default="1",
+                        help="Ускорение относительно записи (1, 10, ...) или max - без пауз")
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="Обновлений в обработке одновременно")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "fuelradar_replay.db"),
+                        help="Временная база (пересоздается)")
+    parser.add_argument("--source-db", help="Скопировать временную базу из этого файла")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081, help="Порт тестового Bot API")
+    parser.add_argument("--json", help="Сохранить отчет в JSON")
+    args = parser.parse_args(argv)
+
+    if args.speed != "max" and float(args.speed) <= 0:
+        parser.error("--speed должен быть больше 0 или max")
+
+    logging.basicConfig(level=logging.WARNING)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    if args.source_db:
+        shutil.copyfile(args.source_db, args.db)
+    os.environ["DB_PATH"] = args.db
+    os.environ["TELEGRAM_API_URL"] = f"http://{args.host}:{args.api_port}"
+    # Воспроизводимые обновления не записываются повторно
+    os.environ["RECORD_UPDATES"] = "0"
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nОтчет сохранен в {args.json}")
+
+
+if __name__ == "__main__":
+    main()